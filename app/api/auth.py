@@ -1,31 +1,33 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.schemas.auth import UserLogin, Token
-from app.core.security import verify_password, create_access_token
-from app.database import SessionLocal
+from app.core.security import create_access_token
+from app.core.passwords import password_hasher
+from app.database import get_async_db
 from app.models.user import User
+from app.utils.rate_limit import IPRateLimit
 
 router = APIRouter(
     prefix="/auth",
     tags=["Authentication"]
 )
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+@router.post("/login", response_model=Token, dependencies=[Depends(IPRateLimit("login"))])
+async def login(user_credentials: UserLogin, db: AsyncSession = Depends(get_async_db)):
+    user = await db.scalar(select(User).where(User.email == user_credentials.email))
 
-@router.post("/login", response_model=Token)
-def login(user_credentials: UserLogin, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.email == user_credentials.email).first()
-
-    if not user:
+    if not user or user.deleted_at is not None:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid credentials")
     
-    if not verify_password(user_credentials.password, user.password):
+    valid, new_hash = await password_hasher.verify_and_update(user_credentials.password, user.password)
+    if not valid:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid credentials")
     
+    # Hash com custo fora da política atual: salva o novo
+    if new_hash:
+        user.password = new_hash
+        await db.commit()
+    
     access_token = create_access_token(data={"user_id": user.id})
     return {"access_token": access_token, "token_type": "bearer"}
\ No newline at end of file
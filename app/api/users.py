@@ -1,28 +1,27 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.schemas.user import UserCreate, UserOut
 from app.services.user import create_user
-from app.database import SessionLocal
+from app.database import get_async_db
 from app.models import user
+from app.utils.rate_limit import IPRateLimit
 
 router = APIRouter(
     prefix="/users",
     tags=["Users"]
 )
 
-# Dependência para pegar sessão do banco
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-@router.post("/", response_model=UserOut, status_code=status.HTTP_201_CREATED)
-def register_user(user_data: UserCreate, db: Session = Depends(get_db)):
-    existing_user = db.query(user.User).filter(user.User.email == user_data.email).first()
+@router.post("/", response_model=UserOut, status_code=status.HTTP_201_CREATED,
+             dependencies=[Depends(IPRateLimit("register"))])
+async def register_user(user_data: UserCreate, db: AsyncSession = Depends(get_async_db)):
+    existing_user = await db.scalar(select(user.User).where(user.User.email == user_data.email))
     if existing_user:
         raise HTTPException(status_code=400, detail="Email already registered")
     
-    return create_user(db, user_data)
+    username_taken = await db.scalar(select(user.User).where(user.User.username == user_data.username))
+    if username_taken:
+        raise HTTPException(status_code=400, detail="Username already taken")
+    
+    return await create_user(db, user_data)
 
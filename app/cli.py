@@ -0,0 +1,122 @@
+import argparse
+import asyncio
+import sys
+import time
+from datetime import datetime, timezone
+
+from sqlalchemy import select
+
+from app.database import SessionLocal, engine, async_engine, async_write_engine
+from app.migrations import migrate, pending_migrations
+from app.migrations.query_plans import check_query_plans
+from app.models.deletion import DeletionJob
+from app.seed import SEED_END, Seeder
+from app.services.counters import repair_counters, repair_follow_counts
+from app.services.deletion import deletion_worker
+from app.services.trending import rebuild_scores
+
+
+def parse_utc(value: str) -> datetime:
+    moment = datetime.fromisoformat(value)
+    return moment if moment.tzinfo else moment.replace(tzinfo=timezone.utc)
+
+
+async def run_deletions():
+    try:
+        return await deletion_worker.run_pending()
+    finally:
+        await async_engine.dispose()
+        await async_write_engine.dispose()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.cli")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    repair = commands.add_parser("repair-counters", help="recompute like/comment/post/follow counters")
+    repair.add_argument("--batch-size", type=int, default=10_000)
+
+    rebuild = commands.add_parser("rebuild-trending", help="recompute trending scores from likes and comments")
+    rebuild.add_argument("--batch-size", type=int, default=10_000)
+
+    migrate_parser = commands.add_parser("migrate", help="apply pending schema migrations")
+    migrate_parser.add_argument("--to", type=int, default=None, help="stop after this version")
+    migrate_parser.add_argument("--status", action="store_true", help="only list pending migrations")
+
+    deletions = commands.add_parser("deletions", help="show unfinished post and account deletions")
+    deletions.add_argument("--run", action="store_true", help="run them here until none is left")
+
+    commands.add_parser("check-query-plans", help="fail if a hot query falls back to a table scan")
+
+    seed = commands.add_parser("seed", help="fill users, posts, likes and comments with synthetic data")
+    seed.add_argument("--users", type=int, default=100_000)
+    seed.add_argument("--posts", type=int, default=1_000_000)
+    seed.add_argument("--likes", type=int, default=1_000_000)
+    seed.add_argument("--comments", type=int, default=1_000_000)
+    seed.add_argument("--seed", type=int, default=42)
+    seed.add_argument("--zipf", type=float, default=1.0, help="popularity exponent; higher means hotter hot posts")
+    seed.add_argument("--end", type=parse_utc, default=SEED_END,
+                      help="timestamp of the newest generated rows (ISO 8601, UTC if no offset)")
+    seed.add_argument("--batch-size", type=int, default=50_000)
+
+    args = parser.parse_args(argv)
+
+    if args.command == "repair-counters":
+        db = SessionLocal()
+        try:
+            repair_counters(db, batch_size=args.batch_size)
+            repair_follow_counts(db, batch_size=args.batch_size)
+        finally:
+            db.close()
+        print("Counters repaired")
+
+    elif args.command == "rebuild-trending":
+        db = SessionLocal()
+        try:
+            scored = rebuild_scores(db, batch_size=args.batch_size)
+        finally:
+            db.close()
+        print(f"Trending scores rebuilt for {scored} posts")
+
+    elif args.command == "migrate":
+        if args.status:
+            for number, migration in pending_migrations(engine):
+                print(f"pending {number:04d} {migration.__name__}")
+            return
+        for number, name in migrate(engine, target=args.to):
+            print(f"applied {number:04d} {name}")
+
+    elif args.command == "deletions":
+        if args.run:
+            print(f"Ran {asyncio.run(run_deletions())} deletion jobs")
+        db = SessionLocal()
+        try:
+            jobs = db.scalars(select(DeletionJob).where(DeletionJob.finished_at.is_(None)).order_by(DeletionJob.id)).all()
+        finally:
+            db.close()
+        for job in jobs:
+            state = "claimed" if job.locked_until and job.locked_until > time.time() else "waiting"
+            print(f"{job.id} {job.kind} {job.target_id}: {state}, phase {job.phase}, {job.deleted_rows} rows deleted")
+        if not jobs:
+            print("No deletions pending")
+
+    elif args.command == "check-query-plans":
+        failures = check_query_plans(engine)
+        for name, steps in failures.items():
+            print(f"{name}: {'; '.join(steps)}")
+        if failures:
+            sys.exit(1)
+        print("All hot queries use an index")
+
+    elif args.command == "seed":
+        if args.users < 1 and (args.posts or args.likes or args.comments):
+            parser.error("--users must be at least 1 to create posts, likes or comments")
+        if args.posts < 1 and (args.likes or args.comments):
+            parser.error("--posts must be at least 1 to create likes or comments")
+        migrate(engine)
+        Seeder(engine, users=args.users, posts=args.posts, likes=args.likes, comments=args.comments,
+               seed=args.seed, exponent=args.zipf, batch_size=args.batch_size, end=args.end).run()
+
+
+if __name__ == "__main__":
+    main()
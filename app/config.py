@@ -1,17 +1,78 @@
 import os
+from typing import Dict
 from pydantic_settings import BaseSettings
 from dotenv import load_dotenv
 
 load_dotenv()
 
 class Settings(BaseSettings):
+    DATABASE_PROFILE: str = os.getenv("DATABASE_PROFILE", "sqlite")
+    DATABASE_URL: str = os.getenv("DATABASE_URL", "sqlite:///./social_media.db")
     DATABASE_HOSTNAME: str = os.getenv("DATABASE_HOSTNAME", "localhost")
     DATABASE_PORT: str = os.getenv("DATABASE_PORT", "5432")
     DATABASE_PASSWORD: str = os.getenv("DATABASE_PASSWORD", "password")
     DATABASE_NAME: str = os.getenv("DATABASE_NAME", "socialmedia")
     DATABASE_USERNAME: str = os.getenv("DATABASE_USERNAME", "postgres")
+    DATABASE_POOL_SIZE: int = int(os.getenv("DATABASE_POOL_SIZE", "10"))
+    DATABASE_MAX_OVERFLOW: int = int(os.getenv("DATABASE_MAX_OVERFLOW", "20"))
+    DATABASE_POOL_TIMEOUT: float = float(os.getenv("DATABASE_POOL_TIMEOUT", "30"))
+    SQLITE_JOURNAL_MODE: str = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+    SQLITE_SYNCHRONOUS: str = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+    SQLITE_CACHE_SIZE: int = int(os.getenv("SQLITE_CACHE_SIZE", "-65536"))
+    SQLITE_MMAP_SIZE: int = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+    SQLITE_BUSY_TIMEOUT_MS: int = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+    SQLITE_READER_POOL_SIZE: int = int(os.getenv("SQLITE_READER_POOL_SIZE", "8"))
+    SQLITE_SERIALIZE_WRITES: bool = os.getenv("SQLITE_SERIALIZE_WRITES", "true").lower() == "true"
     SECRET_KEY: str = os.getenv("SECRET_KEY", "your_secret_key_here")
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    SEARCH_RANK_WINDOW: int = 2000
+    BCRYPT_ROUNDS: int = int(os.getenv("BCRYPT_ROUNDS", "12"))
+    PASSWORD_HASH_WORKERS: int = int(os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 1)))
+    PASSWORD_HASH_MAX_QUEUE: int = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", "256"))
+    AUTH_CACHE_TTL_SECONDS: float = 60
+    AUTH_CACHE_MAX_ENTRIES: int = 10_000
+    TIMELINE_FANOUT_MAX_FOLLOWERS: int = 10_000
+    TIMELINE_MAX_LENGTH: int = 800
+    TIMELINE_TRIM_EVERY: int = 50
+    RESPONSE_CACHE_TTL_SECONDS: float = 300
+    RESPONSE_CACHE_MAX_ENTRIES: int = 5_000
+    AUTOCOMPLETE_REFRESH_SECONDS: float = 5
+    BATCH_MAX_ITEMS: int = 100
+    PAGE_MAX_LIMIT: int = 100
+    LIKE_WRITE_BEHIND: bool = os.getenv("LIKE_WRITE_BEHIND", "false").lower() == "true"
+    LIKE_FLUSH_INTERVAL_SECONDS: float = 0.5
+    LIKE_FLUSH_MAX_PENDING: int = 1_000
+    LIKE_INDEX_ENABLED: bool = os.getenv("LIKE_INDEX_ENABLED", "true").lower() == "true"
+    LIKE_INDEX_MAX_BYTES: int = 64 * 1024 * 1024
+    LIKE_INDEX_TTL_SECONDS: float = 30
+    LIKE_INDEX_MAX_POST_LIKES: int = 100_000
+    LIKE_INDEX_MAX_USER_LIKES: int = 100_000
+    WARMUP_ON_STARTUP: bool = os.getenv("WARMUP_ON_STARTUP", "true").lower() == "true"
+    WARMUP_HOT_POSTS: int = 100
+    MEDIA_ROOT: str = os.getenv("MEDIA_ROOT", "./media")
+    MEDIA_MAX_BYTES: int = int(os.getenv("MEDIA_MAX_BYTES", str(20 * 1024 * 1024)))
+    MEDIA_CHUNK_SIZE: int = 1024 * 1024
+    MEDIA_THUMBNAIL_SIZE: int = 320
+    MEDIA_THUMBNAIL_WORKERS: int = int(os.getenv("MEDIA_THUMBNAIL_WORKERS", "2"))
+    DELETION_BATCH_SIZE: int = 1_000
+    DELETION_BATCH_PAUSE_SECONDS: float = 0.01
+    DELETION_POLL_SECONDS: float = 30
+    DELETION_LEASE_SECONDS: float = 60
+    TRENDING_HALF_LIFE_HOURS: float = 6
+    TRENDING_TOP_K: int = 500
+    TRENDING_REFRESH_SECONDS: float = 10
+    RATE_LIMIT_ENABLED: bool = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+    RATE_LIMIT_MAX_KEYS: int = 100_000
+    # "<requests>/<second|minute|hour>" per rule, also as JSON in the RATE_LIMITS
+    # environment variable; a rule left out is not limited
+    RATE_LIMITS: Dict[str, str] = {
+        "login": "10/minute",
+        "register": "5/minute",
+        "like": "120/minute",
+        "write": "30/minute",
+        "search": "30/minute",
+        "upload": "20/minute",
+    }
 
 settings = Settings()
\ No newline at end of file
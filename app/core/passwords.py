@@ -0,0 +1,86 @@
+import asyncio
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from fastapi import HTTPException, status
+
+from app.config import settings
+from app.core.security import pwd_context
+
+# bcrypt costs ~100-300 ms of CPU per call. The request path hands it to a
+# process pool so logins and registrations don't stall the event loop, with a
+# bounded number of calls in flight and a bounded queue behind them.
+
+
+def _hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def _verify_and_update(password: str, hashed_password: str):
+    # (valid, new hash or None). A new hash is returned when the stored one
+    # uses a work factor below the current policy
+    return pwd_context.verify_and_update(password, hashed_password)
+
+
+class PasswordHasher:
+    def __init__(self, workers: int, max_queue: int):
+        self.workers = workers
+        self.max_queue = max_queue
+        self._executor = None
+        self._slots = None
+        self.queue_depth = 0
+        self.in_flight = 0
+        self.stats = {"hash": 0, "verify": 0, "rehash": 0, "rejected": 0,
+                      "busy_seconds": 0.0, "wait_seconds": 0.0}
+
+    def _ensure_started(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            self._slots = asyncio.Semaphore(self.workers)
+
+    async def _run(self, fn, *args):
+        self._ensure_started()
+        if self.queue_depth >= self.max_queue:
+            self.stats["rejected"] += 1
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                                detail="Too many authentication requests, try again shortly",
+                                headers={"Retry-After": "1"})
+
+        queued_at = time.perf_counter()
+        self.queue_depth += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.queue_depth -= 1
+
+        started_at = time.perf_counter()
+        self.stats["wait_seconds"] += started_at - queued_at
+        self.in_flight += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        finally:
+            self.in_flight -= 1
+            self.stats["busy_seconds"] += time.perf_counter() - started_at
+            self._slots.release()
+
+    async def hash(self, password: str) -> str:
+        self.stats["hash"] += 1
+        return await self._run(_hash, password)
+
+    async def verify_and_update(self, password: str, hashed_password: str):
+        self.stats["verify"] += 1
+        valid, new_hash = await self._run(_verify_and_update, password, hashed_password)
+        if valid and new_hash:
+            self.stats["rehash"] += 1
+        return valid, new_hash
+
+    def metrics(self):
+        return {**self.stats, "queue_depth": self.queue_depth, "in_flight": self.in_flight}
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+password_hasher = PasswordHasher(settings.PASSWORD_HASH_WORKERS, settings.PASSWORD_HASH_MAX_QUEUE)
@@ -1,14 +1,93 @@
-from sqlalchemy import create_engine
+from fastapi import Request
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import URL, make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.orm import sessionmaker, declarative_base
+from .config import settings
 
-DATABASE_URL = "sqlite:///./social_media.db"
+# Drivers usados pelo engine assíncrono de cada banco
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+}
 
-engine = create_engine(
-    DATABASE_URL, connect_args={"check_same_thread": False}
-)
+def make_async_url(url: str):
+    url = make_url(url)
+    return url.set(drivername=ASYNC_DRIVERS.get(url.get_backend_name(), url.drivername))
+
+def build_database_url():
+    # Perfil "postgresql": URL montada a partir das variáveis DATABASE_*
+    if settings.DATABASE_PROFILE == "postgresql":
+        return URL.create(
+            "postgresql",
+            username=settings.DATABASE_USERNAME,
+            password=settings.DATABASE_PASSWORD,
+            host=settings.DATABASE_HOSTNAME,
+            port=int(settings.DATABASE_PORT),
+            database=settings.DATABASE_NAME,
+        )
+    return make_url(settings.DATABASE_URL)
+
+DATABASE_URL = build_database_url()
+IS_SQLITE = DATABASE_URL.get_backend_name() == "sqlite"
+
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    # WAL deixa leitores e o escritor trabalharem ao mesmo tempo; synchronous
+    # NORMAL só faz fsync no checkpoint, o que é seguro em WAL
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA journal_mode={settings.SQLITE_JOURNAL_MODE}")
+    cursor.execute(f"PRAGMA synchronous={settings.SQLITE_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA cache_size={settings.SQLITE_CACHE_SIZE}")
+    cursor.execute(f"PRAGMA mmap_size={settings.SQLITE_MMAP_SIZE}")
+    cursor.execute(f"PRAGMA busy_timeout={settings.SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.close()
+
+def use_immediate_transactions(engine):
+    # BEGIN IMMEDIATE pega o lock de escrita no início da transação: quem
+    # espera, espera pelo busy_timeout em vez de falhar com "database is locked"
+    # ao tentar promover um lock de leitura
+    @event.listens_for(engine, "connect")
+    def disable_implicit_begin(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(engine, "begin")
+    def begin_immediate(connection):
+        connection.exec_driver_sql("BEGIN IMMEDIATE")
+
+def engine_options(pool_size: int):
+    if IS_SQLITE:
+        return {"pool_size": pool_size, "max_overflow": 0, "pool_timeout": settings.DATABASE_POOL_TIMEOUT}
+    return {
+        "pool_size": settings.DATABASE_POOL_SIZE,
+        "max_overflow": settings.DATABASE_MAX_OVERFLOW,
+        "pool_timeout": settings.DATABASE_POOL_TIMEOUT,
+        "pool_pre_ping": True,
+    }
+
+# Engine síncrono: migrations, CLI e scripts
+engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False} if IS_SQLITE else {})
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Engine assíncrono: caminho das requisições. No SQLite, um pool de leitores
+# e um único escritor: as escritas fazem fila no pool (um processo) e no
+# BEGIN IMMEDIATE (entre processos). No PostgreSQL os dois são o mesmo engine.
+async_engine = create_async_engine(make_async_url(DATABASE_URL), **engine_options(settings.SQLITE_READER_POOL_SIZE))
+
+if IS_SQLITE and settings.SQLITE_SERIALIZE_WRITES:
+    async_write_engine = create_async_engine(make_async_url(DATABASE_URL), **engine_options(1))
+    use_immediate_transactions(async_write_engine.sync_engine)
+else:
+    async_write_engine = async_engine
+
+if IS_SQLITE:
+    for sqlite_engine in {engine, async_engine.sync_engine, async_write_engine.sync_engine}:
+        event.listen(sqlite_engine, "connect", set_sqlite_pragmas)
+
+# expire_on_commit=False: objetos continuam legíveis depois do commit sem lazy load
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+AsyncWriteSessionLocal = async_sessionmaker(async_write_engine, autoflush=False, expire_on_commit=False)
+
 Base = declarative_base()
 
 def get_db():
@@ -17,3 +96,9 @@ def get_db():
         yield db
     finally:
         db.close()
+
+async def get_async_db(request: Request):
+    # GET/HEAD só leem e usam o pool de leitores; o resto vai para o escritor
+    session_factory = AsyncSessionLocal if request.method in ("GET", "HEAD") else AsyncWriteSessionLocal
+    async with session_factory() as db:
+        yield db
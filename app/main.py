@@ -1,15 +1,73 @@
+import logging
+import time
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from app.database import engine
+from app.config import settings
 from app.models import user, post, comment
 from app.api import users, auth
-from app.routers import posts
+from app.routers import posts, comments, timeline, metrics, media
+from app.routers import users as user_profiles
+from app.core.passwords import password_hasher
+from app.database import AsyncSessionLocal, async_engine, async_write_engine
+from app.services.user import load_username_index
+from app.services.trending import load_trending
+from app.services.likes import like_aggregator
+from app.services.deletion import deletion_worker
+from app.services.media import thumbnailer
+from app.utils.metrics import MetricsMiddleware, instrument_engine, startup_seconds
+from app.warmup import warm_up
 
-# Cria tabelas
-user.Base.metadata.create_all(bind=engine)
+logger = logging.getLogger(__name__)
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    started_at = time.perf_counter()
+    # Índices em memória: autocomplete de @menções e top-K dos posts em alta
+    async with AsyncSessionLocal() as db:
+        await load_username_index(db)
+        await load_trending(db)
+    # Conexões, SQL compilado e cache prontos antes da primeira requisição
+    if settings.WARMUP_ON_STARTUP:
+        await warm_up(app)
+    like_aggregator.start()
+    # Exclusões em lotes, retomando as que ficaram pela metade
+    deletion_worker.start()
+    startup_seconds.set(value=time.perf_counter() - started_at)
+    logger.info("startup took %.1f ms", (time.perf_counter() - started_at) * 1000)
+    yield
+    # Termina o lote de exclusão em andamento
+    await deletion_worker.stop()
+    # Grava os likes ainda em memória antes de fechar as conexões
+    await like_aggregator.stop()
+    # Termina as miniaturas em andamento e encerra os pools de processos
+    await thumbnailer.shutdown()
+    password_hasher.shutdown()
+    # Fecha as conexões (as threads do aiosqlite seguram o processo aberto)
+    await async_engine.dispose()
+    await async_write_engine.dispose()
 
-# Incluir as rotas do usuário
-app.include_router(users.router)
-app.include_router(auth.router)
-app.include_router(posts.router)
\ No newline at end of file
+# Métricas no formato do Prometheus em GET /metrics: queries e tempo de banco
+# por requisição vêm dos eventos dos engines
+instrument_engine(async_engine.sync_engine)
+if async_write_engine is not async_engine:
+    instrument_engine(async_write_engine.sync_engine)
+
+def create_app() -> FastAPI:
+    # O schema é criado/atualizado pelas migrations: python -m app.cli migrate
+    app = FastAPI(lifespan=lifespan)
+
+    # Latência por rota, requisições em andamento e status
+    app.add_middleware(MetricsMiddleware)
+
+    # Incluir as rotas do usuário
+    app.include_router(users.router)
+    app.include_router(auth.router)
+    app.include_router(posts.router)
+    app.include_router(comments.router)
+    app.include_router(user_profiles.router)
+    app.include_router(timeline.router)
+    app.include_router(media.router)
+    app.include_router(metrics.router)
+    return app
+
+app = create_app()
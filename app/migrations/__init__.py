@@ -0,0 +1,41 @@
+from sqlalchemy import Column, Integer, String, MetaData, Table, select, func
+from sqlalchemy.sql.sqltypes import TIMESTAMP
+from sqlalchemy.sql.expression import text
+
+from .versions import MIGRATIONS
+
+# Versioned schema migrations. Each entry in MIGRATIONS runs once, in its own
+# transaction, and is recorded in schema_migrations. Run them with
+# `python -m app.cli migrate` instead of creating tables when the app starts.
+
+metadata = MetaData()
+
+schema_migrations = Table(
+    "schema_migrations", metadata,
+    Column("version", Integer, primary_key=True),
+    Column("name", String, nullable=False),
+    Column("applied_at", TIMESTAMP(timezone=True), nullable=False, server_default=text('CURRENT_TIMESTAMP')),
+)
+
+
+def current_version(conn) -> int:
+    schema_migrations.create(conn, checkfirst=True)
+    return conn.scalar(select(func.coalesce(func.max(schema_migrations.c.version), 0)))
+
+
+def pending_migrations(engine):
+    with engine.begin() as conn:
+        version = current_version(conn)
+    return [(number, migration) for number, migration in MIGRATIONS if number > version]
+
+
+def migrate(engine, target: int = None):
+    applied = []
+    for number, migration in pending_migrations(engine):
+        if target is not None and number > target:
+            break
+        with engine.begin() as conn:
+            migration(conn)
+            conn.execute(schema_migrations.insert().values(version=number, name=migration.__name__))
+        applied.append((number, migration.__name__))
+    return applied
@@ -0,0 +1,66 @@
+import re
+
+from sqlalchemy import select
+
+from app.models.user import User
+
+from app.models.post import Post, Like, PostScore
+from app.services.post import post_feed_query, post_comments_query, commenter_profiles_query
+from app.services.user import users_page_query
+from app.models.follow import Follow, TimelineEntry
+from app.models.comment import Comment
+from app.models.deletion import DeletionJob
+
+# EXPLAIN QUERY PLAN checks for the hot queries. A plan step that scans a whole
+# table or sorts it in a temp b-tree means an index the query relies on is
+# missing or no longer matches the query shape.
+
+BAD_PLAN_STEP = re.compile(r"^SCAN \w+$|USE TEMP B-TREE")
+# Scanning a subquery's own (already bounded) rows is fine
+SUBQUERY_STEP = re.compile(r"^(?:CO-ROUTINE|MATERIALIZE) (\w+)$")
+
+
+def hot_queries():
+    return {
+        "feed page": post_feed_query()
+            .order_by(Post.created_at.desc(), Post.id.desc()).limit(10),
+        "user posts": select(Post)
+            .where(Post.user_id == 1).order_by(Post.created_at.desc(), Post.id.desc()),
+        "post comments": post_comments_query(None, 1).limit(50),
+        "comment validators": commenter_profiles_query(None, 1, 50),
+        "post likes": select(Like.user_id).where(Like.post_id == 1),
+        "viewer likes": select(Like.post_id).where(Like.user_id == 1, Like.post_id.in_([1, 2, 3])),
+        "home timeline": select(TimelineEntry.post_id, TimelineEntry.created_at)
+            .where(TimelineEntry.user_id == 1)
+            .order_by(TimelineEntry.created_at.desc(), TimelineEntry.post_id.desc()).limit(10),
+        "author followers": select(Follow.follower_id).where(Follow.followee_id == 1),
+        "trending top-k": select(PostScore.post_id, PostScore.score).order_by(PostScore.score.desc()).limit(500),
+        "user directory": users_page_query("", None).limit(50),
+        "username prefix": users_page_query("ab", None).limit(50),
+        "profile changes": select(User.id).where(User.profile_changed_at >= "2024-01-01"),
+        "deletion queue": select(DeletionJob.id).where(DeletionJob.finished_at.is_(None))
+            .order_by(DeletionJob.finished_at, DeletionJob.id).limit(1),
+        "author comments": select(Comment.id).where(Comment.user_id == 1).limit(1000),
+    }
+
+
+def explain(conn, statement):
+    compiled = statement.compile(dialect=conn.dialect, compile_kwargs={"literal_binds": True})
+    rows = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + str(compiled)).all()
+    return [row[-1] for row in rows]
+
+
+def check_query_plans(engine):
+    # Returns {query name: [offending plan steps]} for the queries that scan
+    if engine.dialect.name != "sqlite":
+        return {}
+
+    failures = {}
+    with engine.connect() as conn:
+        for name, statement in hot_queries().items():
+            steps = explain(conn, statement)
+            subqueries = {"SCAN " + match.group(1) for match in map(SUBQUERY_STEP.match, steps) if match}
+            bad_steps = [step for step in steps if BAD_PLAN_STEP.search(step) and step not in subqueries]
+            if bad_steps:
+                failures[name] = bad_steps
+    return failures
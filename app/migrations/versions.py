@@ -0,0 +1,172 @@
+from sqlalchemy import (TIMESTAMP, Boolean, Column, DateTime, ForeignKey, Integer, MetaData, String, Table,
+                        bindparam, inspect, select, text, update)
+from sqlalchemy.orm import Session
+from sqlalchemy.schema import CreateIndex
+
+from app.models.user import User, username_key
+from app.models.post import Post, Like, PostScore
+from app.models.comment import Comment
+from app.models.follow import Follow, TimelineEntry
+from app.models.media import Media
+from app.models.deletion import DeletionJob
+from app.services.counters import repair_follow_counts
+from app.services.search import install_post_search
+from app.services.trending import rebuild_scores
+
+# Migrations are plain functions taking a Connection. They check what already
+# exists so databases created by the old create_all() upgrade cleanly.
+
+
+def _has_column(conn, table: str, column: str) -> bool:
+    return column in {c["name"] for c in inspect(conn).get_columns(table)}
+
+
+def _create_indexes(conn, model):
+    # IF NOT EXISTS rather than checkfirst: reflection skips expression indexes
+    for index in model.__table__.indexes:
+        conn.execute(CreateIndex(index, if_not_exists=True))
+
+
+def initial_schema(conn):
+    # The tables as they were before migrations, not the live models: later
+    # columns (and posts.media_id's foreign key to a table that does not exist
+    # yet) are added by the migrations that introduced them
+    metadata = MetaData()
+    Table("users", metadata,
+          Column("id", Integer, primary_key=True, nullable=False),
+          Column("email", String, nullable=False, unique=True),
+          Column("password", String, nullable=False),
+          Column("username", String, nullable=False, unique=True),
+          Column("bio", String, nullable=True),
+          Column("profile_image", String, nullable=True),
+          Column("created_at", DateTime(timezone=True), nullable=False, server_default=text("CURRENT_TIMESTAMP")),
+          Column("is_active", Boolean))
+    Table("posts", metadata,
+          Column("id", Integer, primary_key=True, nullable=False),
+          Column("content", String, nullable=False),
+          Column("image_url", String, nullable=True),
+          Column("created_at", TIMESTAMP(timezone=True), nullable=False, server_default=text("CURRENT_TIMESTAMP")),
+          Column("updated_at", TIMESTAMP(timezone=True), nullable=True),
+          Column("user_id", Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False))
+    Table("likes", metadata,
+          Column("user_id", Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True),
+          Column("post_id", Integer, ForeignKey("posts.id", ondelete="CASCADE"), primary_key=True),
+          Column("created_at", TIMESTAMP(timezone=True), nullable=False, server_default=text("CURRENT_TIMESTAMP")))
+    Table("comments", metadata,
+          Column("id", Integer, primary_key=True, nullable=False),
+          Column("content", String, nullable=False),
+          Column("created_at", TIMESTAMP(timezone=True), nullable=False, server_default=text("CURRENT_TIMESTAMP")),
+          Column("updated_at", TIMESTAMP(timezone=True), nullable=True),
+          Column("user_id", Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False),
+          Column("post_id", Integer, ForeignKey("posts.id", ondelete="CASCADE"), nullable=False))
+    metadata.create_all(conn, checkfirst=True)
+
+
+def denormalized_counters(conn):
+    added = False
+    for table, column in (("posts", "like_count"), ("posts", "comment_count"), ("users", "post_count")):
+        if not _has_column(conn, table, column):
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} INTEGER NOT NULL DEFAULT 0"))
+            added = True
+    if added:
+        # Plain SQL rather than repair_counters, which follows the live models
+        # (posts.deleted_at is only added by migration 10)
+        conn.execute(text("UPDATE posts SET like_count = (SELECT count(*) FROM likes WHERE likes.post_id = posts.id), "
+                          "comment_count = (SELECT count(*) FROM comments WHERE comments.post_id = posts.id)"))
+        conn.execute(text("UPDATE users SET post_count = (SELECT count(*) FROM posts WHERE posts.user_id = users.id)"))
+
+
+def post_search(conn):
+    install_post_search(conn)
+
+
+def hot_path_indexes(conn):
+    for model in (Post, Like, Comment):
+        _create_indexes(conn, model)
+
+
+def home_timelines(conn):
+    added = False
+    for column in ("follower_count", "following_count"):
+        if not _has_column(conn, "users", column):
+            conn.execute(text(f"ALTER TABLE users ADD COLUMN {column} INTEGER NOT NULL DEFAULT 0"))
+            added = True
+    for model in (Follow, TimelineEntry):
+        model.__table__.create(conn, checkfirst=True)
+    if added:
+        repair_follow_counts(Session(bind=conn))
+
+
+def post_versions(conn):
+    if not _has_column(conn, "posts", "version"):
+        conn.execute(text("ALTER TABLE posts ADD COLUMN version INTEGER NOT NULL DEFAULT 0"))
+    if not _has_column(conn, "posts", "changed_at"):
+        conn.execute(text("ALTER TABLE posts ADD COLUMN changed_at TIMESTAMP WITH TIME ZONE"))
+
+
+def username_index(conn):
+    # Replaced by ix_users_username_key_id in username_keys
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_users_username_lower_id ON users (lower(username), id)"))
+
+
+def media_uploads(conn):
+    Media.__table__.create(conn, checkfirst=True)
+    if not _has_column(conn, "posts", "media_id"):
+        conn.execute(text("ALTER TABLE posts ADD COLUMN media_id VARCHAR(64) REFERENCES media (id)"))
+
+
+def trending_scores(conn):
+    PostScore.__table__.create(conn, checkfirst=True)
+    rebuild_scores(Session(bind=conn))
+
+
+def deletion_jobs(conn):
+    for table in ("posts", "users"):
+        if not _has_column(conn, table, "deleted_at"):
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN deleted_at TIMESTAMP WITH TIME ZONE"))
+    DeletionJob.__table__.create(conn, checkfirst=True)
+    for model in (Comment, Media):
+        _create_indexes(conn, model)
+    # Rows orphaned by post deletions made before deletion jobs (SQLite
+    # does not enforce the ON DELETE CASCADE foreign keys)
+    for table in ("likes", "comments", "timeline_entries", "post_scores"):
+        conn.execute(text(f"DELETE FROM {table} WHERE post_id NOT IN (SELECT id FROM posts)"))
+
+
+def profile_versions(conn):
+    if not _has_column(conn, "users", "profile_version"):
+        conn.execute(text("ALTER TABLE users ADD COLUMN profile_version INTEGER NOT NULL DEFAULT 0"))
+    if not _has_column(conn, "users", "profile_changed_at"):
+        conn.execute(text("ALTER TABLE users ADD COLUMN profile_changed_at TIMESTAMP WITH TIME ZONE"))
+
+
+def username_keys(conn, batch_size: int = 10_000):
+    if not _has_column(conn, "users", "username_key"):
+        conn.execute(text("ALTER TABLE users ADD COLUMN username_key VARCHAR"))
+    last_id = 0
+    while True:
+        rows = conn.execute(select(User.id, User.username).where(User.id > last_id)
+                            .order_by(User.id).limit(batch_size)).all()
+        if not rows:
+            break
+        conn.execute(update(User).where(User.id == bindparam("user_id")).values(username_key=bindparam("key")),
+                     [{"user_id": user_id, "key": username_key(username)} for user_id, username in rows])
+        last_id = rows[-1].id
+    conn.execute(text("DROP INDEX IF EXISTS ix_users_username_lower_id"))
+    _create_indexes(conn, User)
+
+
+MIGRATIONS = [
+    (1, initial_schema),
+    (2, denormalized_counters),
+    (3, post_search),
+    (4, hot_path_indexes),
+    (5, home_timelines),
+    (6, post_versions),
+    (7, username_index),
+    (8, media_uploads),
+    (9, trending_scores),
+    (10, deletion_jobs),
+    (11, profile_versions),
+    (12, username_keys),
+]
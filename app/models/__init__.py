@@ -0,0 +1,6 @@
+from .user import User
+from .post import Post, Like, PostScore
+from .comment import Comment
+from .follow import Follow, TimelineEntry
+from .media import Media
+from .deletion import DeletionJob
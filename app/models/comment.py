@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey
+from sqlalchemy import Column, Integer, String, ForeignKey, Index
 from sqlalchemy.sql.expression import text
 from sqlalchemy.sql.sqltypes import TIMESTAMP
 from sqlalchemy.orm import relationship
@@ -15,4 +15,10 @@ class Comment(Base):
     post_id = Column(Integer, ForeignKey("posts.id", ondelete="CASCADE"), nullable=False)
     
     author = relationship("User", back_populates="comments")
-    post = relationship("Post", back_populates="comments")
\ No newline at end of file
+    post = relationship("Post", back_populates="comments")
+
+    __table_args__ = (
+        Index("ix_comments_post_id_created_at_id", "post_id", "created_at", "id"),
+        # Account deletion finds the user's comments
+        Index("ix_comments_user_id", "user_id"),
+    )
\ No newline at end of file
@@ -0,0 +1,24 @@
+from sqlalchemy import Column, Integer, String, Float, Index
+from sqlalchemy.sql.expression import text
+from sqlalchemy.sql.sqltypes import TIMESTAMP
+from ..database import Base
+
+class DeletionJob(Base):
+    __tablename__ = "deletion_jobs"
+    
+    id = Column(Integer, primary_key=True, nullable=False)
+    # "post" or "user"; the target is already hidden (deleted_at) when queued
+    kind = Column(String, nullable=False)
+    target_id = Column(Integer, nullable=False)
+    # Phase being worked on (services/deletion.py), null once finished
+    phase = Column(String, nullable=True)
+    deleted_rows = Column(Integer, nullable=False, default=0, server_default=text('0'))
+    created_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=text('CURRENT_TIMESTAMP'))
+    updated_at = Column(TIMESTAMP(timezone=True), nullable=True)
+    finished_at = Column(TIMESTAMP(timezone=True), nullable=True)
+    # time.time() until which a worker owns the job; a crashed worker's lease runs out
+    locked_until = Column(Float, nullable=True)
+
+    __table_args__ = (
+        Index("ix_deletion_jobs_finished_at_id", "finished_at", "id"),
+    )
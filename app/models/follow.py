@@ -0,0 +1,30 @@
+from sqlalchemy import Column, Integer, ForeignKey, Index
+from sqlalchemy.sql.expression import text
+from sqlalchemy.sql.sqltypes import TIMESTAMP
+from ..database import Base
+
+class Follow(Base):
+    __tablename__ = "follows"
+    
+    follower_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    followee_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    created_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=text('CURRENT_TIMESTAMP'))
+
+    __table_args__ = (
+        # Fan-out reads the followers of an author
+        Index("ix_follows_followee_id_follower_id", "followee_id", "follower_id"),
+    )
+
+class TimelineEntry(Base):
+    __tablename__ = "timeline_entries"
+    
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    post_id = Column(Integer, ForeignKey("posts.id", ondelete="CASCADE"), primary_key=True)
+    author_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    # Copy of posts.created_at so a page never has to touch the posts table
+    created_at = Column(TIMESTAMP(timezone=True), nullable=False)
+
+    __table_args__ = (
+        Index("ix_timeline_entries_user_id_created_at_post_id", "user_id", "created_at", "post_id"),
+        Index("ix_timeline_entries_post_id", "post_id"),
+    )
@@ -0,0 +1,22 @@
+from sqlalchemy import Column, Integer, String, ForeignKey, Index
+from sqlalchemy.sql.expression import text
+from sqlalchemy.sql.sqltypes import TIMESTAMP
+from ..database import Base
+
+class Media(Base):
+    __tablename__ = "media"
+    
+    # Content-addressed: the id is the sha256 of the file, so the same bytes
+    # uploaded twice are one row and one file
+    id = Column(String(64), primary_key=True, nullable=False)
+    content_type = Column(String, nullable=False)
+    size = Column(Integer, nullable=False)
+    # Whoever uploaded the content first
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"), nullable=True)
+    # sha256 of the derived thumbnail, set by the thumbnail workers
+    thumbnail_id = Column(String(64), nullable=True)
+    created_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=text('CURRENT_TIMESTAMP'))
+
+    __table_args__ = (
+        Index("ix_media_user_id", "user_id"),
+    )
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Index
 from sqlalchemy.sql.expression import text
 from sqlalchemy.sql.sqltypes import TIMESTAMP
 from sqlalchemy.orm import relationship
@@ -10,14 +10,30 @@ class Post(Base):
     id = Column(Integer, primary_key=True, nullable=False)
     content = Column(String, nullable=False)
     image_url = Column(String, nullable=True)
+    # Uploaded through POST /media; image_url then points at it
+    media_id = Column(String(64), ForeignKey("media.id"), nullable=True)
     created_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=text('CURRENT_TIMESTAMP'))
     updated_at = Column(TIMESTAMP(timezone=True), nullable=True, onupdate=text('CURRENT_TIMESTAMP'))
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    like_count = Column(Integer, nullable=False, default=0, server_default=text('0'))
+    comment_count = Column(Integer, nullable=False, default=0, server_default=text('0'))
+    # Bumped by every write that changes the post's response (edits, likes,
+    # comments); ETag and Last-Modified are derived from them
+    version = Column(Integer, nullable=False, default=0, server_default=text('0'))
+    changed_at = Column(TIMESTAMP(timezone=True), nullable=True)
+    # Set when the post is deleted: hidden from then on, removed with its
+    # likes and comments by a deletion job (services/deletion.py)
+    deleted_at = Column(TIMESTAMP(timezone=True), nullable=True)
     
     author = relationship("User", back_populates="posts")
     comments = relationship("Comment", back_populates="post", cascade="all, delete-orphan")
     likes = relationship("Like", back_populates="post", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        Index("ix_posts_created_at_id", "created_at", "id"),
+        Index("ix_posts_user_id_created_at_id", "user_id", "created_at", "id"),
+    )
+
 class Like(Base):
     __tablename__ = "likes"
     
@@ -26,4 +42,19 @@ class Like(Base):
     created_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=text('CURRENT_TIMESTAMP'))
     
     user = relationship("User", back_populates="likes")
-    post = relationship("Post", back_populates="likes")
\ No newline at end of file
+    post = relationship("Post", back_populates="likes")
+
+    __table_args__ = (
+        Index("ix_likes_post_id_user_id", "post_id", "user_id"),
+    )
+
+class PostScore(Base):
+    __tablename__ = "post_scores"
+    
+    post_id = Column(Integer, ForeignKey("posts.id", ondelete="CASCADE"), primary_key=True)
+    # Decayed likes and comments, in the log form described in services/trending.py
+    score = Column(Float, nullable=False)
+
+    __table_args__ = (
+        Index("ix_post_scores_score", "score"),
+    )
\ No newline at end of file
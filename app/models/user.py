@@ -1,8 +1,16 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Index, func
 from sqlalchemy.sql.expression import text
 from sqlalchemy.orm import relationship
 from ..database import Base
 
+def username_key(username: str) -> str:
+    # Case-insensitive directory order and prefix search. Folded here and
+    # stored, since SQLite's lower() only folds ASCII
+    return username.lower()
+
+def _default_username_key(context):
+    return username_key(context.get_current_parameters()["username"])
+
 class User(Base):
     __tablename__ = "users"
     
@@ -10,11 +18,28 @@ class User(Base):
     email = Column(String, nullable=False, unique=True)
     password = Column(String, nullable=False)
     username = Column(String, nullable=False, unique=True)
+    username_key = Column(String, nullable=True, default=_default_username_key)
     bio = Column(String, nullable=True)
     profile_image = Column(String, nullable=True)
     created_at = Column(DateTime(timezone=True), nullable=False, server_default=text('CURRENT_TIMESTAMP'))
     is_active = Column(Boolean, default=True)
+    post_count = Column(Integer, nullable=False, default=0, server_default=text('0'))
+    follower_count = Column(Integer, nullable=False, default=0, server_default=text('0'))
+    following_count = Column(Integer, nullable=False, default=0, server_default=text('0'))
+    # Bumped when the username or profile image changes: both are shown with
+    # every post, so they are part of the posts' ETag and Last-Modified
+    profile_version = Column(Integer, nullable=False, default=0, server_default=text('0'))
+    profile_changed_at = Column(DateTime(timezone=True), nullable=True)
+    # Set when the account is deleted, like posts.deleted_at
+    deleted_at = Column(DateTime(timezone=True), nullable=True)
     
     posts = relationship("Post", back_populates="author")
     comments = relationship("Comment", back_populates="author")
     likes = relationship("Like", back_populates="user")
+
+    __table_args__ = (
+        # Case-insensitive username order: directory pages and prefix search
+        Index("ix_users_username_key_id", username_key, id),
+        # Renames picked up by the other workers' autocomplete indexes
+        Index("ix_users_profile_changed_at", profile_changed_at),
+    )
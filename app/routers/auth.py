@@ -1,25 +1,35 @@
 from fastapi import APIRouter, Depends, status, HTTPException
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
-from .. import database, models, schemas, utils
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from .. import database, models, schemas
 from ..config import settings
+from ..core.passwords import password_hasher
+from ..utils.auth import create_access_token
+from ..utils.rate_limit import IPRateLimit
 from datetime import timedelta
 
 router = APIRouter(tags=['Authentication'])
 
-@router.post("/login", response_model=schemas.Token)
-def login(user_credentials: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(database.get_db)):
-    user = db.query(models.User).filter(models.User.email == user_credentials.username).first()
+@router.post("/login", response_model=schemas.Token, dependencies=[Depends(IPRateLimit("login"))])
+async def login(user_credentials: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(database.get_async_db)):
+    user = await db.scalar(select(models.User).where(models.User.email == user_credentials.username))
     
-    if not user:
+    if not user or user.deleted_at is not None:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid Credentials")
     
-    if not utils.verify_password(user_credentials.password, user.password):
+    valid, new_hash = await password_hasher.verify_and_update(user_credentials.password, user.password)
+    if not valid:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid Credentials")
     
+    # Stored hash uses an outdated work factor: save the new one
+    if new_hash:
+        user.password = new_hash
+        await db.commit()
+    
     # Create a token
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = utils.create_access_token(
+    access_token = create_access_token(
         data={"user_id": user.id}, expires_delta=access_token_expires
     )
     
@@ -1,50 +1,100 @@
-from fastapi import APIRouter, Depends, status, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, status, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select, update, delete
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
 from .. import models, schemas
-from ..database import get_db
-from typing import List
+from ..config import settings
+from ..database import get_async_db, AsyncSessionLocal
+from typing import List, Optional
 from ..utils.auth import get_current_user
+from ..services.counters import adjust_comment_count, touch_post
+from ..services import post as post_service
+from ..services import trending
+from ..utils.http_cache import (make_etag, is_not_modified, not_modified_response, json_response,
+                                get_cached, set_cached, invalidate_post)
+from ..utils.pagination import decode_cursor
+from ..utils.rate_limit import UserRateLimit
+from ..utils.serialization import dumps
 
 router = APIRouter(
     prefix="/comments",
     tags=["Comments"]
 )
 
+async def get_comment_with_author(db: AsyncSession, id: int):
+    # populate_existing: the comment may already be in the session from a write
+    return await db.scalar(select(models.Comment)
+                           .where(models.Comment.id == id)
+                           .options(joinedload(models.Comment.author))
+                           .execution_options(populate_existing=True))
+
+COMMENTS_PAGE_SIZE = 50
+
+async def ndjson_comments(post_id: int, cursor: Optional[str]):
+    # Own session: the request's session is closed once the handler returns
+    async with AsyncSessionLocal() as db:
+        async for comment in post_service.stream_post_comments(db, post_id, cursor=cursor):
+            yield dumps(comment) + b"\n"
+
 @router.get("/post/{post_id}", response_model=List[schemas.CommentResponse])
-def get_comments_for_post(post_id: int, db: Session = Depends(get_db), 
-                        current_user: models.User = Depends(get_current_user)):
-    # Check if post exists
-    post = db.query(models.Post).filter(models.Post.id == post_id).first()
-    if not post:
+async def get_comments_for_post(post_id: int, request: Request, db: AsyncSession = Depends(get_async_db), 
+                                current_user: models.User = Depends(get_current_user),
+                                limit: int = Query(COMMENTS_PAGE_SIZE, ge=1, le=settings.PAGE_MAX_LIMIT),
+                                cursor: Optional[str] = None, stream: bool = False):
+    if stream:
+        # Check if post exists
+        if not await post_service.get_post_validators(db, post_id):
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Post with id: {post_id} not found")
+        # NDJSON, one comment per line, from the cursor to the oldest comment
+        decode_cursor(cursor)  # a bad cursor is a 400, not a broken stream
+        return StreamingResponse(ndjson_comments(post_id, cursor), media_type="application/x-ndjson")
+    
+    # Check if post exists; comment writes bump the post version and
+    # commenters' profile edits their profile version
+    validators = await post_service.get_comments_validators(db, post_id, limit=limit, cursor=cursor)
+    if not validators:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Post with id: {post_id} not found")
     
-    comments = db.query(models.Comment)\
-                .filter(models.Comment.post_id == post_id)\
-                .order_by(models.Comment.created_at.desc())\
-                .all()
+    version, last_modified = validators
+    etag = make_etag("comments", post_id, version, limit, cursor or "")
+    if is_not_modified(request, etag, last_modified):
+        return not_modified_response(etag, last_modified)
+    
+    # Only the first page is what clients poll, so only that one is cached
+    cache_key = ("comments", post_id) if cursor is None and limit == COMMENTS_PAGE_SIZE else None
+    cached = get_cached(cache_key, version) if cache_key else None
+    if cached is None:
+        comments, next_cursor = await post_service.get_comments_page(db, post_id, limit=limit, cursor=cursor)
+        cached = (dumps(comments), next_cursor)
+        if cache_key:
+            set_cached(cache_key, version, cached)
     
-    return comments
+    body, next_cursor = cached
+    return json_response(body, etag, last_modified, next_cursor)
 
-@router.post("/", status_code=status.HTTP_201_CREATED, response_model=schemas.CommentResponse)
-def create_comment(comment: schemas.CommentCreate, db: Session = Depends(get_db), 
-                   current_user: models.User = Depends(get_current_user)):
+@router.post("/", status_code=status.HTTP_201_CREATED, response_model=schemas.CommentResponse,
+             dependencies=[Depends(UserRateLimit("write"))])
+async def create_comment(comment: schemas.CommentCreate, db: AsyncSession = Depends(get_async_db), 
+                         current_user: models.User = Depends(get_current_user)):
     # Check if post exists
-    post = db.query(models.Post).filter(models.Post.id == comment.post_id).first()
+    post = await post_service.get_live_post(db, comment.post_id)
     if not post:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Post with id: {comment.post_id} not found")
     
     new_comment = models.Comment(user_id=current_user.id, **comment.dict())
     db.add(new_comment)
-    db.commit()
-    db.refresh(new_comment)
+    await adjust_comment_count(db, comment.post_id, 1)
+    await trending.record(db, [comment.post_id], trending.COMMENT_WEIGHT)
+    await db.commit()
+    invalidate_post(comment.post_id)
     
-    return new_comment
+    return await get_comment_with_author(db, new_comment.id)
 
 @router.put("/{id}", response_model=schemas.CommentResponse)
-def update_comment(id: int, updated_comment: schemas.CommentUpdate, db: Session = Depends(get_db), 
-                   current_user: models.User = Depends(get_current_user)):
-    comment_query = db.query(models.Comment).filter(models.Comment.id == id)
-    comment = comment_query.first()
+async def update_comment(id: int, updated_comment: schemas.CommentUpdate, db: AsyncSession = Depends(get_async_db), 
+                         current_user: models.User = Depends(get_current_user)):
+    comment = await db.get(models.Comment, id)
     
     if comment is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Comment with id: {id} not found")
@@ -53,16 +103,16 @@ def update_comment(id: int, updated_comment: schemas.CommentUpdate, db: Session
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to perform requested action")
     
     update_data = updated_comment.dict(exclude_unset=True)
-    comment_query.update(update_data, synchronize_session=False)
-    db.commit()
-    db.refresh(comment)
+    await db.execute(update(models.Comment).where(models.Comment.id == id).values(**update_data))
+    await touch_post(db, comment.post_id)
+    await db.commit()
+    invalidate_post(comment.post_id)
     
-    return comment
+    return await get_comment_with_author(db, id)
 
 @router.delete("/{id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_comment(id: int, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
-    comment_query = db.query(models.Comment).filter(models.Comment.id == id)
-    comment = comment_query.first()
+async def delete_comment(id: int, db: AsyncSession = Depends(get_async_db), current_user: models.User = Depends(get_current_user)):
+    comment = await db.get(models.Comment, id)
     
     if comment is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Comment with id: {id} not found")
@@ -70,7 +120,11 @@ def delete_comment(id: int, db: Session = Depends(get_db), current_user: models.
     if comment.user_id != current_user.id:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to perform requested action")
     
-    comment_query.delete(synchronize_session=False)
-    db.commit()
+    result = await db.execute(delete(models.Comment).where(models.Comment.id == id))
+    if result.rowcount:
+        await adjust_comment_count(db, comment.post_id, -1)
+        await trending.retract(db, [(comment.post_id, comment.created_at)], trending.COMMENT_WEIGHT)
+    await db.commit()
+    invalidate_post(comment.post_id)
     
     return
\ No newline at end of file
@@ -0,0 +1,57 @@
+from fastapi import APIRouter, Depends, status, HTTPException, Request, Response
+from fastapi.responses import FileResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from .. import models, schemas
+from app.database import get_async_db
+from ..utils.auth import get_current_user
+from ..utils.http_cache import make_etag, is_not_modified
+from ..utils.rate_limit import UserRateLimit
+from ..services import media as media_service
+
+router = APIRouter(
+    prefix="/media",
+    tags=["Media"]
+)
+
+# A media id is the hash of its bytes, so a URL always serves the same body
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+@router.post("/", status_code=status.HTTP_201_CREATED, response_model=schemas.MediaResponse,
+             dependencies=[Depends(UserRateLimit("upload"))])
+async def upload_media(request: Request, db: AsyncSession = Depends(get_async_db),
+                       current_user: models.User = Depends(get_current_user)):
+    # The body is the image itself (not a multipart form), written to disk as it arrives
+    media = await media_service.save_upload(db, request, current_user.id)
+    return media_service.media_response(media)
+
+async def media_file(db: AsyncSession, request: Request, media_id: str, thumbnail: bool):
+    info = await media_service.get_media_info(db, media_id) if media_service.is_media_id(media_id) else None
+    if info is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Media with id: {media_id} not found")
+
+    content_type, thumbnail_id = info
+    file_id, cache_control = media_id, IMMUTABLE
+    if thumbnail:
+        if thumbnail_id:
+            file_id, content_type = thumbnail_id, media_service.THUMBNAIL_CONTENT_TYPE
+        else:
+            # Not derived yet: the original, revalidated until the thumbnail replaces it
+            cache_control = "public, no-cache"
+
+    headers = {"ETag": make_etag(file_id), "Cache-Control": cache_control}
+    if is_not_modified(request, headers["ETag"], None):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    # FileResponse answers Range and If-Range itself, streams the file in
+    # chunks and, on servers with the ASGI pathsend extension, hands the path
+    # to the server to send without copying it through Python
+    return FileResponse(media_service.media_path(file_id), media_type=content_type, headers=headers)
+
+# Public, like any static file: ids are unguessable and <img> tags send no token
+@router.api_route("/{media_id}", methods=["GET", "HEAD"])
+async def get_media(media_id: str, request: Request, db: AsyncSession = Depends(get_async_db)):
+    return await media_file(db, request, media_id, thumbnail=False)
+
+@router.api_route("/{media_id}/thumbnail", methods=["GET", "HEAD"])
+async def get_media_thumbnail(media_id: str, request: Request, db: AsyncSession = Depends(get_async_db)):
+    return await media_file(db, request, media_id, thumbnail=True)
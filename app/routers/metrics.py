@@ -0,0 +1,82 @@
+from fastapi import APIRouter, Response
+from app.core.passwords import password_hasher
+from app.services.deletion import deletion_worker
+from app.services.like_index import like_index
+from app.services.likes import like_aggregator
+from app.services.media import media_cache, thumbnailer
+from app.services.user import username_index
+from app.utils.auth import token_cache, principal_cache
+from app.utils.http_cache import response_cache
+from app.utils.metrics import registry
+from app.utils import rate_limit
+
+router = APIRouter(tags=["Metrics"])
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Stats the services already keep, copied into the registry on each scrape
+bcrypt_calls = registry.counter("bcrypt_calls_total", "bcrypt calls by kind (hash, verify, rehash, rejected).", ("kind",))
+bcrypt_seconds = registry.counter("bcrypt_seconds_total", "Time bcrypt calls spent running (busy) and queued (wait).", ("state",))
+bcrypt_pool = registry.gauge("bcrypt_pool_calls", "bcrypt calls queued and running in the process pool.", ("state",))
+cache_events = registry.counter("cache_events_total", "In-process cache hits, misses and evictions.", ("cache", "event"))
+cache_size = registry.gauge("cache_entries", "Entries held by each in-process cache.", ("cache",))
+like_index_bytes = registry.gauge("like_index_bytes", "Memory held by the like index, against LIKE_INDEX_MAX_BYTES.")
+like_events = registry.counter("like_write_behind_events_total", "Write-behind like aggregator counters.", ("event",))
+like_pending = registry.gauge("like_write_behind_pending", "Like toggles waiting for (or in) a flush.", ("state",))
+thumbnails = registry.counter("media_thumbnails_total", "Thumbnails derived by the worker pool, by result.", ("result",))
+thumbnails_pending = registry.gauge("media_thumbnails_pending", "Thumbnails queued or being derived.")
+deletion_events = registry.counter("deletion_events_total", "Deletion job batches, rows deleted, finished jobs and failed batches.", ("event",))
+rate_limited = registry.counter("rate_limit_requests_total", "Requests checked by each rate limit rule, by result.", ("rule", "result"))
+rate_limit_keys = registry.gauge("rate_limit_keys", "Token buckets held by the rate limit backend.")
+rate_limit_evictions = registry.counter("rate_limit_evictions_total", "Token buckets dropped once refilled or over the key limit.")
+
+CACHES = {"token": token_cache, "principal": principal_cache, "response": response_cache, "media": media_cache,
+          "likes": like_index}
+
+
+def collect():
+    hasher = password_hasher.metrics()
+    for kind in ("hash", "verify", "rehash", "rejected"):
+        bcrypt_calls.set(kind, value=hasher[kind])
+    bcrypt_seconds.set("busy", value=hasher["busy_seconds"])
+    bcrypt_seconds.set("wait", value=hasher["wait_seconds"])
+    bcrypt_pool.set("queued", value=hasher["queue_depth"])
+    bcrypt_pool.set("running", value=hasher["in_flight"])
+
+    for name, cache in CACHES.items():
+        stats = cache.metrics()
+        for event in ("hits", "misses", "evictions"):
+            cache_events.set(name, event, value=stats[event])
+        cache_size.set(name, value=stats["size"])
+    cache_size.set("usernames", value=len(username_index))
+    like_index_bytes.set(value=like_index.metrics()["bytes"])
+
+    likes = like_aggregator.metrics()
+    for event in ("toggles", "cancelled", "flushes", "written", "failed_flushes"):
+        like_events.set(event, value=likes[event])
+    like_pending.set("pending", value=likes["pending"])
+    like_pending.set("flushing", value=likes["flushing"])
+
+    media = thumbnailer.metrics()
+    for result in ("created", "failed"):
+        thumbnails.set(result, value=media[result])
+    thumbnails_pending.set(value=media["pending"])
+
+    deletions = deletion_worker.metrics()
+    for event in ("batches", "rows", "finished", "failed_batches"):
+        deletion_events.set(event, value=deletions[event])
+
+    for (rule, result), count in rate_limit.stats.items():
+        rate_limited.set(rule, result, value=count)
+    buckets = rate_limit.backend.metrics()
+    if buckets:
+        rate_limit_keys.set(value=buckets["keys"])
+        rate_limit_evictions.set(value=buckets["evictions"])
+
+
+registry.add_collector(collect)
+
+
+@router.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    return Response(content=registry.render(), media_type=CONTENT_TYPE)
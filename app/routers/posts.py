@@ -1,110 +1,118 @@
-from fastapi import APIRouter, Depends, status, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, status, HTTPException, Query, Request
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
 from .. import models, schemas
+from app.config import settings
 from app.schemas.post import PostResponse
-from app.api.auth import get_db
-from typing import List, Optional
+from app.database import get_async_db
+from typing import Any, Dict, List, Optional
 from ..utils.auth import get_current_user
-from sqlalchemy import func
 from ..models import user
+from ..services import post as post_service
+from ..services import trending
+from ..services import deletion
+from ..services.media import resolve_post_media
+from ..services.counters import post_changed
+from ..services.like_index import like_index
+from ..services.likes import like_aggregator
+from ..utils.http_cache import (make_etag, is_not_modified, not_modified_response, json_response,
+                                get_cached, set_cached, invalidate_post)
+from ..utils.rate_limit import UserRateLimit
+from ..utils.serialization import ORJSONResponse, dumps
 
 router = APIRouter(
     prefix="/posts",
     tags=["Posts"]
 )
 
-@router.get("/", response_model=List[PostResponse])
-def get_posts(db: Session = Depends(get_db), current_user: models.user = Depends(get_current_user),
-              limit: int = 10, skip: int = 0, search: Optional[str] = ""):
-    
-    posts = db.query(models.Post, 
-                    func.count(models.Like.post_id).label("like_count"),
-                    func.count(models.Comment.post_id).label("comment_count"))\
-              .join(models.user, models.Post.user_id == models.user.id, isouter=True)\
-              .join(models.Like, models.Like.post_id == models.Post.id, isouter=True)\
-              .join(models.Comment, models.Comment.post_id == models.Post.id, isouter=True)\
-              .filter(models.Post.content.contains(search))\
-              .group_by(models.Post.id, models.user.id)\
-              .order_by(models.Post.created_at.desc())\
-              .limit(limit)\
-              .offset(skip)\
-              .all()
-    
-    results = []
-    for post, like_count, comment_count in posts:
-        liked_by_user = db.query(models.Like).filter(
-            models.Like.post_id == post.id, 
-            models.Like.user_id == current_user.id
-        ).first() is not None
-        
-        post_dict = {**post.__dict__}
-        post_dict["like_count"] = like_count
-        post_dict["comment_count"] = comment_count
-        post_dict["liked_by_user"] = liked_by_user
-        results.append(post_dict)
-    
-    return results
+def is_search(request: Request) -> bool:
+    # Only searches scan the posts; plain feed pages are index range reads
+    return bool(request.query_params.get("search"))
 
-@router.post("/", status_code=status.HTTP_201_CREATED, response_model=schemas.PostResponse)
-def create_post(post: schemas.PostCreate, db: Session = Depends(get_db), 
-                current_user: models.user = Depends(get_current_user)):
-    new_post = models.Post(user_id=current_user.id, **post.dict())
-    db.add(new_post)
-    db.commit()
-    db.refresh(new_post)
-    
-    post_with_author = db.query(models.Post, 
-                              func.count(models.Like.post_id).label("like_count"),
-                              func.count(models.Comment.post_id).label("comment_count"))\
-                          .join(models.user, models.Post.user_id == models.user.id)\
-                          .outerjoin(models.Like, models.Like.post_id == models.Post.id)\
-                          .outerjoin(models.Comment, models.Comment.post_id == models.Post.id)\
-                          .filter(models.Post.id == new_post.id)\
-                          .group_by(models.Post.id, models.user.id)\
-                          .first()
-    
-    post, like_count, comment_count = post_with_author
-    post_dict = {**post.__dict__}
-    post_dict["like_count"] = like_count
-    post_dict["comment_count"] = comment_count
-    post_dict["liked_by_user"] = False
-    
-    return post_dict
+@router.get("/", response_model=List[PostResponse], dependencies=[Depends(UserRateLimit("search", when=is_search))])
+async def get_posts(db: AsyncSession = Depends(get_async_db), current_user: models.User = Depends(get_current_user),
+                    limit: int = Query(10, ge=1, le=settings.PAGE_MAX_LIMIT), skip: int = Query(0, ge=0),
+                    search: Optional[str] = "", cursor: Optional[str] = None):
+    results, next_cursor = await post_service.get_feed_page(db, current_user.id, limit=limit, skip=skip,
+                                                            search=search, cursor=cursor)
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+    
+    return ORJSONResponse(results, headers=headers)
 
-@router.get("/{id}", response_model=schemas.PostResponse)
-def get_post(id: int, db: Session = Depends(get_db), current_user: models.user = Depends(get_current_user)):
-    post_query = db.query(models.Post, 
-                        func.count(models.Like.post_id).label("like_count"),
-                        func.count(models.Comment.post_id).label("comment_count"))\
-                   .join(models.user, models.Post.user_id == models.user.id)\
-                   .outerjoin(models.Like, models.Like.post_id == models.Post.id)\
-                   .outerjoin(models.Comment, models.Comment.post_id == models.Post.id)\
-                   .filter(models.Post.id == id)\
-                   .group_by(models.Post.id, models.user.id)
-    
-    post_result = post_query.first()
-    
-    if not post_result:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Post with id: {id} not found")
+@router.post("/", status_code=status.HTTP_201_CREATED, response_model=schemas.PostResponse,
+             dependencies=[Depends(UserRateLimit("write"))])
+async def create_post(post: schemas.PostCreate, db: AsyncSession = Depends(get_async_db), 
+                      current_user: models.User = Depends(get_current_user)):
+    new_post = await post_service.create_post(db, post, current_user.id)
     
-    post, like_count, comment_count = post_result
-    liked_by_user = db.query(models.Like).filter(
-        models.Like.post_id == post.id, 
-        models.Like.user_id == current_user.id
-    ).first() is not None
+    return await post_service.get_post_response(db, new_post.id, current_user.id)
+
+@router.get("/batch", response_model=List[PostResponse])
+async def get_posts_batch(ids: str, db: AsyncSession = Depends(get_async_db), 
+                          current_user: models.User = Depends(get_current_user)):
+    try:
+        post_ids = [int(post_id) for post_id in ids.split(",") if post_id.strip()]
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="ids must be a comma-separated list of integers")
+    post_service.check_batch_size(post_ids)
+    
+    return ORJSONResponse(await post_service.get_posts_by_ids(db, post_ids, current_user.id))
+
+@router.post("/bulk", status_code=status.HTTP_201_CREATED, response_model=List[schemas.BulkPostResult],
+             dependencies=[Depends(UserRateLimit("write"))])
+async def bulk_create_posts(posts: List[Dict[str, Any]], db: AsyncSession = Depends(get_async_db), 
+                            current_user: models.User = Depends(get_current_user)):
+    # Items are validated one by one so a bad row does not reject the batch
+    return await post_service.bulk_create_posts(db, posts, current_user.id)
+
+@router.post("/bulk/likes", status_code=status.HTTP_201_CREATED, response_model=List[schemas.BulkLikeResult],
+             dependencies=[Depends(UserRateLimit("like"))])
+async def bulk_like_posts(likes: schemas.BulkLikeCreate, db: AsyncSession = Depends(get_async_db), 
+                          current_user: models.User = Depends(get_current_user)):
+    return await post_service.bulk_like_posts(db, likes.post_ids, current_user.id)
+
+@router.get("/trending", response_model=List[PostResponse])
+async def get_trending_posts(db: AsyncSession = Depends(get_async_db), current_user: models.User = Depends(get_current_user),
+                             limit: int = Query(20, ge=1, le=settings.TRENDING_TOP_K)):
+    # Ranked from the in-memory top-K; only the posts themselves are read
+    post_ids = await trending.trending_post_ids(db, limit)
     
-    post_dict = {**post.__dict__}
-    post_dict["like_count"] = like_count
-    post_dict["comment_count"] = comment_count
-    post_dict["liked_by_user"] = liked_by_user
+    return ORJSONResponse(await post_service.get_posts_by_ids(db, post_ids, current_user.id))
+
+@router.get("/{id}", response_model=schemas.PostResponse)
+async def get_post(id: int, request: Request, db: AsyncSession = Depends(get_async_db), 
+                   current_user: models.User = Depends(get_current_user)):
+    validators = await post_service.get_post_validators(db, id)
+    
+    if not validators:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Post with id: {id} not found")
     
-    return post_dict
+    # liked_by_user is the only per-viewer field, so it is part of the ETag and
+    # of the cache key instead of the viewer id. It comes from the like index,
+    # as in the body, or from this worker's buffered toggles until they flush
+    version, last_modified = validators
+    pending_state = like_aggregator.pending_state(current_user.id, id)
+    liked = id in await like_index.liked(db, current_user.id, [id]) if pending_state is None else pending_state
+    pending_delta = like_aggregator.pending_delta(id)
+    etag = make_etag("post", id, version, int(liked), pending_delta)
+    if is_not_modified(request, etag, last_modified):
+        return not_modified_response(etag, last_modified)
+    
+    cache_key = ("post", id, liked)
+    body = get_cached(cache_key, (version, pending_delta))
+    if body is None:
+        post = await post_service.get_post_response(db, id, current_user.id)
+        if not post:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Post with id: {id} not found")
+        body = dumps(post)
+        set_cached(cache_key, (version, pending_delta), body)
+    
+    return json_response(body, etag, last_modified)
 
 @router.put("/{id}", response_model=schemas.PostResponse)
-def update_post(id: int, updated_post: schemas.PostUpdate, db: Session = Depends(get_db), 
-                current_user: models.user = Depends(get_current_user)):
-    post_query = db.query(models.Post).filter(models.Post.id == id)
-    post = post_query.first()
+async def update_post(id: int, updated_post: schemas.PostUpdate, db: AsyncSession = Depends(get_async_db), 
+                      current_user: models.User = Depends(get_current_user)):
+    post = await post_service.get_live_post(db, id)
     
     if post is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Post with id: {id} not found")
@@ -112,39 +120,16 @@ def update_post(id: int, updated_post: schemas.PostUpdate, db: Session = Depends
     if post.user_id != current_user.id:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to perform requested action")
     
-    update_data = updated_post.dict(exclude_unset=True)
-    post_query.update(update_data, synchronize_session=False)
-    db.commit()
-    db.refresh(post)
-    
-    # Get post with counts
-    post_with_counts = db.query(models.Post, 
-                              func.count(models.Like.post_id).label("like_count"),
-                              func.count(models.Comment.post_id).label("comment_count"))\
-                          .join(models.user, models.Post.user_id == models.user.id)\
-                          .outerjoin(models.Like, models.Like.post_id == models.Post.id)\
-                          .outerjoin(models.Comment, models.Comment.post_id == models.Post.id)\
-                          .filter(models.Post.id == id)\
-                          .group_by(models.Post.id, models.user.id)\
-                          .first()
-    
-    post, like_count, comment_count = post_with_counts
-    liked_by_user = db.query(models.Like).filter(
-        models.Like.post_id == post.id, 
-        models.Like.user_id == current_user.id
-    ).first() is not None
-    
-    post_dict = {**post.__dict__}
-    post_dict["like_count"] = like_count
-    post_dict["comment_count"] = comment_count
-    post_dict["liked_by_user"] = liked_by_user
-    
-    return post_dict
+    update_data = await resolve_post_media(db, updated_post.dict(exclude_unset=True))
+    await db.execute(update(models.Post).where(models.Post.id == id).values(**update_data, **post_changed()))
+    await db.commit()
+    invalidate_post(id)
+    
+    return await post_service.get_post_response(db, id, current_user.id)
 
 @router.delete("/{id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_post(id: int, db: Session = Depends(get_db), current_user: models.user = Depends(get_current_user)):
-    post_query = db.query(models.Post).filter(models.Post.id == id)
-    post = post_query.first()
+async def delete_post(id: int, db: AsyncSession = Depends(get_async_db), current_user: models.User = Depends(get_current_user)):
+    post = await post_service.get_live_post(db, id)
     
     if post is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Post with id: {id} not found")
@@ -152,31 +137,19 @@ def delete_post(id: int, db: Session = Depends(get_db), current_user: models.use
     if post.user_id != current_user.id:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to perform requested action")
     
-    post_query.delete(synchronize_session=False)
-    db.commit()
+    # Hidden now; its likes, comments and timeline entries go in batches
+    await deletion.delete_post(db, post)
     
     return
 
-@router.post("/{id}/like", status_code=status.HTTP_201_CREATED)
-def like_post(id: int, db: Session = Depends(get_db), current_user: models.user = Depends(get_current_user)):
-    post = db.query(models.Post).filter(models.Post.id == id).first()
-    if not post:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Post with id: {id} not found")
+@router.post("/{id}/like", status_code=status.HTTP_201_CREATED, dependencies=[Depends(UserRateLimit("like"))])
+async def like_post(id: int, db: AsyncSession = Depends(get_async_db), current_user: models.User = Depends(get_current_user)):
+    liked = await post_service.like_post(db, id, current_user.id)
     
-    like_query = db.query(models.Like).filter(
-        models.Like.post_id == id, 
-        models.Like.user_id == current_user.id
-    )
-    found_like = like_query.first()
-    
-    if found_like:
-        # If already liked, remove the like
-        like_query.delete(synchronize_session=False)
-        db.commit()
-        return {"message": "Post unliked"}
-    else:
-        # Create a new like
-        new_like = models.Like(post_id=id, user_id=current_user.id)
-        db.add(new_like)
-        db.commit()
-        return {"message": "Post liked"}
\ No newline at end of file
+    return {"message": "Post liked" if liked else "Post unliked"}
+
+@router.get("/{id}/likes", response_model=List[int])
+async def get_post_likes(id: int, db: AsyncSession = Depends(get_async_db), current_user: models.User = Depends(get_current_user),
+                         limit: int = Query(100, ge=1, le=settings.PAGE_MAX_LIMIT), skip: int = Query(0, ge=0)):
+    # User ids that liked the post, in id order, from the like index
+    return await post_service.get_post_likes(db, id, skip=skip, limit=limit)
\ No newline at end of file
@@ -0,0 +1,24 @@
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+from .. import models
+from app.config import settings
+from app.schemas.post import PostResponse
+from app.database import get_async_db
+from ..utils.auth import get_current_user
+from ..services import timeline as timeline_service
+from ..utils.serialization import ORJSONResponse
+
+router = APIRouter(
+    prefix="/timeline",
+    tags=["Timeline"]
+)
+
+@router.get("/", response_model=List[PostResponse])
+async def get_home_timeline(db: AsyncSession = Depends(get_async_db),
+                            current_user: models.User = Depends(get_current_user),
+                            limit: int = Query(10, ge=1, le=settings.PAGE_MAX_LIMIT), cursor: Optional[str] = None):
+    results, next_cursor = await timeline_service.get_home_timeline(db, current_user.id, limit=limit, cursor=cursor)
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+    
+    return ORJSONResponse(results, headers=headers)
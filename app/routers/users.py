@@ -1,62 +1,52 @@
-from fastapi import APIRouter, Depends, status, HTTPException
-from sqlalchemy.orm import Session
-from .. import models, schemas, utils
+from fastapi import APIRouter, Depends, status, HTTPException, Query, Response
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from .. import models, schemas
 from ..schemas.user import UserCreate, UserResponse, UserDetail
-from ..database import get_db
-from typing import List
-from ..utils.auth import get_current_user
+from ..config import settings
+from ..database import get_async_db
+from typing import List, Optional
+from ..utils.auth import get_current_user, invalidate_user
+from ..services import timeline as timeline_service
+from ..services import user as user_service
+from ..services import deletion
+from ..services.counters import profile_changed
 
 router = APIRouter(
     prefix="/users",
     tags=["Users"]
 )
 
-@router.post("/", status_code=status.HTTP_201_CREATED, response_model=UserResponse)
-def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
-    # Hash the password
-    hashed_password = utils.get_password_hash(user.password)
-    user.password = hashed_password
-    
-    # Check if email already exists
-    email_exists = db.query(models.User).filter(models.User.email == user.email).first()
-    if email_exists:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Email already registered")
-    
-    # Check if username already exists
-    username_exists = db.query(models.User).filter(models.User.username == user.username).first()
-    if username_exists:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Username already taken")
-    
-    new_user = models.User(**user.dict())
-    db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
-    
-    return new_user
+# Sign-up (POST /users/) lives in app/api/users.py
+
+@router.get("/autocomplete", response_model=List[schemas.UserResponse])
+async def autocomplete_users(q: str = Query(..., min_length=1), limit: int = Query(10, ge=1, le=settings.PAGE_MAX_LIMIT),
+                             db: AsyncSession = Depends(get_async_db)):
+    return await user_service.autocomplete_usernames(db, q, limit=limit)
 
 @router.get("/{id}", response_model=schemas.UserDetail)
-def get_user(id: int, db: Session = Depends(get_db)):
-    user = db.query(models.User).filter(models.User.id == id).first()
+async def get_user(id: int, db: AsyncSession = Depends(get_async_db)):
+    user = await db.get(models.User, id)
     
-    if not user:
+    if not user or user.deleted_at is not None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"User with id: {id} not found")
     
-    post_count = db.query(models.Post).filter(models.Post.user_id == id).count()
-    user_dict = user.__dict__.copy()
-    user_dict["post_count"] = post_count
-    
-    return user_dict
+    return user
 
 @router.get("/", response_model=List[schemas.UserResponse])
-def get_users(db: Session = Depends(get_db)):
-    users = db.query(models.User).all()
+async def get_users(response: Response, db: AsyncSession = Depends(get_async_db),
+                    limit: int = Query(50, ge=1, le=settings.PAGE_MAX_LIMIT), search: Optional[str] = "",
+                    cursor: Optional[str] = None):
+    users, next_cursor = await user_service.get_users_page(db, limit=limit, search=search, cursor=cursor)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    
     return users
 
 @router.put("/{id}", response_model=schemas.UserResponse)
-def update_user(id: int, updated_user: schemas.UserUpdate, db: Session = Depends(get_db), 
-                current_user: models.User = Depends(get_current_user)):
-    user_query = db.query(models.User).filter(models.User.id == id)
-    user = user_query.first()
+async def update_user(id: int, updated_user: schemas.UserUpdate, db: AsyncSession = Depends(get_async_db), 
+                      current_user: models.User = Depends(get_current_user)):
+    user = await db.get(models.User, id)
     
     if user is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"User with id: {id} not found")
@@ -65,8 +55,48 @@ def update_user(id: int, updated_user: schemas.UserUpdate, db: Session = Depends
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to perform requested action")
     
     update_data = updated_user.dict(exclude_unset=True)
-    user_query.update(update_data, synchronize_session=False)
-    db.commit()
-    db.refresh(user)
     
-    return user
\ No newline at end of file
+    # Check if the new username is free
+    if "username" in update_data:
+        if not update_data["username"]:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Username cannot be empty")
+        username_taken = await db.scalar(select(models.User.id).where(models.User.username == update_data["username"],
+                                                                      models.User.id != id))
+        if username_taken:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Username already taken")
+    
+    # Username and picture are shown with the user's posts: their ETags change
+    if update_data.keys() & {"username", "profile_image"}:
+        update_data.update(profile_changed())
+    if "username" in update_data:
+        update_data["username_key"] = user_service.username_key(update_data["username"])
+    await db.execute(update(models.User).where(models.User.id == id).values(**update_data))
+    await db.commit()
+    invalidate_user(id)
+    await db.refresh(user)
+    user_service.index_user(user)
+    
+    return user
+
+@router.delete("/{id}", status_code=status.HTTP_202_ACCEPTED, response_model=schemas.DeletionJobResponse)
+async def delete_user(id: int, db: AsyncSession = Depends(get_async_db), current_user: models.User = Depends(get_current_user)):
+    if id != current_user.id:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to perform requested action")
+    
+    # The account is closed now; posts, comments, likes and follows are
+    # removed in the background (the returned job tracks the progress)
+    return await deletion.delete_user(db, id)
+
+@router.post("/{id}/follow", status_code=status.HTTP_201_CREATED)
+async def follow_user(id: int, db: AsyncSession = Depends(get_async_db), current_user: models.User = Depends(get_current_user)):
+    if not await timeline_service.follow_user(db, current_user.id, id):
+        return {"message": "Already following"}
+    
+    return {"message": "User followed"}
+
+@router.delete("/{id}/follow", status_code=status.HTTP_204_NO_CONTENT)
+async def unfollow_user(id: int, db: AsyncSession = Depends(get_async_db), current_user: models.User = Depends(get_current_user)):
+    if not await timeline_service.unfollow_user(db, current_user.id, id):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Not following user with id: {id}")
+    
+    return
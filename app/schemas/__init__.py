@@ -1 +1,6 @@
-from .post import PostResponse, PostCreate, PostUpdate
+from .post import PostResponse, PostCreate, PostUpdate, BulkPostResult, BulkLikeCreate, BulkLikeResult
+from .comment import CommentResponse, CommentCreate, CommentUpdate
+from .user import UserCreate, UserOut, UserResponse, UserDetail, UserUpdate
+from .auth import UserLogin, Token, TokenData
+from .media import MediaResponse
+from .deletion import DeletionJobResponse
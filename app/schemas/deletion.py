@@ -0,0 +1,15 @@
+from pydantic import BaseModel
+from datetime import datetime
+from typing import Optional
+
+class DeletionJobResponse(BaseModel):
+    id: int
+    kind: str
+    target_id: int
+    phase: Optional[str] = None
+    deleted_rows: int
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
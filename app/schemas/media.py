@@ -0,0 +1,11 @@
+from pydantic import BaseModel
+from datetime import datetime
+from typing import Optional
+
+class MediaResponse(BaseModel):
+    id: str
+    content_type: str
+    size: int
+    url: str
+    thumbnail_url: str
+    created_at: Optional[datetime] = None
@@ -6,6 +6,7 @@ from .user import UserResponse
 class PostBase(BaseModel):
     content: str
     image_url: Optional[str] = None
+    media_id: Optional[str] = None
 
 class PostCreate(PostBase):
     pass
@@ -13,6 +14,7 @@ class PostCreate(PostBase):
 class PostUpdate(PostBase):
     content: Optional[str] = None
     image_url: Optional[str] = None
+    media_id: Optional[str] = None
 
 class PostResponse(PostBase):
     id: int
@@ -25,4 +27,18 @@ class PostResponse(PostBase):
     liked_by_user: bool = False
     
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+# Batch endpoints: one result per item, in request order
+class BulkPostResult(BaseModel):
+    index: int
+    status: str
+    id: Optional[int] = None
+    detail: Optional[str] = None
+
+class BulkLikeCreate(BaseModel):
+    post_ids: List[int]
+
+class BulkLikeResult(BaseModel):
+    post_id: int
+    status: str
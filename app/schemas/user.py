@@ -29,3 +29,17 @@ class UserResponse(BaseModel):
 
     class Config:
         from_attributes = True
+
+# Perfil público com contadores (GET /users/{id})
+class UserDetail(UserResponse):
+    bio: str | None = None
+    created_at: datetime
+    post_count: int = 0
+    follower_count: int = 0
+    following_count: int = 0
+
+# Atualização parcial do próprio perfil
+class UserUpdate(BaseModel):
+    username: str | None = None
+    bio: str | None = None
+    profile_image: str | None = None
@@ -0,0 +1,178 @@
+import random
+import time
+from array import array
+from datetime import datetime, timedelta, timezone
+from itertools import accumulate
+
+from sqlalchemy import func, select, text
+
+from app.core.security import hash_password
+from app.models import User, Post, Like, Comment
+from app.services.search import post_search_paused
+
+# Synthetic data at production scale: `python -m app.cli seed`. Rows go in
+# through Core executemany in large batches (no ORM objects, no flushes), ids
+# are assigned here so nothing is read back, and the denormalized counters are
+# computed up front instead of by repair-counters. Popularity is Zipf-like:
+# post rank r gets a share proportional to 1 / r**s of the likes and
+# comments, and user rank r writes a share proportional to 1 / r**s of the
+# posts. The same seed always produces the same rows. Follows (and so home
+# timelines) are not generated.
+
+PASSWORD = "password"
+WORDS = ("the be to of and a in that have it for not on with he as you do at this but his by from they we say her "
+         "she or an will my one all would there their what so up out if about who get which go me when make can like "
+         "time no just him know take people into year your good some could them see other than then now look only "
+         "come its over think also back after use two how our work first well way even new want because any these "
+         "give day most us").split()
+
+
+def zipf_cum_weights(n: int, exponent: float):
+    return list(accumulate(1 / (rank + 1) ** exponent for rank in range(n)))
+
+
+def zipf_counts(n: int, total: int, exponent: float, cap: int, rng: random.Random):
+    # Splits `total` over n ranks in Zipf proportions, at most `cap` each (a
+    # post cannot have more likes than there are users). What the capped
+    # ranks lose is handed to the others so the total still adds up.
+    weights = [1 / (rank + 1) ** exponent for rank in range(n)]
+    shares = [0.0] * n
+    remaining = float(min(total, cap * n))
+    open_ranks = list(range(n))
+    while remaining > 0.5 and open_ranks:
+        weight = sum(weights[rank] for rank in open_ranks)
+        still_open = []
+        spent = 0.0
+        for rank in open_ranks:
+            share = min(remaining * weights[rank] / weight, cap - shares[rank])
+            shares[rank] += share
+            spent += share
+            if shares[rank] < cap:
+                still_open.append(rank)
+        remaining -= spent
+        if len(still_open) == len(open_ranks):
+            break
+        open_ranks = still_open
+    # Randomized rounding keeps the expected total
+    return array("l", (min(int(share) + (rng.random() < share % 1), cap) for share in shares))
+
+
+# Generated timestamps end here rather than at the current time, so the same
+# seed gives the same rows on every run
+SEED_END = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+class Seeder:
+    def __init__(self, engine, users: int, posts: int, likes: int, comments: int, seed: int = 42,
+                 exponent: float = 1.0, batch_size: int = 50_000, days: int = 365, end: datetime = SEED_END,
+                 log=print):
+        self.engine = engine
+        self.counts = {"users": users, "posts": posts, "likes": likes, "comments": comments}
+        self.rng = random.Random(seed)
+        self.exponent = exponent
+        self.batch_size = batch_size
+        self.log = log
+        self.end = end
+        self.start = self.end - timedelta(days=days)
+
+    def _insert(self, table, rows):
+        # One transaction per batch keeps the write lock short on SQLite
+        batch = []
+        inserted = 0
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= self.batch_size:
+                with self.engine.begin() as conn:
+                    conn.execute(table.insert(), batch)
+                inserted += len(batch)
+                batch = []
+        if batch:
+            with self.engine.begin() as conn:
+                conn.execute(table.insert(), batch)
+            inserted += len(batch)
+        return inserted
+
+    def _timed(self, name, table, rows):
+        t0 = time.perf_counter()
+        inserted = self._insert(table, rows)
+        elapsed = time.perf_counter() - t0
+        self.log(f"{name:<9} {inserted:>11,} rows in {elapsed:7.1f}s ({inserted / max(elapsed, 1e-9):,.0f} rows/s)")
+
+    def _post_time(self, post_index: int, n_posts: int):
+        # Posts are spread evenly over the period in id order
+        return self.start + (self.end - self.start) * (post_index / max(n_posts, 1))
+
+    def run(self):
+        n_users, n_posts = self.counts["users"], self.counts["posts"]
+        n_likes, n_comments = self.counts["likes"], self.counts["comments"]
+        rng = self.rng
+
+        with self.engine.connect() as conn:
+            first_user = (conn.scalar(select(func.max(User.id))) or 0) + 1
+            first_post = (conn.scalar(select(func.max(Post.id))) or 0) + 1
+            first_comment = (conn.scalar(select(func.max(Comment.id))) or 0) + 1
+
+        # Rank -> id: the popular users and posts are scattered over the id range
+        user_ids = list(range(first_user, first_user + n_users))
+        rng.shuffle(user_ids)
+        post_ranks = list(range(n_posts))
+        rng.shuffle(post_ranks)
+
+        # Everything the counters need is drawn before the first insert
+        authors = array("l", rng.choices(user_ids, cum_weights=zipf_cum_weights(n_users, self.exponent), k=n_posts))
+        post_counts = {}
+        for author in authors:
+            post_counts[author] = post_counts.get(author, 0) + 1
+
+        likes_by_rank = zipf_counts(n_posts, n_likes, self.exponent, n_users, rng)
+        like_counts = array("l", [0]) * n_posts
+        for rank, count in enumerate(likes_by_rank):
+            like_counts[post_ranks[rank]] = count
+
+        comment_posts = array("l", (post_ranks[rank] for rank in rng.choices(
+            range(n_posts), cum_weights=zipf_cum_weights(n_posts, self.exponent), k=n_comments))) if n_posts else array("l")
+        comment_counts = array("l", [0]) * n_posts
+        for index in comment_posts:
+            comment_counts[index] += 1
+
+        # A single hash for every account: bcrypt per row would take hours
+        password = hash_password(PASSWORD)
+
+        self._timed("users", User.__table__, (
+            {"id": user_id, "email": f"user{user_id}@example.com", "username": f"user{user_id}",
+             "username_key": f"user{user_id}", "password": password, "post_count": post_counts.get(user_id, 0),
+             "created_at": self.start - timedelta(minutes=user_id - first_user)}
+            for user_id in range(first_user, first_user + n_users)
+        ))
+
+        with post_search_paused(self.engine):
+            self._timed("posts", Post.__table__, (
+                {"id": first_post + index, "user_id": authors[index],
+                 "content": " ".join(rng.choices(WORDS, k=rng.randint(5, 30))),
+                 "created_at": self._post_time(index, n_posts),
+                 "like_count": like_counts[index], "comment_count": comment_counts[index]}
+                for index in range(n_posts)
+            ))
+
+        def likes():
+            for rank, count in enumerate(likes_by_rank):
+                post_id = first_post + post_ranks[rank]
+                for user_index in rng.sample(range(n_users), count):
+                    yield {"user_id": first_user + user_index, "post_id": post_id}
+
+        self._timed("likes", Like.__table__, likes())
+
+        self._timed("comments", Comment.__table__, (
+            {"id": first_comment + number, "post_id": first_post + index,
+             "user_id": first_user + rng.randrange(n_users),
+             "content": " ".join(rng.choices(WORDS, k=rng.randint(3, 15))),
+             "created_at": min(self._post_time(index, n_posts) + timedelta(seconds=rng.randrange(86_400)), self.end)}
+            for number, index in enumerate(comment_posts)
+        ))
+
+        if self.engine.dialect.name == "postgresql":
+            # Ids were given explicitly, so the serial sequences did not move
+            with self.engine.begin() as conn:
+                for table in ("users", "posts", "comments"):
+                    conn.execute(text(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+                                      f"(SELECT coalesce(max(id), 1) FROM {table}))"))
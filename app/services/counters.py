@@ -0,0 +1,77 @@
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from app.models.post import Post, Like
+from app.models.comment import Comment
+from app.models.user import User
+from app.models.follow import Follow
+
+# Denormalized counters. The adjust_* helpers only emit the UPDATE; the caller
+# commits it together with the write that changed the count. Counter updates
+# keep posts.updated_at as is, it tracks edits to the post itself, but bump
+# posts.version so cached responses and ETags change with the counts.
+
+def post_changed():
+    return {"version": Post.version + 1, "changed_at": func.now()}
+
+def profile_changed():
+    return {"profile_version": User.profile_version + 1, "profile_changed_at": func.now()}
+
+async def touch_post(db: AsyncSession, post_id: int):
+    await db.execute(update(Post).where(Post.id == post_id).values(updated_at=Post.updated_at, **post_changed()))
+
+async def adjust_like_count(db: AsyncSession, post_id: int, delta: int):
+    await db.execute(update(Post).where(Post.id == post_id)
+                     .values(like_count=Post.like_count + delta, updated_at=Post.updated_at, **post_changed()))
+
+async def adjust_like_counts(db: AsyncSession, post_ids, delta: int):
+    await db.execute(update(Post).where(Post.id.in_(post_ids))
+                     .values(like_count=Post.like_count + delta, updated_at=Post.updated_at, **post_changed()))
+
+async def adjust_comment_count(db: AsyncSession, post_id: int, delta: int):
+    await db.execute(update(Post).where(Post.id == post_id)
+                     .values(comment_count=Post.comment_count + delta, updated_at=Post.updated_at, **post_changed()))
+
+async def adjust_post_count(db: AsyncSession, user_id: int, delta: int):
+    await db.execute(update(User).where(User.id == user_id).values(post_count=User.post_count + delta))
+
+async def adjust_follow_counts(db: AsyncSession, follower_id: int, followee_id: int, delta: int):
+    await db.execute(update(User).where(User.id == follower_id).values(following_count=User.following_count + delta))
+    await db.execute(update(User).where(User.id == followee_id).values(follower_count=User.follower_count + delta))
+
+
+def _id_ranges(db: Session, model, batch_size: int):
+    max_id = db.scalar(select(func.max(model.id))) or 0
+    for start in range(0, max_id + 1, batch_size):
+        yield start, start + batch_size
+
+
+def repair_counters(db: Session, batch_size: int = 10_000):
+    # Recompute every counter from the source tables, one id range per
+    # transaction so the write lock is never held for long
+    like_count = select(func.count()).where(Like.post_id == Post.id).correlate(Post).scalar_subquery()
+    comment_count = select(func.count()).where(Comment.post_id == Post.id).correlate(Post).scalar_subquery()
+    # Deleted posts were uncounted when they were deleted
+    post_count = select(func.count()).where(Post.user_id == User.id, Post.deleted_at.is_(None))\
+        .correlate(User).scalar_subquery()
+
+    for start, end in _id_ranges(db, Post, batch_size):
+        db.execute(update(Post).where(Post.id >= start, Post.id < end)
+                   .values(like_count=like_count, comment_count=comment_count, updated_at=Post.updated_at))
+        db.commit()
+
+    for start, end in _id_ranges(db, User, batch_size):
+        db.execute(update(User).where(User.id >= start, User.id < end).values(post_count=post_count))
+        db.commit()
+
+
+def repair_follow_counts(db: Session, batch_size: int = 10_000):
+    # Kept apart from repair_counters: migration 5 calls this one when it
+    # adds the follows table
+    follower_count = select(func.count()).where(Follow.followee_id == User.id).correlate(User).scalar_subquery()
+    following_count = select(func.count()).where(Follow.follower_id == User.id).correlate(User).scalar_subquery()
+
+    for start, end in _id_ranges(db, User, batch_size):
+        db.execute(update(User).where(User.id >= start, User.id < end)
+                   .values(follower_count=follower_count, following_count=following_count))
+        db.commit()
@@ -0,0 +1,322 @@
+import asyncio
+import logging
+import time
+from collections import Counter
+
+from fastapi import HTTPException, status
+from sqlalchemy import select, update, delete, func, or_, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.database import AsyncWriteSessionLocal
+from app.models.comment import Comment
+from app.models.deletion import DeletionJob
+from app.models.follow import Follow, TimelineEntry
+from app.models.media import Media
+from app.models.post import Post, Like, PostScore
+from app.models.user import User
+from app.services.counters import adjust_like_counts, adjust_comment_count, adjust_post_count, post_changed
+from app.services.like_index import like_index
+from app.services import trending
+from app.services.user import username_index
+from app.utils.auth import invalidate_user
+from app.utils.http_cache import invalidate_post
+
+logger = logging.getLogger(__name__)
+
+# Deleting a post or an account. The request only hides the target (sets
+# deleted_at, which every read filters on) and queues a deletion job in the
+# same transaction. A background worker then removes what hangs off it in
+# transactions of at most DELETION_BATCH_SIZE rows per table, pausing between
+# them so other writers get the database. Nothing relies on ON DELETE CASCADE
+# (SQLite leaves foreign keys off) and nothing is loaded through the ORM
+# relationships: children are deleted by key, and the target row goes last.
+#
+# A job's phase and row count are committed with each batch, and every phase
+# just deletes "whatever is left", so a job picks up where it stopped after a
+# crash or restart. Workers claim jobs with a lease (DELETION_LEASE_SECONDS),
+# so with several app workers each job runs in one of them at a time.
+
+async def _delete_limited(db: AsyncSession, model, key, condition, limit: int, returning=()):
+    # DELETE of at most `limit` rows matching condition, by primary key
+    batch = select(*key).where(condition).limit(limit)
+    statement = delete(model).where((tuple_(*key) if len(key) > 1 else key[0]).in_(batch))
+    if returning:
+        return (await db.execute(statement.returning(*returning))).all()
+    return (await db.execute(statement)).rowcount
+
+
+# Phase steps: delete one batch for the target, queue in-memory updates for
+# after the commit in `after`, and return (rows deleted, phase finished)
+
+async def _purge_posts(db: AsyncSession, post_ids, limit: int, after: list):
+    # Likes, comments and timeline entries first, at most `limit` of each;
+    # the posts themselves once nothing is left pointing at them
+    deleted, exhausted = 0, True
+    for model, key in ((Like, (Like.user_id, Like.post_id)),
+                       (Comment, (Comment.id,)),
+                       (TimelineEntry, (TimelineEntry.user_id, TimelineEntry.post_id))):
+        rows = await _delete_limited(db, model, key, model.post_id.in_(post_ids), limit)
+        deleted += rows
+        exhausted = exhausted and rows < limit
+    if exhausted:
+        await db.execute(delete(PostScore).where(PostScore.post_id.in_(post_ids)))
+        deleted += (await db.execute(delete(Post).where(Post.id.in_(post_ids)))).rowcount
+        for post_id in post_ids:
+            after.append(lambda post_id=post_id: (trending.trending_index.discard(post_id),
+                                                  like_index.discard_post(post_id)))
+    return deleted, exhausted
+
+
+async def _post(db: AsyncSession, post_id: int, limit: int, after: list):
+    return await _purge_posts(db, [post_id], limit, after)
+
+
+async def _following(db: AsyncSession, user_id: int, limit: int, after: list):
+    rows = await _delete_limited(db, Follow, (Follow.follower_id, Follow.followee_id), Follow.follower_id == user_id,
+                                 limit, returning=(Follow.followee_id,))
+    if rows:
+        await db.execute(update(User).where(User.id.in_([followee_id for followee_id, in rows]))
+                         .values(follower_count=User.follower_count - 1))
+    return len(rows), len(rows) < limit
+
+
+async def _followers(db: AsyncSession, user_id: int, limit: int, after: list):
+    rows = await _delete_limited(db, Follow, (Follow.follower_id, Follow.followee_id), Follow.followee_id == user_id,
+                                 limit, returning=(Follow.follower_id,))
+    if rows:
+        await db.execute(update(User).where(User.id.in_([follower_id for follower_id, in rows]))
+                         .values(following_count=User.following_count - 1))
+    return len(rows), len(rows) < limit
+
+
+async def _likes(db: AsyncSession, user_id: int, limit: int, after: list):
+    # The user's likes on other posts: their counts and trending scores go down
+    rows = await _delete_limited(db, Like, (Like.user_id, Like.post_id), Like.user_id == user_id,
+                                 limit, returning=(Like.post_id, Like.created_at))
+    if rows:
+        post_ids = [post_id for post_id, _ in rows]
+        await adjust_like_counts(db, post_ids, -1)
+        await trending.retract(db, rows, trending.LIKE_WEIGHT)
+        after.append(lambda: like_index.remove((user_id, post_id) for post_id in post_ids))
+        after.extend(lambda post_id=post_id: invalidate_post(post_id) for post_id in post_ids)
+    return len(rows), len(rows) < limit
+
+
+async def _comments(db: AsyncSession, user_id: int, limit: int, after: list):
+    rows = await _delete_limited(db, Comment, (Comment.id,), Comment.user_id == user_id,
+                                 limit, returning=(Comment.post_id, Comment.created_at))
+    if rows:
+        for post_id, count in Counter(post_id for post_id, _ in rows).items():
+            await adjust_comment_count(db, post_id, -count)
+            after.append(lambda post_id=post_id: invalidate_post(post_id))
+        await trending.retract(db, rows, trending.COMMENT_WEIGHT)
+    return len(rows), len(rows) < limit
+
+
+async def _timeline(db: AsyncSession, user_id: int, limit: int, after: list):
+    rows = await _delete_limited(db, TimelineEntry, (TimelineEntry.user_id, TimelineEntry.post_id),
+                                 TimelineEntry.user_id == user_id, limit)
+    return rows, rows < limit
+
+
+async def _posts(db: AsyncSession, user_id: int, limit: int, after: list):
+    # A few posts at a time, each with its own likes and comments
+    post_ids = (await db.scalars(select(Post.id).where(Post.user_id == user_id)
+                                 .order_by(Post.id).limit(max(1, limit // 10)))).all()
+    if not post_ids:
+        return 0, True
+    deleted, _ = await _purge_posts(db, post_ids, limit, after)
+    return deleted, False
+
+
+async def _media(db: AsyncSession, user_id: int, limit: int, after: list):
+    # Uploads stay (posts of other users may show them), unattributed
+    media_ids = select(Media.id).where(Media.user_id == user_id).limit(limit)
+    rows = (await db.execute(update(Media).where(Media.id.in_(media_ids)).values(user_id=None))).rowcount
+    return rows, rows < limit
+
+
+async def _account(db: AsyncSession, user_id: int, limit: int, after: list):
+    return (await db.execute(delete(User).where(User.id == user_id))).rowcount, True
+
+
+PHASES = {
+    "post": [("post", _post)],
+    "user": [("following", _following), ("followers", _followers), ("likes", _likes), ("comments", _comments),
+             ("timeline", _timeline), ("posts", _posts), ("media", _media), ("account", _account)],
+}
+
+
+def _next_phase(kind: str, phase: str):
+    names = [name for name, _ in PHASES[kind]]
+    position = names.index(phase) + 1
+    return names[position] if position < len(names) else None
+
+
+async def _queue(db: AsyncSession, kind: str, target_id: int) -> DeletionJob:
+    job = DeletionJob(kind=kind, target_id=target_id, phase=PHASES[kind][0][0])
+    db.add(job)
+    await db.flush()
+    return job
+
+
+async def delete_post(db: AsyncSession, post: Post) -> DeletionJob:
+    # Hidden at once; the job removes its likes, comments and the row
+    result = await db.execute(update(Post).where(Post.id == post.id, Post.deleted_at.is_(None))
+                              .values(deleted_at=func.now(), updated_at=Post.updated_at, **post_changed()))
+    if not result.rowcount:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Post with id: {post.id} not found")
+    await adjust_post_count(db, post.user_id, -1)
+    await trending.remove_post(db, post.id)
+    job = await _queue(db, "post", post.id)
+    await db.commit()
+    invalidate_post(post.id)
+    like_index.discard_post(post.id)
+    deletion_worker.wake()
+    return job
+
+
+async def delete_user(db: AsyncSession, user_id: int) -> DeletionJob:
+    # The account stops authenticating and its posts and comments are hidden
+    # at once; the job removes everything it owns
+    result = await db.execute(update(User).where(User.id == user_id, User.deleted_at.is_(None))
+                              .values(deleted_at=func.now(), is_active=False))
+    if not result.rowcount:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"User with id: {user_id} not found")
+    job = await _queue(db, "user", user_id)
+    await db.commit()
+    invalidate_user(user_id)
+    username_index.remove(user_id)
+    deletion_worker.wake()
+    return job
+
+
+class DeletionWorker:
+    def __init__(self, batch_size: int, pause: float, poll_interval: float, lease: float,
+                 session_factory=AsyncWriteSessionLocal):
+        self.batch_size = batch_size
+        self.pause = pause
+        self.poll_interval = poll_interval
+        self.lease = lease
+        self.session_factory = session_factory
+        self._wakeup = None
+        self._task = None
+        self._stopping = False
+        self.stats = {"batches": 0, "rows": 0, "finished": 0, "failed_batches": 0}
+
+    def wake(self):
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _claim(self):
+        # The oldest unfinished job nobody holds a lease on
+        now = time.time()
+        async with self.session_factory() as db:
+            job = (await db.execute(
+                select(DeletionJob.id, DeletionJob.kind, DeletionJob.target_id, DeletionJob.phase)
+                .where(DeletionJob.finished_at.is_(None),
+                       or_(DeletionJob.locked_until.is_(None), DeletionJob.locked_until < now))
+                .order_by(DeletionJob.finished_at, DeletionJob.id).limit(1))).first()
+            if job is None:
+                return None
+            claimed = await db.execute(
+                update(DeletionJob)
+                .where(DeletionJob.id == job.id,
+                       or_(DeletionJob.locked_until.is_(None), DeletionJob.locked_until < now))
+                .values(locked_until=now + self.lease))
+            await db.commit()
+        return job if claimed.rowcount else None
+
+    async def _batch(self, job_id: int, kind: str, target_id: int, phase: str):
+        # One transaction: a batch of the phase and the job's progress.
+        # Returns the phase to run next, None once the job is finished
+        step = dict(PHASES[kind])[phase]
+        after = []
+        async with self.session_factory() as db:
+            rows, finished = await step(db, target_id, self.batch_size, after)
+            next_phase = _next_phase(kind, phase) if finished else phase
+            values = {"deleted_rows": DeletionJob.deleted_rows + rows, "phase": next_phase,
+                      "updated_at": func.now(), "locked_until": time.time() + self.lease}
+            if next_phase is None:
+                values.update(finished_at=func.now(), locked_until=None)
+            await db.execute(update(DeletionJob).where(DeletionJob.id == job_id).values(**values))
+            await db.commit()
+        for callback in after:
+            callback()
+        self.stats["batches"] += 1
+        self.stats["rows"] += rows
+        return next_phase
+
+    async def _release(self, job_id: int):
+        async with self.session_factory() as db:
+            await db.execute(update(DeletionJob).where(DeletionJob.id == job_id).values(locked_until=None))
+            await db.commit()
+
+    async def run_job(self, job):
+        started_at = time.perf_counter()
+        phase = job.phase
+        try:
+            while phase is not None:
+                if self._stopping:
+                    # Another worker (or the next start) carries on from here
+                    await self._release(job.id)
+                    return
+                phase = await self._batch(job.id, job.kind, job.target_id, phase)
+                if phase is not None and self.pause:
+                    await asyncio.sleep(self.pause)
+        except Exception:
+            self.stats["failed_batches"] += 1
+            # The lease runs out and the job is retried from its last batch
+            logger.exception("deletion job %s (%s %s) failed in phase %s", job.id, job.kind, job.target_id, phase)
+            return
+        self.stats["finished"] += 1
+        logger.info("deletion job %s (%s %s) finished in %.1f s", job.id, job.kind, job.target_id,
+                    time.perf_counter() - started_at)
+
+    async def run_pending(self) -> int:
+        # Runs jobs until none is left to claim; returns how many were run
+        count = 0
+        while not self._stopping:
+            job = await self._claim()
+            if job is None:
+                break
+            await self.run_job(job)
+            count += 1
+        return count
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                await self.run_pending()
+            except Exception:
+                logger.exception("deletion worker failed to claim a job")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    def start(self):
+        # Also resumes the jobs a previous run left unfinished
+        if self._task is None:
+            self._stopping = False
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        # The running batch is committed, not cancelled; its job is released
+        if self._task is not None:
+            self._stopping = True
+            self._wakeup.set()
+            await self._task
+            self._task = None
+            self._wakeup = None
+            self._stopping = False
+
+    def metrics(self):
+        return dict(self.stats)
+
+
+deletion_worker = DeletionWorker(settings.DELETION_BATCH_SIZE, settings.DELETION_BATCH_PAUSE_SECONDS,
+                                 settings.DELETION_POLL_SECONDS, settings.DELETION_LEASE_SECONDS)
@@ -0,0 +1,279 @@
+import math
+import time
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from typing import Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.models.post import Post, Like
+
+# Who liked what, in memory: answers liked_by_user for a page of posts and
+# "who liked this post" without going to the likes table.
+#
+#   ("post", id)  the post's likers as a sorted array of user ids (4 bytes
+#                 each): exact, bisect for membership, slices for pages
+#   ("user", id)  a Bloom filter of the posts the user liked (~1.2 bytes per
+#                 like at 1% false positives): "no" is exact, so most posts on
+#                 a page are answered without their likers ever being loaded;
+#                 "maybe" is confirmed against the post's array
+#
+# Entries are loaded on first use (one query per kind for a whole page), kept
+# in LRU order within LIKE_INDEX_MAX_BYTES, and updated in place by this
+# worker's like and unlike paths after they commit. Other workers' likes show
+# up when an entry expires after LIKE_INDEX_TTL_SECONDS, as with the other
+# per-worker caches. Posts with more than LIKE_INDEX_MAX_POST_LIKES likes are
+# never loaded whole: their lookups go to the (post_id, user_id) index. Users
+# with more than LIKE_INDEX_MAX_USER_LIKES likes get no Bloom filter either:
+# only a marker that sends their lookups to the (user_id, post_id) key.
+
+FALSE_POSITIVE_RATE = 0.01
+# Python object headers, counted against the byte budget
+ENTRY_OVERHEAD = 120
+# Cached in place of the Bloom filter of a user with too many likes
+TOO_MANY_LIKES = object()
+
+
+class BloomFilter:
+    # Double hashing over one bytearray; sized for twice the likes it is
+    # built with, so likes added afterwards keep the rate close to target
+
+    def __init__(self, capacity: int, false_positive_rate: float = FALSE_POSITIVE_RATE):
+        capacity = max(capacity, 16)
+        self.bits = max(64, math.ceil(-capacity * math.log(false_positive_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.bits / capacity * math.log(2)))
+        self._data = bytearray((self.bits + 7) // 8)
+
+    def _positions(self, value: int):
+        h1 = (value * 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF
+        h2 = ((value * 0xC2B2AE3D27D4EB4F) & 0xFFFFFFFFFFFFFFFF) | 1
+        for i in range(self.hashes):
+            yield (h1 + i * h2) % self.bits
+
+    def add(self, value: int):
+        for position in self._positions(value):
+            self._data[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, value: int) -> bool:
+        return all(self._data[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+    @property
+    def nbytes(self) -> int:
+        return len(self._data)
+
+
+def _nbytes(value) -> int:
+    if value is TOO_MANY_LIKES:
+        return ENTRY_OVERHEAD
+    if isinstance(value, array):
+        return ENTRY_OVERHEAD + value.itemsize * len(value)
+    return ENTRY_OVERHEAD + value.nbytes
+
+
+class LikeIndex:
+    def __init__(self, enabled: bool, max_bytes: int, ttl: float, max_post_likes: int, max_user_likes: int):
+        self.enabled = enabled
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.max_post_likes = max_post_likes
+        self.max_user_likes = max_user_likes
+        # key -> (expires_at, sorted array or BloomFilter), least recently used first
+        self._entries = OrderedDict()
+        self._bytes = 0
+        # Keys written while a load is running: the load may have read them
+        # before the write committed, so its result for them is not kept
+        self._loads = 0
+        self._touched = set()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _get(self, key):
+        entry = self._entries.get(key)
+        if entry is None or entry[0] <= time.monotonic():
+            if entry is not None:
+                self._drop(key)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def _drop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= _nbytes(entry[1])
+
+    def _set(self, key, value):
+        if key in self._touched:
+            return
+        self._drop(key)
+        size = _nbytes(value)
+        if size > self.max_bytes:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._bytes += size
+        self._evict()
+
+    def _evict(self):
+        while self._bytes > self.max_bytes:
+            old_key, _ = next(iter(self._entries.items()))
+            self._drop(old_key)
+            self.evictions += 1
+
+    async def _load(self, query):
+        self._loads += 1
+        try:
+            return (await query).all()
+        finally:
+            self._loads -= 1
+            if not self._loads:
+                self._touched.clear()
+
+    async def _user_filter(self, db: AsyncSession, user_id: int) -> Optional[BloomFilter]:
+        # None for users with too many likes to hold
+        key = ("user", user_id)
+        bloom = self._get(key)
+        if bloom is TOO_MANY_LIKES:
+            return None
+        if bloom is None:
+            # One past the limit is enough to tell, without reading them all
+            post_ids = await self._load(db.scalars(select(Like.post_id).where(Like.user_id == user_id)
+                                                   .limit(self.max_user_likes + 1)))
+            if len(post_ids) > self.max_user_likes:
+                self._set(key, TOO_MANY_LIKES)
+                return None
+            bloom = BloomFilter(2 * len(post_ids))
+            for post_id in post_ids:
+                bloom.add(post_id)
+            self._set(key, bloom)
+        return bloom
+
+    async def _post_likers(self, db: AsyncSession, post_ids) -> dict:
+        # post id -> sorted likers, for the posts small enough to hold whole
+        likers = {}
+        missing = []
+        for post_id in post_ids:
+            users = self._get(("post", post_id))
+            if users is None:
+                missing.append(post_id)
+            else:
+                likers[post_id] = users
+        if missing:
+            # Posts without likes come back empty and stay unknown: the
+            # Bloom filters rarely send them here
+            rows = await self._load(db.execute(
+                select(Like.post_id, Like.user_id).join(Post, Post.id == Like.post_id)
+                .where(Like.post_id.in_(missing), Post.like_count <= self.max_post_likes)
+                .order_by(Like.post_id, Like.user_id)))
+            loaded = {}
+            for post_id, user_id in rows:
+                loaded.setdefault(post_id, array("i")).append(user_id)
+            for post_id, users in loaded.items():
+                self._set(("post", post_id), users)
+            likers.update(loaded)
+        return likers
+
+    async def liked(self, db: AsyncSession, user_id: int, post_ids) -> set:
+        # The ids among post_ids that user_id has liked
+        post_ids = list(post_ids)
+        if not post_ids:
+            return set()
+        if not self.enabled:
+            return await self._liked_in_database(db, user_id, post_ids)
+
+        bloom = await self._user_filter(db, user_id)
+        if bloom is None:
+            return await self._liked_in_database(db, user_id, post_ids)
+        candidates = [post_id for post_id in post_ids if post_id in bloom]
+        if not candidates:
+            return set()
+        likers = await self._post_likers(db, candidates)
+        liked = {post_id for post_id, users in likers.items() if _contains(users, user_id)}
+        # Posts too large to hold (or deleted) are checked on the primary key
+        unknown = [post_id for post_id in candidates if post_id not in likers]
+        if unknown:
+            liked |= await self._liked_in_database(db, user_id, unknown)
+        return liked
+
+    @staticmethod
+    async def _liked_in_database(db: AsyncSession, user_id: int, post_ids) -> set:
+        rows = await db.scalars(select(Like.post_id).where(Like.user_id == user_id, Like.post_id.in_(post_ids)))
+        return set(rows.all())
+
+    async def likers(self, db: AsyncSession, post_id: int, skip: int = 0, limit: int = 100):
+        # A page of the post's likers, by user id
+        if self.enabled:
+            users = (await self._post_likers(db, [post_id])).get(post_id)
+            if users is not None:
+                return users[skip:skip + limit].tolist()
+        rows = await db.scalars(select(Like.user_id).where(Like.post_id == post_id)
+                                .order_by(Like.user_id).offset(skip).limit(limit))
+        return rows.all()
+
+    # Called by the write paths once the change is committed
+
+    def add(self, pairs):
+        for user_id, post_id in pairs:
+            self._touch(("user", user_id), ("post", post_id))
+            bloom = self._peek(("user", user_id))
+            if isinstance(bloom, BloomFilter):
+                bloom.add(post_id)
+            users = self._peek(("post", post_id))
+            if users is not None:
+                position = bisect_left(users, user_id)
+                if position == len(users) or users[position] != user_id:
+                    users.insert(position, user_id)
+                    self._bytes += users.itemsize
+                    if len(users) > self.max_post_likes:
+                        # No longer a post small enough to hold whole
+                        self._drop(("post", post_id))
+        # The arrays grew in place: keep the byte budget
+        self._evict()
+
+    def remove(self, pairs):
+        # A Bloom filter cannot forget; the post's array is what answers
+        for user_id, post_id in pairs:
+            self._touch(("user", user_id), ("post", post_id))
+            users = self._peek(("post", post_id))
+            if users is not None:
+                position = bisect_left(users, user_id)
+                if position < len(users) and users[position] == user_id:
+                    del users[position]
+                    self._bytes -= users.itemsize
+
+    def discard_post(self, post_id: int):
+        self._touch(("post", post_id))
+        self._drop(("post", post_id))
+
+    def _touch(self, *keys):
+        if self._loads:
+            self._touched.update(keys)
+
+    def _peek(self, key):
+        entry = self._entries.get(key)
+        return None if entry is None else entry[1]
+
+    def clear(self):
+        self._entries.clear()
+        self._bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def metrics(self):
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "size": len(self._entries), "bytes": self._bytes}
+
+
+def _contains(users, user_id: int) -> bool:
+    position = bisect_left(users, user_id)
+    return position < len(users) and users[position] == user_id
+
+
+like_index = LikeIndex(settings.LIKE_INDEX_ENABLED, settings.LIKE_INDEX_MAX_BYTES,
+                       settings.LIKE_INDEX_TTL_SECONDS, settings.LIKE_INDEX_MAX_POST_LIKES,
+                       settings.LIKE_INDEX_MAX_USER_LIKES)
@@ -0,0 +1,245 @@
+import asyncio
+import logging
+from collections import Counter, defaultdict
+from typing import Dict, Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy import select, insert, delete, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.database import AsyncSessionLocal, AsyncWriteSessionLocal
+from app.models.post import Post, Like
+from app.services.counters import adjust_like_counts
+from app.services import trending
+from app.services.like_index import like_index
+from app.utils.http_cache import invalidate_post
+
+logger = logging.getLogger(__name__)
+
+# Write-behind for like toggles (LIKE_WRITE_BEHIND). A toggle only records the
+# wanted state of (user_id, post_id) in memory; a like followed by an unlike
+# cancels out before reaching the database. Pending toggles are flushed in one
+# transaction every LIKE_FLUSH_INTERVAL_SECONDS, or sooner once
+# LIKE_FLUSH_MAX_PENDING pile up. Reads in this worker overlay the pending
+# state; other workers see it after the flush. A toggle never touches the
+# writer connection: its lookups go through the reader pool.
+
+Key = Tuple[int, int]
+
+
+class LikeAggregator:
+    def __init__(self, enabled: bool, interval: float, max_pending: int,
+                 read_session_factory=AsyncSessionLocal, write_session_factory=AsyncWriteSessionLocal):
+        self.enabled = enabled
+        self.interval = interval
+        self.max_pending = max_pending
+        self.read_session_factory = read_session_factory
+        self.write_session_factory = write_session_factory
+        # (user_id, post_id) -> (state in the database, wanted state)
+        self._pending: Dict[Key, Tuple[bool, bool]] = {}
+        # The batch being written; still counts as pending for reads
+        self._flushing: Dict[Key, Tuple[bool, bool]] = {}
+        # post_id -> like_count difference between memory and the database
+        self._deltas: Dict[int, int] = {}
+        self._wakeup = None
+        self._task = None
+        self._stopping = False
+        self.stats = {"toggles": 0, "cancelled": 0, "flushes": 0, "written": 0, "failed_flushes": 0}
+
+    @staticmethod
+    def _delta(entry) -> int:
+        if entry is None or entry[0] == entry[1]:
+            return 0
+        return 1 if entry[1] else -1
+
+    def _add_delta(self, post_id: int, delta: int):
+        total = self._deltas.get(post_id, 0) + delta
+        if total:
+            self._deltas[post_id] = total
+        else:
+            self._deltas.pop(post_id, None)
+
+    def pending_state(self, user_id: int, post_id: int):
+        # True/False when a toggle is pending, None when the database is current
+        key = (user_id, post_id)
+        entry = self._pending.get(key) or self._flushing.get(key)
+        return None if entry is None else entry[1]
+
+    def pending_delta(self, post_id: int) -> int:
+        return self._deltas.get(post_id, 0)
+
+    def overlay_liked(self, user_id: int, post_ids, liked: set) -> set:
+        if not self._pending and not self._flushing:
+            return liked
+        liked = set(liked)
+        for post_id in post_ids:
+            state = self.pending_state(user_id, post_id)
+            if state is True:
+                liked.add(post_id)
+            elif state is False:
+                liked.discard(post_id)
+        return liked
+
+    async def _liked_in_database(self, user_id: int, post_id: int) -> bool:
+        liked = select(Like.post_id).where(Like.post_id == Post.id, Like.user_id == user_id).exists()
+        async with self.read_session_factory() as db:
+            row = (await db.execute(select(Post.id, liked).where(Post.id == post_id, Post.deleted_at.is_(None)))).first()
+        if row is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Post with id: {post_id} not found")
+        return bool(row[1])
+
+    async def toggle(self, user_id: int, post_id: int) -> bool:
+        # Returns the new state: True when the post ends up liked
+        key = (user_id, post_id)
+        entry = self._pending.get(key)
+        if entry is None:
+            in_flight = self._flushing.get(key)
+            if in_flight is not None:
+                # Relative to what the running flush is about to write
+                base = in_flight[1]
+            else:
+                base = await self._liked_in_database(user_id, post_id)
+                # The lookup may have yielded to a concurrent toggle
+                entry = self._pending.get(key)
+            if entry is None:
+                entry = (base, base)
+
+        self._record(key, entry, not entry[1])
+        return not entry[1]
+
+    def like(self, user_id: int, post_id: int, in_database: bool) -> bool:
+        # Bulk likes, with the database state already read for the whole
+        # batch: False when the post is already liked, pending toggles included
+        key = (user_id, post_id)
+        entry = self._pending.get(key)
+        if entry is None:
+            in_flight = self._flushing.get(key)
+            base = in_flight[1] if in_flight is not None else in_database
+            entry = (base, base)
+        if entry[1]:
+            return False
+        self._record(key, entry, True)
+        return True
+
+    def _record(self, key: Key, entry, wanted: bool):
+        self.stats["toggles"] += 1
+        new_entry = (entry[0], wanted)
+        self._add_delta(key[1], self._delta(new_entry) - self._delta(entry))
+        if new_entry[0] == new_entry[1]:
+            self._pending.pop(key, None)
+            self.stats["cancelled"] += 1
+        else:
+            self._pending[key] = new_entry
+
+        if len(self._pending) >= self.max_pending and self._wakeup is not None:
+            self._wakeup.set()
+
+    async def flush(self):
+        if not self._pending or self._flushing:
+            return
+        self._flushing, self._pending = self._pending, {}
+        batch = self._flushing
+        try:
+            await self._write(batch)
+        except Exception:
+            self.stats["failed_flushes"] += 1
+            logger.exception("like flush failed, %d toggles kept for the next one", len(batch))
+            self._requeue(batch)
+        else:
+            self.stats["flushes"] += 1
+            self.stats["written"] += len(batch)
+            for (_, post_id), entry in batch.items():
+                self._add_delta(post_id, -self._delta(entry))
+                invalidate_post(post_id)
+        finally:
+            self._flushing = {}
+
+    def _requeue(self, batch):
+        # Newer toggles were taken relative to the batch, so the combined
+        # entry goes from the batch's database state to the newest wanted state
+        for key, (in_database, wanted) in batch.items():
+            newer = self._pending.get(key)
+            if newer is not None:
+                wanted = newer[1]
+            if in_database == wanted:
+                self._pending.pop(key, None)
+            else:
+                self._pending[key] = (in_database, wanted)
+
+    async def _write(self, batch):
+        post_ids = {post_id for _, post_id in batch}
+        async with self.write_session_factory() as db:
+            # Posts deleted since the toggle are dropped
+            existing = set((await db.scalars(select(Post.id).where(Post.id.in_(post_ids), Post.deleted_at.is_(None)))).all())
+            to_like = [{"user_id": user_id, "post_id": post_id}
+                       for (user_id, post_id), (_, wanted) in batch.items() if wanted and post_id in existing]
+            to_unlike = [key for key, (_, wanted) in batch.items() if not wanted and key[1] in existing]
+
+            # Only rows actually written count, for trending and like_count:
+            # another worker may have written some of the same pairs
+            liked, unliked = [], []
+            if to_like:
+                liked = (await db.execute(self._insert_ignoring_duplicates(db)
+                                          .returning(Like.user_id, Like.post_id), to_like)).all()
+                await trending.record(db, [post_id for _, post_id in liked], trending.LIKE_WEIGHT)
+            if to_unlike:
+                unliked = (await db.execute(delete(Like).where(tuple_(Like.user_id, Like.post_id).in_(to_unlike))
+                                            .returning(Like.user_id, Like.post_id, Like.created_at))).all()
+                await trending.retract(db, [(post_id, created_at) for _, post_id, created_at in unliked],
+                                       trending.LIKE_WEIGHT)
+            deltas = Counter(post_id for _, post_id in liked)
+            deltas.subtract(post_id for _, post_id, _ in unliked)
+            by_delta = defaultdict(list)
+            for post_id, delta in deltas.items():
+                if delta:
+                    by_delta[delta].append(post_id)
+            for delta, delta_post_ids in by_delta.items():
+                await adjust_like_counts(db, delta_post_ids, delta)
+            await db.commit()
+        # The pairs end up in the wanted state, whoever wrote them
+        like_index.add((row["user_id"], row["post_id"]) for row in to_like)
+        like_index.remove(to_unlike)
+
+    @staticmethod
+    def _insert_ignoring_duplicates(db: AsyncSession):
+        dialect = db.bind.dialect.name
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        elif dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        else:
+            return insert(Like)
+        return dialect_insert(Like).on_conflict_do_nothing()
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    def start(self):
+        if self.enabled and self._task is None:
+            self._stopping = False
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        # Clean shutdown: the loop finishes its current flush (it is not
+        # cancelled mid-transaction), then everything still pending is written
+        if self._task is not None:
+            self._stopping = True
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        await self.flush()
+
+    def metrics(self):
+        return {**self.stats, "pending": len(self._pending), "flushing": len(self._flushing)}
+
+
+like_aggregator = LikeAggregator(settings.LIKE_WRITE_BEHIND, settings.LIKE_FLUSH_INTERVAL_SECONDS,
+                                 settings.LIKE_FLUSH_MAX_PENDING)
@@ -0,0 +1,290 @@
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+from fastapi import HTTPException, Request, status
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from app.config import settings
+from app.database import AsyncWriteSessionLocal
+from app.models.media import Media
+from app.utils.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# Image uploads. POST /media streams the request body to a temporary file in
+# MEDIA_CHUNK_SIZE writes (hashing as it goes), so an upload never sits in
+# memory whole. The finished file is renamed to its sha256 under MEDIA_ROOT
+# (ab/cd/abcd...): storage is content-addressed, identical uploads share one
+# file and one media row, and a stored file never changes. Thumbnails are
+# derived afterwards in a process pool and stored the same way.
+
+MEDIA_ID = re.compile(r"[0-9a-f]{64}")
+THUMBNAIL_CONTENT_TYPE = "image/webp"
+
+# Magic numbers of the accepted formats; the declared Content-Type is not trusted
+SIGNATURES = (
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+)
+
+# media id -> (content type, thumbnail id). Content never changes; the TTL only
+# bounds how long another worker keeps serving the original as the thumbnail
+media_cache = TTLCache(max_entries=10_000, ttl=60)
+
+
+def is_media_id(value: str) -> bool:
+    return MEDIA_ID.fullmatch(value) is not None
+
+
+def media_path(media_id: str) -> str:
+    return os.path.join(settings.MEDIA_ROOT, media_id[:2], media_id[2:4], media_id)
+
+
+def upload_dir() -> str:
+    # Inside MEDIA_ROOT so the final rename stays on one filesystem
+    return os.path.join(settings.MEDIA_ROOT, "tmp")
+
+
+def media_url(media_id: str) -> str:
+    return f"/media/{media_id}"
+
+
+def thumbnail_url(media_id: str) -> str:
+    return f"/media/{media_id}/thumbnail"
+
+
+def media_response(media: Media):
+    return {"id": media.id, "content_type": media.content_type, "size": media.size,
+            "url": media_url(media.id), "thumbnail_url": thumbnail_url(media.id), "created_at": media.created_at}
+
+
+def sniff_content_type(head: bytes):
+    for magic, content_type in SIGNATURES:
+        if head.startswith(magic):
+            return content_type
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    return None
+
+
+# Blocking file work, run in the thread pool. hashlib and file writes release
+# the GIL on large buffers.
+
+def _open_upload():
+    os.makedirs(upload_dir(), exist_ok=True)
+    return tempfile.NamedTemporaryFile(dir=upload_dir(), delete=False)
+
+
+def _write(file, digest, data):
+    digest.update(data)
+    file.write(data)
+
+
+def _finish(file, digest, data):
+    _write(file, digest, data)
+    file.flush()
+    # The file is renamed into place and never rewritten: it has to be on
+    # disk before a media row can point at it
+    os.fsync(file.fileno())
+    file.close()
+
+
+def _discard(file):
+    file.close()
+    try:
+        os.unlink(file.name)
+    except FileNotFoundError:
+        pass
+
+
+def store_file(tmp_path: str, media_id: str) -> bool:
+    # Moves a finished file to its content address; False when the same
+    # content was already stored
+    path = media_path(media_id)
+    if os.path.exists(path):
+        os.unlink(tmp_path)
+        return False
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    os.replace(tmp_path, path)
+    return True
+
+
+def _too_large():
+    return HTTPException(status_code=status.HTTP_413_CONTENT_TOO_LARGE,
+                         detail=f"Uploads are limited to {settings.MEDIA_MAX_BYTES} bytes")
+
+
+def _check_content_type(head: bytes) -> str:
+    content_type = sniff_content_type(bytes(head[:12]))
+    if content_type is None:
+        raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                            detail="Only PNG, JPEG, GIF and WebP images are accepted")
+    return content_type
+
+
+async def receive_upload(request: Request):
+    # Streams the body to a temporary file: (path, sha256, content type, size)
+    declared = request.headers.get("content-length", "")
+    if declared.isdigit() and int(declared) > settings.MEDIA_MAX_BYTES:
+        raise _too_large()
+
+    file = await run_in_threadpool(_open_upload)
+    digest = hashlib.sha256()
+    buffer = bytearray()
+    size = 0
+    content_type = None
+    try:
+        async for chunk in request.stream():
+            size += len(chunk)
+            if size > settings.MEDIA_MAX_BYTES:
+                raise _too_large()
+            # Small network reads are batched into MEDIA_CHUNK_SIZE writes
+            buffer += chunk
+            if len(buffer) >= settings.MEDIA_CHUNK_SIZE:
+                content_type = content_type or _check_content_type(buffer)
+                await run_in_threadpool(_write, file, digest, buffer)
+                buffer.clear()
+        if size == 0:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Empty upload")
+        content_type = content_type or _check_content_type(buffer)
+        await run_in_threadpool(_finish, file, digest, buffer)
+    except BaseException:
+        await run_in_threadpool(_discard, file)
+        raise
+    return file.name, digest.hexdigest(), content_type, size
+
+
+async def save_upload(db: AsyncSession, request: Request, user_id: int) -> Media:
+    # Authentication may have opened a transaction on the writer; it is not
+    # held while a (possibly slow) client sends the body
+    await db.close()
+    tmp_path, media_id, content_type, size = await receive_upload(request)
+    await run_in_threadpool(store_file, tmp_path, media_id)
+
+    media = await db.get(Media, media_id)
+    if media is None:
+        db.add(Media(id=media_id, content_type=content_type, size=size, user_id=user_id))
+        try:
+            await db.commit()
+        except IntegrityError:
+            # The same content uploaded concurrently
+            await db.rollback()
+        media = await db.get(Media, media_id, populate_existing=True)
+    # Uploading the content again also retries a failed thumbnail
+    if media.thumbnail_id is None:
+        thumbnailer.schedule(media_id)
+    return media
+
+
+async def get_media_info(db: AsyncSession, media_id: str):
+    info = media_cache.get(media_id)
+    if info is None:
+        row = (await db.execute(select(Media.content_type, Media.thumbnail_id).where(Media.id == media_id))).first()
+        if row is None:
+            return None
+        info = (row.content_type, row.thumbnail_id)
+        media_cache.set(media_id, info)
+    return info
+
+
+async def existing_media_ids(db: AsyncSession, media_ids) -> set:
+    if not media_ids:
+        return set()
+    return set((await db.scalars(select(Media.id).where(Media.id.in_(media_ids)))).all())
+
+
+async def resolve_post_media(db: AsyncSession, values: dict) -> dict:
+    # A post that references an upload links to it unless it brings its own image_url
+    media_id = values.get("media_id")
+    if media_id is None:
+        return values
+    if await get_media_info(db, media_id) is None:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Media with id: {media_id} not found")
+    if not values.get("image_url"):
+        values["image_url"] = media_url(media_id)
+    return values
+
+
+# Thumbnails: decoding and resizing is CPU-bound, so it runs in a process pool
+# off the request path. Until a thumbnail exists GET /media/{id}/thumbnail
+# serves the original.
+
+def _make_thumbnail(source: str, tmp_dir: str, max_size: int):
+    # Runs in a worker process: (temporary path, sha256) of the thumbnail
+    from PIL import Image
+
+    with Image.open(source) as image:
+        image.thumbnail((max_size, max_size))
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA")
+        with tempfile.NamedTemporaryFile(dir=tmp_dir, delete=False) as out:
+            image.save(out, format="WEBP", quality=80)
+            out.flush()
+            os.fsync(out.fileno())
+
+    digest = hashlib.sha256()
+    with open(out.name, "rb") as file:
+        for block in iter(lambda: file.read(1024 * 1024), b""):
+            digest.update(block)
+    return out.name, digest.hexdigest()
+
+
+class Thumbnailer:
+    def __init__(self, workers: int, max_size: int, session_factory=AsyncWriteSessionLocal):
+        self.workers = workers
+        self.max_size = max_size
+        self.session_factory = session_factory
+        self._executor = None
+        # media id -> task; a media is never processed twice at once
+        self._tasks = {}
+        self.stats = {"created": 0, "failed": 0}
+
+    def _ensure_started(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+
+    def schedule(self, media_id: str):
+        if media_id in self._tasks:
+            return
+        task = asyncio.get_running_loop().create_task(self._derive(media_id))
+        self._tasks[media_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(media_id, None))
+
+    async def _derive(self, media_id: str):
+        self._ensure_started()
+        try:
+            tmp_path, thumbnail_id = await asyncio.get_running_loop().run_in_executor(
+                self._executor, _make_thumbnail, media_path(media_id), upload_dir(), self.max_size)
+            await run_in_threadpool(store_file, tmp_path, thumbnail_id)
+            async with self.session_factory() as db:
+                await db.execute(update(Media).where(Media.id == media_id).values(thumbnail_id=thumbnail_id))
+                await db.commit()
+            media_cache.pop(media_id)
+            self.stats["created"] += 1
+        except Exception:
+            self.stats["failed"] += 1
+            logger.exception("thumbnail for media %s failed", media_id)
+
+    def metrics(self):
+        return {**self.stats, "pending": len(self._tasks)}
+
+    async def shutdown(self):
+        # Thumbnails already started are finished, not dropped
+        if self._tasks:
+            await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+thumbnailer = Thumbnailer(settings.MEDIA_THUMBNAIL_WORKERS, settings.MEDIA_THUMBNAIL_SIZE)
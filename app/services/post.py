@@ -1,98 +1,405 @@
-from sqlalchemy.orm import Session
-from app.models.post import Post
+from datetime import datetime
+from sqlalchemy import select, insert, update, delete, func, tuple_, literal, type_coerce, String
+from sqlalchemy.ext.asyncio import AsyncSession
+from pydantic import ValidationError
+from app.config import settings
 from app.schemas.post import PostCreate
 from app.models.post import Post, Like
 from app.models.comment import Comment
+from app.models.user import User
+from app.services.counters import adjust_like_count, adjust_like_counts, adjust_post_count, post_changed
+from app.services import deletion
+from app.services.like_index import like_index
+from app.services.likes import like_aggregator
+from app.services.media import existing_media_ids, media_url, resolve_post_media
+from app.services.search import filter_search, is_older_rank, search_tiers
+from app.services import trending
+from app.utils.pagination import decode_cursor, fetch_page, invalid_cursor
+from app.utils.http_cache import as_utc, invalidate_post
 from fastapi import HTTPException
 
-def create_post(db: Session, post_data: PostCreate, user_id: int):
-    new_post = Post(
-        content=post_data.content,
-        image_url=post_data.image_url,
-        user_id=user_id
-    )
+async def create_post(db: AsyncSession, post_data: PostCreate, user_id: int):
+    # timeline builds on the feed helpers below, so it is imported late
+    from app.services.timeline import fan_out_post
+
+    new_post = Post(user_id=user_id, **await resolve_post_media(db, post_data.dict()))
     db.add(new_post)
-    db.commit()
-    db.refresh(new_post)
+    await adjust_post_count(db, user_id, 1)
+    await db.flush()
+    await fan_out_post(db, new_post.id, user_id)
+    await db.commit()
     return new_post
 
-def get_all_posts(db: Session):
-    return db.query(Post).order_by(Post.created_at.desc()).all()
+async def get_all_posts(db: AsyncSession):
+    return (await db.scalars(select(Post).where(Post.deleted_at.is_(None)).order_by(Post.created_at.desc()))).all()
+
+async def get_user_posts(db: AsyncSession, user_id: int):
+    return (await db.scalars(select(Post).where(Post.user_id == user_id, Post.deleted_at.is_(None))
+                             .order_by(Post.created_at.desc()))).all()
 
-def get_user_posts(db: Session, user_id: int):
-    return db.query(Post).filter(Post.user_id == user_id).order_by(Post.created_at.desc()).all()
+async def get_live_post(db: AsyncSession, post_id: int):
+    # None for posts that do not exist or are waiting on their deletion job
+    post = await db.get(Post, post_id)
+    return post if post is not None and post.deleted_at is None else None
 
-def get_post_by_id(db: Session, post_id: int):
-    return db.query(Post).filter(Post.id == post_id).first()
+async def get_post_by_id(db: AsyncSession, post_id: int):
+    return await get_live_post(db, post_id)
 
-def update_post(db: Session, post_id: int, post_data: PostCreate):
-    post_query = db.query(Post).filter(Post.id == post_id)
-    post = post_query.first()
+async def update_post(db: AsyncSession, post_id: int, post_data: PostCreate):
+    post = await get_live_post(db, post_id)
 
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
 
-    post_query.update(post_data.dict(exclude_unset=True))
-    db.commit()
-    db.refresh(post)
+    await db.execute(update(Post).where(Post.id == post_id).values(**await resolve_post_media(db, post_data.dict(exclude_unset=True)), **post_changed()))
+    await db.commit()
+    invalidate_post(post_id)
+    await db.refresh(post)
     return post
 
-def delete_post(db: Session, post_id: int):
-    post_query = db.query(Post).filter(Post.id == post_id)
-    post = post_query.first()
+async def delete_post(db: AsyncSession, post_id: int):
+    post = await get_live_post(db, post_id)
 
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
 
-    post_query.delete()
-    db.commit()
+    await deletion.delete_post(db, post)
     return post
 
-def like_post(db: Session, post_id: int, user_id: int):
-    post = db.query(Post).filter(Post.id == post_id).first()
+async def like_post(db: AsyncSession, post_id: int, user_id: int):
+    # Toggles the like; True if the post is now liked
+    if like_aggregator.enabled:
+        # Write-behind: recorded in memory, written by the next flush
+        return await like_aggregator.toggle(user_id, post_id)
+
+    post = await get_live_post(db, post_id)
     if not post:
-        raise HTTPException(status_code=404, detail="Post not found")
+        raise HTTPException(status_code=404, detail=f"Post with id: {post_id} not found")
 
-    like = db.query(Like).filter(Like.post_id == post_id, Like.user_id == user_id).first()
+    like = await db.get(Like, (user_id, post_id))
     if like:
-        db.delete(like)
-        db.commit()
+        # Counted only if this request is the one that removed it
+        result = await db.execute(delete(Like).where(Like.post_id == post_id, Like.user_id == user_id))
+        if result.rowcount:
+            await adjust_like_count(db, post_id, -1)
+            await trending.retract(db, [(post_id, like.created_at)], trending.LIKE_WEIGHT)
+        await db.commit()
+        invalidate_post(post_id)
+        like_index.remove([(user_id, post_id)])
         return False  # Unliked
     else:
         new_like = Like(post_id=post_id, user_id=user_id)
         db.add(new_like)
-        db.commit()
+        await adjust_like_count(db, post_id, 1)
+        await trending.record(db, [post_id], trending.LIKE_WEIGHT)
+        await db.commit()
+        invalidate_post(post_id)
+        like_index.add([(user_id, post_id)])
         return True  # Liked
 
-def get_post_likes(db: Session, post_id: int):
-    post = db.query(Post).filter(Post.id == post_id).first()
+async def get_post_likes(db: AsyncSession, post_id: int, skip: int = 0, limit: int = 100):
+    post = await get_live_post(db, post_id)
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
 
-    likes = db.query(Like).filter(Like.post_id == post_id).all()
-    return [like.user_id for like in likes]
+    return await like_index.likers(db, post_id, skip=skip, limit=limit)
 
-def get_post_like_count(db: Session, post_id: int):
-    post = db.query(Post).filter(Post.id == post_id).first()
+async def get_post_like_count(db: AsyncSession, post_id: int):
+    post = await get_live_post(db, post_id)
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
 
-    like_count = db.query(Like).filter(Like.post_id == post_id).count()
-    return like_count
+    return post.like_count + like_aggregator.pending_delta(post_id)
 
 
-def get_post_comments(db: Session, post_id: int):
-    post = db.query(Post).filter(Post.id == post_id).first()
+async def get_post_comments(db: AsyncSession, post_id: int, limit: int = 50, cursor: str = None):
+    post = await get_live_post(db, post_id)
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
 
-    comments = db.query(Comment).filter(Comment.post_id == post_id).all()
-    return comments
+    return await get_comments_page(db, post_id, limit=limit, cursor=cursor)
     
-def get_post_comment_count(db: Session, post_id: int):
-    post = db.query(Post).filter(Post.id == post_id).first()
+async def get_post_comment_count(db: AsyncSession, post_id: int):
+    post = await get_live_post(db, post_id)
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
 
-    comment_count = db.query(Comment).filter(Comment.post_id == post_id).count()
-    return comment_count
+    return post.comment_count
+
+
+# Feed assembly: a page of posts is built with one query for posts + counts +
+# authors and one batched lookup of the viewer's likes, whatever the page size.
+# Rows are projected to exactly the PostResponse columns and assembled into
+# plain dicts in PostResponse field order: no ORM identity map on the way in,
+# and the routers dump them with orjson instead of validating them again.
+
+def post_feed_query():
+    # Deleted posts, and posts of deleted accounts, are hidden until their
+    # deletion job removes them
+    return select(Post.content, Post.image_url, Post.media_id, Post.id, Post.created_at, Post.updated_at, Post.user_id,
+                  User.username, User.profile_image, Post.like_count, Post.comment_count)\
+        .join(User, User.id == Post.user_id)\
+        .where(Post.deleted_at.is_(None), User.deleted_at.is_(None))
+
+
+def author_dict(row):
+    return {"id": row.user_id, "username": row.username, "profile_image": row.profile_image}
+
+
+async def get_liked_post_ids(db: AsyncSession, post_ids, user_id: int):
+    if not post_ids:
+        return set()
+    rows = await db.scalars(select(Like.post_id).where(Like.user_id == user_id, Like.post_id.in_(post_ids)))
+    return set(rows.all())
+
+
+async def assemble_posts(db: AsyncSession, rows, viewer_id: int):
+    post_ids = [row.id for row in rows]
+    # Likes still buffered by the write-behind aggregator count as written
+    liked = like_aggregator.overlay_liked(viewer_id, post_ids, await like_index.liked(db, viewer_id, post_ids))
+
+    return [{
+        "content": row.content,
+        "image_url": row.image_url,
+        "media_id": row.media_id,
+        "id": row.id,
+        "created_at": row.created_at,
+        "updated_at": row.updated_at,
+        "user_id": row.user_id,
+        "author": author_dict(row),
+        "like_count": row.like_count + like_aggregator.pending_delta(row.id),
+        "comment_count": row.comment_count,
+        "liked_by_user": row.id in liked,
+    } for row in rows]
+
+
+def created_at_param(db: AsyncSession, value):
+    # SQLite stores timestamps as text, so the cursor value is compared as the
+    # exact stored string; other engines (asyncpg) need a real datetime
+    if db.bind.dialect.name == "sqlite":
+        return literal(value, String())
+    try:
+        return literal(datetime.fromisoformat(value), Post.created_at.type)
+    except (ValueError, TypeError):
+        raise invalid_cursor()
+
+
+async def get_feed_page(db: AsyncSession, viewer_id: int, limit: int = 10, skip: int = 0,
+                        search: str = "", cursor: str = None):
+    after = decode_cursor(cursor)
+    if search:
+        rows, next_cursor = await search_page(db, search, limit, skip, after)
+    else:
+        # With a cursor the page is a range scan on (created_at, id)
+        query = post_feed_query()
+        if after:
+            created_at, post_id = after
+            query = query.where(tuple_(Post.created_at, Post.id) < tuple_(created_at_param(db, created_at), literal(post_id)))
+        query = query.order_by(Post.created_at.desc(), Post.id.desc())\
+            .add_columns(type_coerce(Post.created_at, String()).label("sort_key"))
+        # Without a cursor the old skip/offset behaviour is kept
+        if not after:
+            query = query.offset(skip)
+        rows, next_cursor = await fetch_page(db, query, limit)
+
+    return await assemble_posts(db, rows, viewer_id), next_cursor
+
+
+async def search_page(db: AsyncSession, search: str, limit: int, skip: int, after):
+    # Full-text search ranked by relevance, paged on (rank, id). On SQLite the
+    # ranked window comes first and a page that runs past its end is filled
+    # from the older matches, so every match can be reached
+    if after and isinstance(after[0], str):
+        # a feed cursor: search ranks are numbers
+        raise invalid_cursor()
+    rows, next_cursor = [], None
+    for older in search_tiers(db):
+        if not older and after and is_older_rank(after[0]):
+            continue
+        query, sort_key = filter_search(post_feed_query(), db, search, after, older)
+        query = query.add_columns(sort_key.label("sort_key"))
+        if not after and skip:
+            if older and not rows:
+                # The offset runs past the window: skip what the window held
+                window = filter_search(post_feed_query(), db, search)[0].subquery()
+                skip = max(skip - await db.scalar(select(func.count()).select_from(window)), 0)
+            query = query.offset(0 if rows else skip)
+        page, next_cursor = await fetch_page(db, query, limit - len(rows))
+        rows += page
+        if len(rows) == limit:
+            break
+    return rows, next_cursor
+
+
+async def get_post_response(db: AsyncSession, post_id: int, viewer_id: int):
+    row = (await db.execute(post_feed_query().where(Post.id == post_id))).first()
+    if row is None:
+        return None
+    return (await assemble_posts(db, [row], viewer_id))[0]
+
+
+async def get_post_validators(db: AsyncSession, post_id: int):
+    # What a conditional GET needs: (version, last modified), read from the
+    # posts row and its author's. The author's name and picture are part of
+    # the post, so a profile edit changes both validators
+    last_modified = func.coalesce(Post.changed_at, Post.updated_at, Post.created_at)
+    row = (await db.execute(select(Post.version, last_modified, User.profile_version, User.profile_changed_at)
+                            .join(User, User.id == Post.user_id)
+                            .where(Post.id == post_id, Post.deleted_at.is_(None), User.deleted_at.is_(None)))).first()
+    if row is None:
+        return None
+    version, last_modified, profile_version, profile_changed_at = row
+    if profile_changed_at is not None:
+        last_modified = max(as_utc(last_modified), as_utc(profile_changed_at))
+    return f"{version}.{profile_version}", last_modified
+
+
+# Comments of a post, newest first, paged on (created_at, id) over the
+# (post_id, created_at, id) index. Like the feed, rows are projected with
+# their author and returned as CommentResponse-shaped dicts.
+
+def post_comments_query(db: AsyncSession, post_id: int, after=None):
+    query = select(Comment.content, Comment.id, Comment.created_at, Comment.updated_at, Comment.user_id,
+                   Comment.post_id, User.username, User.profile_image)\
+        .join(User, User.id == Comment.user_id)\
+        .where(Comment.post_id == post_id, User.deleted_at.is_(None))
+    if after:
+        created_at, comment_id = after
+        query = query.where(tuple_(Comment.created_at, Comment.id) < tuple_(created_at_param(db, created_at), literal(comment_id)))
+    return query.order_by(Comment.created_at.desc(), Comment.id.desc())
+
+
+def comment_dict(row):
+    return {
+        "content": row.content,
+        "id": row.id,
+        "created_at": row.created_at,
+        "updated_at": row.updated_at,
+        "user_id": row.user_id,
+        "post_id": row.post_id,
+        "author": author_dict(row),
+    }
+
+
+async def get_comments_page(db: AsyncSession, post_id: int, limit: int = 50, cursor: str = None):
+    query = post_comments_query(db, post_id, decode_cursor(cursor))
+    query = query.add_columns(type_coerce(Comment.created_at, String()).label("sort_key"))
+    rows, next_cursor = await fetch_page(db, query, limit)
+
+    return [comment_dict(row) for row in rows], next_cursor
+
+
+def commenter_profiles_query(db: AsyncSession, post_id: int, limit: int, after=None):
+    # (comments, sum of profile versions, last profile change) over a page
+    page = post_comments_query(db, post_id, after)\
+        .with_only_columns(User.profile_version, User.profile_changed_at).limit(limit).subquery()
+    return select(func.count(), func.coalesce(func.sum(page.c.profile_version), 0), func.max(page.c.profile_changed_at))
+
+
+async def get_comments_validators(db: AsyncSession, post_id: int, limit: int = 50, cursor: str = None):
+    # The post's validators (comment writes bump its version) combined with
+    # the profiles of the page's commenters, whose names and pictures are in
+    # the body: a commenter's profile edit changes both validators
+    validators = await get_post_validators(db, post_id)
+    if validators is None:
+        return None
+    version, last_modified = validators
+    count, profile_versions, profile_changed_at = \
+        (await db.execute(commenter_profiles_query(db, post_id, limit, decode_cursor(cursor)))).one()
+    if profile_changed_at is not None:
+        last_modified = max(as_utc(last_modified), as_utc(profile_changed_at))
+    return f"{version}.{count}.{profile_versions}", last_modified
+
+
+async def stream_post_comments(db: AsyncSession, post_id: int, cursor: str = None, batch_size: int = 200):
+    # Every comment after the cursor, batch_size rows in memory at a time
+    query = post_comments_query(db, post_id, decode_cursor(cursor)).execution_options(yield_per=batch_size)
+    async for row in await db.stream(query):
+        yield comment_dict(row)
+
+
+# Batch reads and bulk writes: a fixed number of statements per request,
+# however many items it carries.
+
+def check_batch_size(items):
+    if len(items) > settings.BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"At most {settings.BATCH_MAX_ITEMS} items per request")
+
+
+async def get_posts_by_ids(db: AsyncSession, post_ids, viewer_id: int):
+    # Posts in the requested order; ids that do not exist are left out
+    if not post_ids:
+        return []
+    rows = (await db.execute(post_feed_query().where(Post.id.in_(post_ids)))).all()
+    by_id = {row.id: row for row in rows}
+    return await assemble_posts(db, [by_id[post_id] for post_id in dict.fromkeys(post_ids) if post_id in by_id], viewer_id)
+
+
+async def bulk_create_posts(db: AsyncSession, items, user_id: int):
+    from app.services.timeline import fan_out_posts
+
+    check_batch_size(items)
+    results, rows = [], []
+    for index, item in enumerate(items):
+        try:
+            post_data = PostCreate.model_validate(item)
+        except ValidationError as exc:
+            results.append({"index": index, "status": "invalid", "detail": exc.errors()[0]["msg"]})
+            continue
+        result = {"index": index, "status": "created"}
+        results.append(result)
+        rows.append((result, {"user_id": user_id, **post_data.model_dump()}))
+
+    # Media references are checked with one query for the whole batch
+    found = await existing_media_ids(db, {row["media_id"] for _, row in rows if row["media_id"]})
+    for result, row in rows:
+        if row["media_id"] and row["media_id"] not in found:
+            result.update(status="invalid", detail=f"Media with id: {row['media_id']} not found")
+        elif row["media_id"] and not row["image_url"]:
+            row["image_url"] = media_url(row["media_id"])
+    rows = [(result, row) for result, row in rows if result["status"] == "created"]
+
+    if rows:
+        # One executemany for the whole batch, ids back in parameter order
+        post_ids = (await db.scalars(insert(Post).returning(Post.id, sort_by_parameter_order=True),
+                                     [row for _, row in rows])).all()
+        await adjust_post_count(db, user_id, len(post_ids))
+        await fan_out_posts(db, post_ids, user_id)
+        await db.commit()
+
+        for (result, _), post_id in zip(rows, post_ids):
+            result["id"] = post_id
+
+    return results
+
+
+async def bulk_like_posts(db: AsyncSession, post_ids, user_id: int):
+    check_batch_size(post_ids)
+    post_ids = list(dict.fromkeys(post_ids))
+    found = set((await db.scalars(select(Post.id).where(Post.id.in_(post_ids), Post.deleted_at.is_(None)))).all())
+    already_liked = await get_liked_post_ids(db, post_ids, user_id)
+    if like_aggregator.enabled:
+        # Buffered like the single-post toggles, so a pending unlike of the
+        # same post is settled in order instead of being raced
+        liked = {post_id for post_id in post_ids
+                 if post_id in found and like_aggregator.like(user_id, post_id, post_id in already_liked)}
+        already_liked = found - liked
+        to_like = []
+    else:
+        to_like = [post_id for post_id in post_ids if post_id in found and post_id not in already_liked]
+
+    if to_like:
+        await db.execute(insert(Like), [{"user_id": user_id, "post_id": post_id} for post_id in to_like])
+        await adjust_like_counts(db, to_like, 1)
+        await trending.record(db, to_like, trending.LIKE_WEIGHT)
+        await db.commit()
+        for post_id in to_like:
+            invalidate_post(post_id)
+        like_index.add((user_id, post_id) for post_id in to_like)
+
+    def status_of(post_id):
+        if post_id not in found:
+            return "not_found"
+        return "already_liked" if post_id in already_liked else "liked"
+
+    return [{"post_id": post_id, "status": status_of(post_id)} for post_id in post_ids]
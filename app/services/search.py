@@ -0,0 +1,138 @@
+import re
+from contextlib import contextmanager
+
+from sqlalchemy import and_, or_, false, func, literal, literal_column, select, text, table, column
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.post import Post
+
+# Full-text search over posts. On SQLite an FTS5 external-content table mirrors
+# posts.content through triggers and results are ranked by BM25; other engines
+# fall back to a LIKE scan ordered by recency.
+
+posts_fts = table("posts_fts", column("rowid"), column("rank"))
+
+FTS_DDL = [
+    """CREATE VIRTUAL TABLE posts_fts USING fts5(
+        content, content='posts', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS posts_fts_ai AFTER INSERT ON posts BEGIN
+        INSERT INTO posts_fts(rowid, content) VALUES (new.id, new.content);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS posts_fts_ad AFTER DELETE ON posts BEGIN
+        INSERT INTO posts_fts(posts_fts, rowid, content) VALUES ('delete', old.id, old.content);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS posts_fts_au AFTER UPDATE OF content ON posts BEGIN
+        INSERT INTO posts_fts(posts_fts, rowid, content) VALUES ('delete', old.id, old.content);
+        INSERT INTO posts_fts(rowid, content) VALUES (new.id, new.content);
+    END""",
+    "INSERT INTO posts_fts(posts_fts) VALUES ('rebuild')",
+]
+
+
+def fts_enabled(bind) -> bool:
+    return bind.dialect.name == "sqlite"
+
+
+def install_post_search(conn):
+    if not fts_enabled(conn):
+        return
+    exists = conn.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'posts_fts'")).first()
+    if exists:
+        return
+    for statement in FTS_DDL:
+        conn.execute(text(statement))
+
+
+@contextmanager
+def post_search_paused(engine):
+    # Bulk loads: maintaining the index row by row through the insert trigger
+    # is most of the cost of a posts insert, so the trigger is dropped for the
+    # load and the index is rebuilt once at the end
+    with engine.begin() as conn:
+        paused = fts_enabled(conn) and conn.execute(
+            text("SELECT 1 FROM sqlite_master WHERE name = 'posts_fts_ai'")).first() is not None
+        if paused:
+            conn.execute(text("DROP TRIGGER posts_fts_ai"))
+    try:
+        yield
+    finally:
+        if paused:
+            with engine.begin() as conn:
+                conn.execute(text(FTS_DDL[1]))
+                conn.execute(text(FTS_DDL[-1]))
+
+
+def to_match_query(search: str):
+    # Quote every token so user input can't inject FTS5 syntax; the last token
+    # is a prefix match so results update while the user is still typing
+    tokens = re.findall(r"\w+", search)
+    if not tokens:
+        return None
+    terms = ['"%s"' % token for token in tokens]
+    terms[-1] += "*"
+    return " ".join(terms)
+
+
+# Matches older than the ranked window follow it, newest first. Their rank,
+# OLDER_RANK - rowid, sorts after every BM25 rank (those are negative) and is
+# exact as a float, so one (rank, id) cursor pages through both
+OLDER_RANK = 2 ** 53
+
+
+def search_tiers(db: Session):
+    # older=False and, on SQLite, then older=True: see ranked_matches
+    return (False, True) if fts_enabled(db.bind) else (False,)
+
+
+def is_older_rank(rank) -> bool:
+    return rank > 0
+
+
+def ranked_matches(db: Session, search: str, older: bool = False):
+    # Subquery of (post_id, rank), lower rank = better match
+    if fts_enabled(db.bind):
+        match = to_match_query(search)
+        if match is None:
+            return None
+        # BM25 is computed for every candidate, so very common terms are only
+        # ranked within the newest SEARCH_RANK_WINDOW matches (a cheap rowid
+        # scan); older=True gives the matches before the window instead
+        matched = literal_column("posts_fts").op("MATCH")(match)
+        window_start = select(posts_fts.c.rowid).where(matched)\
+            .order_by(posts_fts.c.rowid.desc())\
+            .limit(1).offset(settings.SEARCH_RANK_WINDOW - 1)\
+            .scalar_subquery()
+        window_start = func.coalesce(window_start, 0)
+        if older:
+            return select(posts_fts.c.rowid.label("post_id"), (OLDER_RANK - posts_fts.c.rowid).label("rank"))\
+                .where(matched, posts_fts.c.rowid < window_start)\
+                .subquery()
+        return select(posts_fts.c.rowid.label("post_id"), posts_fts.c.rank.label("rank"))\
+            .where(matched, posts_fts.c.rowid >= window_start)\
+            .subquery()
+
+    return select(Post.id.label("post_id"), (-Post.id).label("rank"))\
+        .where(Post.content.contains(search))\
+        .subquery()
+
+
+def filter_search(query, db: Session, search: str, after=None, older: bool = False):
+    # Applies the search to a Post select, ordered by rank with a (rank, id) keyset
+    matches = ranked_matches(db, search, older)
+    if matches is None:
+        return query.where(false()), literal(0)
+
+    query = query.join(matches, matches.c.post_id == Post.id)
+    if older:
+        # The rank only restates the rowid: ordering on the rowid lets FTS5
+        # return the matches in order instead of sorting them all
+        if after and is_older_rank(after[0]):
+            query = query.where(matches.c.post_id < OLDER_RANK - after[0])
+        return query.order_by(matches.c.post_id.desc()), matches.c.rank
+    if after:
+        rank, post_id = after
+        query = query.where(or_(matches.c.rank > rank, and_(matches.c.rank == rank, Post.id > post_id)))
+    return query.order_by(matches.c.rank, Post.id), matches.c.rank
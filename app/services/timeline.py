@@ -0,0 +1,164 @@
+from sqlalchemy import select, insert, delete, tuple_, literal, type_coerce, String
+from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import HTTPException, status
+from app.config import settings
+from app.models.follow import Follow, TimelineEntry
+from app.models.post import Post
+from app.models.user import User
+from app.services.counters import adjust_follow_counts
+from app.services.post import get_posts_by_ids, created_at_param
+from app.utils.pagination import encode_cursor, decode_cursor
+
+# Home timelines. Each user's timeline is materialized in timeline_entries and
+# filled on write: a new post is copied to every follower in one INSERT ... SELECT.
+# Authors above TIMELINE_FANOUT_MAX_FOLLOWERS are not copied; their posts are
+# merged in at read time from the posts(user_id, created_at, id) index.
+
+TIMELINE_COLUMNS = ["user_id", "post_id", "author_id", "created_at"]
+
+
+def is_fanned_out(follower_count: int) -> bool:
+    return follower_count <= settings.TIMELINE_FANOUT_MAX_FOLLOWERS
+
+
+def timeline_order():
+    return TimelineEntry.created_at.desc(), TimelineEntry.post_id.desc()
+
+
+async def trim_timeline(db: AsyncSession, user_id: int):
+    # Keep the newest TIMELINE_MAX_LENGTH entries; older pages fall back to nothing
+    boundary = (await db.execute(
+        select(type_coerce(TimelineEntry.created_at, String()), TimelineEntry.post_id)
+        .where(TimelineEntry.user_id == user_id)
+        .order_by(*timeline_order())
+        .offset(settings.TIMELINE_MAX_LENGTH).limit(1)
+    )).first()
+    if boundary is None:
+        return
+
+    created_at, post_id = boundary
+    await db.execute(delete(TimelineEntry).where(
+        TimelineEntry.user_id == user_id,
+        tuple_(TimelineEntry.created_at, TimelineEntry.post_id) <= tuple_(created_at_param(db, created_at), literal(post_id)),
+    ))
+
+
+async def fan_out_post(db: AsyncSession, post_id: int, author_id: int):
+    await fan_out_posts(db, [post_id], author_id)
+
+
+async def fan_out_posts(db: AsyncSession, post_ids, author_id: int):
+    # Runs in the transaction that creates the posts, after they were flushed
+    new_posts = select(Post.user_id, Post.id, Post.user_id.label("author_id"), Post.created_at).where(Post.id.in_(post_ids))
+    await db.execute(insert(TimelineEntry).from_select(TIMELINE_COLUMNS, new_posts))
+
+    follower_count = await db.scalar(select(User.follower_count).where(User.id == author_id))
+    if not is_fanned_out(follower_count or 0):
+        return
+
+    followers = (select(Follow.follower_id, Post.id, Post.user_id, Post.created_at)
+                 .join(Post, Post.id.in_(post_ids))
+                 .where(Follow.followee_id == author_id))
+    await db.execute(insert(TimelineEntry).from_select(TIMELINE_COLUMNS, followers))
+
+    # Trimming every follower on every post would cost more than the fan-out
+    # itself, so each post trims a rotating 1/TIMELINE_TRIM_EVERY slice of them
+    trim_every = settings.TIMELINE_TRIM_EVERY
+    to_trim = await db.scalars(select(Follow.follower_id).where(
+        Follow.followee_id == author_id, (Follow.follower_id + post_ids[0]) % trim_every < len(post_ids)))
+    for user_id in [author_id, *to_trim.all()]:
+        await trim_timeline(db, user_id)
+
+
+async def follow_user(db: AsyncSession, follower_id: int, followee_id: int):
+    if follower_id == followee_id:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="You cannot follow yourself")
+
+    followee = await db.get(User, followee_id)
+    if not followee or followee.deleted_at is not None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"User with id: {followee_id} not found")
+
+    if await db.get(Follow, (follower_id, followee_id)):
+        return False
+
+    db.add(Follow(follower_id=follower_id, followee_id=followee_id))
+    await adjust_follow_counts(db, follower_id, followee_id, 1)
+
+    if is_fanned_out(followee.follower_count):
+        # Backfill the followee's recent posts so the timeline is not empty
+        # until they post again
+        already_there = select(TimelineEntry.post_id).where(TimelineEntry.user_id == follower_id)
+        recent = (select(literal(follower_id), Post.id, Post.user_id, Post.created_at)
+                  .where(Post.user_id == followee_id, Post.id.not_in(already_there), Post.deleted_at.is_(None))
+                  .order_by(Post.created_at.desc(), Post.id.desc())
+                  .limit(settings.TIMELINE_MAX_LENGTH))
+        await db.execute(insert(TimelineEntry).from_select(TIMELINE_COLUMNS, recent))
+        await trim_timeline(db, follower_id)
+
+    await db.commit()
+    return True
+
+
+async def unfollow_user(db: AsyncSession, follower_id: int, followee_id: int):
+    result = await db.execute(delete(Follow).where(Follow.follower_id == follower_id,
+                                                   Follow.followee_id == followee_id))
+    if not result.rowcount:
+        return False
+
+    await adjust_follow_counts(db, follower_id, followee_id, -1)
+    await db.execute(delete(TimelineEntry).where(TimelineEntry.user_id == follower_id,
+                                                 TimelineEntry.author_id == followee_id))
+    await db.commit()
+    return True
+
+
+def timeline_page_query(db: AsyncSession, user_id: int, limit: int, after=None):
+    # One range scan on (user_id, created_at, post_id); posts is not touched
+    query = select(TimelineEntry.post_id, type_coerce(TimelineEntry.created_at, String()))
+    query = query.where(TimelineEntry.user_id == user_id)
+    if after:
+        created_at, post_id = after
+        query = query.where(tuple_(TimelineEntry.created_at, TimelineEntry.post_id)
+                            < tuple_(created_at_param(db, created_at), literal(post_id)))
+    return query.order_by(*timeline_order()).limit(limit)
+
+
+async def pulled_posts(db: AsyncSession, user_id: int, limit: int, after=None):
+    # Fan-out-on-read: recent posts of followed accounts that are not fanned out
+    big_accounts = (select(Follow.followee_id)
+                    .join(User, User.id == Follow.followee_id)
+                    .where(Follow.follower_id == user_id,
+                           User.follower_count > settings.TIMELINE_FANOUT_MAX_FOLLOWERS))
+    author_ids = (await db.scalars(big_accounts)).all()
+    if not author_ids:
+        return []
+
+    query = select(Post.id, type_coerce(Post.created_at, String()))\
+        .where(Post.user_id.in_(author_ids), Post.deleted_at.is_(None))
+    if after:
+        created_at, post_id = after
+        query = query.where(tuple_(Post.created_at, Post.id) < tuple_(created_at_param(db, created_at), literal(post_id)))
+    query = query.order_by(Post.created_at.desc(), Post.id.desc()).limit(limit)
+    return (await db.execute(query)).all()
+
+
+async def get_home_timeline(db: AsyncSession, viewer_id: int, limit: int = 10, cursor: str = None):
+    after = decode_cursor(cursor)
+
+    entries = (await db.execute(timeline_page_query(db, viewer_id, limit, after))).all()
+    entries += await pulled_posts(db, viewer_id, limit, after)
+
+    # An account that crossed the threshold can be in both lists
+    page = sorted({post_id: created_at for post_id, created_at in entries}.items(),
+                  key=lambda entry: (entry[1], entry[0]), reverse=True)[:limit]
+    if not page:
+        return [], None
+
+    results = await get_posts_by_ids(db, [post_id for post_id, _ in page], viewer_id)
+
+    next_cursor = None
+    if len(page) == limit:
+        last_post_id, last_created_at = page[-1]
+        next_cursor = encode_cursor(last_created_at, last_post_id)
+
+    return results, next_cursor
@@ -0,0 +1,191 @@
+import heapq
+import math
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import bindparam, case, delete, func, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.comment import Comment
+from app.models.post import Like, Post, PostScore
+from app.utils.http_cache import as_utc
+
+# Trending posts: likes and comments with exponential time decay, a like
+# worth LIKE_WEIGHT and a comment COMMENT_WEIGHT when new, half of that
+# TRENDING_HALF_LIFE_HOURS later. Decay scales every post by the same factor,
+# so each post stores its score as of a fixed EPOCH instead:
+#
+#     stored = ln(sum of weight * 2 ** ((event time - EPOCH) / half-life))
+#
+# The order of stored scores is the trending order at any moment. An event
+# only updates its own post's row (ln keeps the numbers small however far
+# from EPOCH), and nothing is ever rescaled. A like or comment that is taken
+# back subtracts exactly what it added, using its created_at.
+#
+# GET /posts/trending reads the top TRENDING_TOP_K from an in-memory index:
+# loaded at startup, updated by this worker's writes, reloaded from the
+# ix_post_scores_score index every TRENDING_REFRESH_SECONDS to pick up the
+# other workers' writes. Likes and comments are never aggregated to serve it.
+
+LIKE_WEIGHT = 1.0
+COMMENT_WEIGHT = 3.0
+EPOCH = datetime(2024, 1, 1, tzinfo=timezone.utc)
+# A score taken back to (about) nothing: the row is deleted
+FLOOR = -1e9
+# Rebuilds skip events older than this many half-lives: they count for
+# less than a millionth of a new like
+REBUILD_HALF_LIVES = 20
+
+
+def half_life_seconds() -> float:
+    return settings.TRENDING_HALF_LIFE_HOURS * 3600
+
+
+def event_term(weight: float, at: datetime = None) -> float:
+    # ln of one event's contribution as of EPOCH. Whole seconds, like the
+    # CURRENT_TIMESTAMP the row gets, so taking it back subtracts the same term
+    at = (as_utc(at) if at is not None else datetime.now(timezone.utc)).replace(microsecond=0)
+    return math.log(weight) + (at - EPOCH).total_seconds() / half_life_seconds() * math.log(2)
+
+
+def current_score(stored: float, now: datetime = None) -> float:
+    # The decayed score, in likes: what a score means at a given moment
+    return math.exp(stored - event_term(1.0, now))
+
+
+def logaddexp(a: float, b: float) -> float:
+    high, low = max(a, b), min(a, b)
+    return high + math.log1p(math.exp(low - high))
+
+
+def _combine(events):
+    # (post_id, term) pairs -> {post_id: ln of the summed contributions}
+    terms = {}
+    for post_id, term in events:
+        terms[post_id] = logaddexp(terms[post_id], term) if post_id in terms else term
+    return terms
+
+
+class TopK:
+    # The highest stored scores. Holds up to twice the size between prunes, so
+    # a post that drops out of the top is only forgotten once it falls far
+    # behind; reloads from the table restore anything dropped too early
+
+    def __init__(self, size: int):
+        self.size = size
+        self._scores = {}
+        self._ranked = None
+
+    def __len__(self):
+        return len(self._scores)
+
+    def offer(self, post_id: int, score: float):
+        self._scores[post_id] = score
+        self._ranked = None
+        if len(self._scores) > 2 * self.size:
+            self._scores = dict(heapq.nlargest(self.size, self._scores.items(), key=lambda item: item[1]))
+
+    def discard(self, post_id: int):
+        if self._scores.pop(post_id, None) is not None:
+            self._ranked = None
+
+    def replace(self, items):
+        self._scores = dict(items)
+        self._ranked = None
+
+    def top(self, limit: int):
+        if self._ranked is None:
+            ranked = heapq.nlargest(self.size, self._scores.items(), key=lambda item: (item[1], item[0]))
+            self._ranked = [post_id for post_id, _ in ranked]
+        return self._ranked[:limit]
+
+
+trending_index = TopK(settings.TRENDING_TOP_K)
+_last_refresh = 0.0
+
+
+def _upsert(db):
+    # Adds a contribution: ln(exp(score) + exp(new)), computed without overflow
+    dialect = db.bind.dialect.name
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        greatest = func.max
+    else:
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        greatest = func.greatest
+    statement = dialect_insert(PostScore)
+    current, new = PostScore.score, statement.excluded.score
+    combined = greatest(current, new) + func.ln(1 + func.exp(-func.abs(current - new)))
+    return statement.on_conflict_do_update(index_elements=[PostScore.post_id], set_={"score": combined})
+
+
+async def record(db: AsyncSession, post_ids, weight: float, at: datetime = None):
+    # One event of `weight` per post id (repeats count again), in the
+    # caller's transaction
+    term = event_term(weight, at)
+    terms = _combine((post_id, term) for post_id in post_ids)
+    if not terms:
+        return
+    rows = await db.execute(_upsert(db).returning(PostScore.post_id, PostScore.score),
+                            [{"post_id": post_id, "score": score} for post_id, score in terms.items()])
+    for post_id, score in rows.all():
+        trending_index.offer(post_id, score)
+
+
+async def retract(db: AsyncSession, events, weight: float):
+    # Takes back (post_id, created_at) events: ln(exp(score) - exp(term)).
+    # Less than a thousandth of the event left over is clock skew, not score
+    terms = _combine((post_id, event_term(weight, at)) for post_id, at in events)
+    term = bindparam("term")
+    remaining = case((PostScore.score - term > 1e-3, PostScore.score + func.ln(1 - func.exp(term - PostScore.score))),
+                     else_=FLOOR)
+    for post_id, score in terms.items():
+        new_score = await db.scalar(update(PostScore).where(PostScore.post_id == post_id)
+                                    .values(score=remaining).returning(PostScore.score), {"term": score})
+        if new_score is None:
+            continue
+        if new_score <= FLOOR:
+            await remove_post(db, post_id)
+        else:
+            trending_index.offer(post_id, new_score)
+
+
+async def remove_post(db: AsyncSession, post_id: int):
+    await db.execute(delete(PostScore).where(PostScore.post_id == post_id))
+    trending_index.discard(post_id)
+
+
+async def load_trending(db: AsyncSession):
+    global _last_refresh
+    _last_refresh = time.monotonic()
+    rows = await db.execute(select(PostScore.post_id, PostScore.score)
+                            .order_by(PostScore.score.desc()).limit(settings.TRENDING_TOP_K))
+    trending_index.replace(rows.all())
+
+
+async def trending_post_ids(db: AsyncSession, limit: int):
+    if time.monotonic() - _last_refresh > settings.TRENDING_REFRESH_SECONDS:
+        await load_trending(db)
+    return trending_index.top(max(limit, 0))
+
+
+def rebuild_scores(db: Session, batch_size: int = 10_000):
+    # Recomputes post_scores from likes and comments (migration, CLI)
+    since = datetime.now(timezone.utc) - timedelta(seconds=REBUILD_HALF_LIVES * half_life_seconds())
+    terms = {}
+    for model, weight in ((Like, LIKE_WEIGHT), (Comment, COMMENT_WEIGHT)):
+        # Rows left behind by a deleted post do not count
+        query = (select(model.post_id, model.created_at).join(Post, Post.id == model.post_id)
+                 .where(model.created_at >= since))
+        for post_id, created_at in db.execute(query.execution_options(yield_per=batch_size)):
+            term = event_term(weight, created_at)
+            terms[post_id] = logaddexp(terms[post_id], term) if post_id in terms else term
+
+    db.execute(delete(PostScore))
+    rows = [{"post_id": post_id, "score": score} for post_id, score in terms.items()]
+    for start in range(0, len(rows), batch_size):
+        db.execute(insert(PostScore), rows[start:start + batch_size])
+    db.commit()
+    return len(rows)
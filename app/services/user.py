@@ -1,17 +1,120 @@
-from sqlalchemy.orm import Session
-from app.models.user import User
+import sys
+import time
+from datetime import timedelta
+from sqlalchemy import select, func, tuple_, literal
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.config import settings
+from app.models.deletion import DeletionJob
+from app.models.user import User, username_key
 from app.schemas.user import UserCreate
-from app.core.security import hash_password
+from app.core.passwords import password_hasher
+from app.utils.pagination import decode_cursor, fetch_page
+from app.utils.prefix_index import PrefixIndex
 
-def create_user(db: Session, user_data: UserCreate):
+async def create_user(db: AsyncSession, user_data: UserCreate):
     db_user = User(
         email=user_data.email,
-        password=hash_password(user_data.password),  # << aqui faz hash da senha
+        password=await password_hasher.hash(user_data.password),  # << aqui faz hash da senha
         username=user_data.username,
         bio=user_data.bio,
         profile_image=user_data.profile_image
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
-    return db_user
\ No newline at end of file
+    await db.commit()
+    await db.refresh(db_user)
+    index_user(db_user)
+    return db_user
+
+
+# User directory, ordered by (username_key, id) on ix_users_username_key_id.
+# A username prefix is a range on that same index.
+
+def prefix_upper_bound(prefix: str):
+    # The smallest string after every string starting with prefix (in code
+    # point order, which is also UTF-8 byte order), or None if there is none.
+    # Trailing U+10FFFF cannot be incremented and surrogates cannot be stored
+    prefix = prefix.rstrip(chr(sys.maxunicode))
+    if not prefix:
+        return None
+    code_point = ord(prefix[-1]) + 1
+    if 0xD800 <= code_point <= 0xDFFF:
+        code_point = 0xE000
+    return prefix[:-1] + chr(code_point)
+
+
+def users_page_query(search: str, after=None):
+    username = User.username_key
+    query = select(User).where(User.deleted_at.is_(None))
+    if search:
+        prefix = username_key(search)
+        # Everything from the prefix up to the next possible prefix
+        query = query.where(username >= prefix)
+        upper = prefix_upper_bound(prefix)
+        if upper is not None:
+            query = query.where(username < upper)
+    if after:
+        last_username, last_id = after
+        query = query.where(tuple_(username, User.id) > tuple_(literal(last_username), literal(last_id)))
+    return query.order_by(username, User.id)
+
+
+async def get_users_page(db: AsyncSession, limit: int = 50, search: str = "", cursor: str = None):
+    rows, next_cursor = await fetch_page(db, users_page_query(search, decode_cursor(cursor)), limit,
+                                         lambda row: (username_key(row.User.username), row.User.id))
+    return [row.User for row in rows], next_cursor
+
+
+# @-mention autocomplete answers from memory. Each worker warms the index at
+# startup and updates it on its own creates, renames and deletions. Every
+# AUTOCOMPLETE_REFRESH_SECONDS it picks up the other workers' changes: new
+# users by id, renames by profile_changed_at and deleted accounts by their
+# deletion job (the users row itself is gone once the job finishes).
+
+# Renames are re-read from this long before the previous refresh started, so
+# one committed just after it with an earlier timestamp is not missed
+RENAME_OVERLAP = timedelta(minutes=1)
+
+username_index = PrefixIndex()
+_last_refresh = 0.0
+_renamed_since = None
+_last_deletion_job = 0
+
+
+def index_user(user: User):
+    username_index.add(user.id, username_key(user.username),
+                       {"id": user.id, "username": user.username, "profile_image": user.profile_image})
+
+
+async def load_username_index(db: AsyncSession, batch_size: int = 5_000):
+    global _last_refresh, _renamed_since, _last_deletion_job
+    _last_refresh = time.monotonic()
+    started_at = await db.scalar(select(func.now()))
+
+    if _renamed_since is None:
+        # First load: every live user is read below, so earlier jobs are moot
+        _last_deletion_job = await db.scalar(select(func.max(DeletionJob.id))) or 0
+    else:
+        renamed = select(User.id, User.username, User.profile_image)\
+            .where(User.profile_changed_at >= _renamed_since, User.id <= username_index.max_id,
+                   User.deleted_at.is_(None))
+        for user in (await db.execute(renamed)).all():
+            index_user(user)
+        deleted = select(DeletionJob.id, DeletionJob.target_id)\
+            .where(DeletionJob.id > _last_deletion_job, DeletionJob.kind == "user")
+        for job_id, user_id in (await db.execute(deleted)).all():
+            username_index.remove(user_id)
+            _last_deletion_job = max(_last_deletion_job, job_id)
+    _renamed_since = started_at - RENAME_OVERLAP
+
+    query = (select(User.id, User.username, User.profile_image)
+             .where(User.id > username_index.max_id, User.deleted_at.is_(None))
+             .order_by(User.id)
+             .execution_options(yield_per=batch_size))
+    async for user in await db.stream(query):
+        index_user(user)
+
+
+async def autocomplete_usernames(db: AsyncSession, prefix: str, limit: int = 10):
+    if time.monotonic() - _last_refresh > settings.AUTOCOMPLETE_REFRESH_SECONDS:
+        await load_username_index(db)
+    return username_index.search(username_key(prefix), limit)
@@ -1,23 +1,38 @@
+import hashlib
+import time
 from jose import JWTError, jwt
 from datetime import datetime, timedelta
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from .. import models, schemas, database
 from ..config import settings
+from ..schemas.auth import TokenData
+from .cache import TTLCache
 from typing import Optional
 
 # oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
+# Cache of verified tokens (sha256 of the token -> user id) and of principals
+# (user id -> detached User). Saves the JWT decode and the users lookup on
+# every authenticated request; invalidate_user() drops a principal when the
+# user changes, the TTL bounds staleness across worker processes.
+token_cache = TTLCache(settings.AUTH_CACHE_MAX_ENTRIES, settings.AUTH_CACHE_TTL_SECONDS)
+principal_cache = TTLCache(settings.AUTH_CACHE_MAX_ENTRIES, settings.AUTH_CACHE_TTL_SECONDS)
+
+
+def invalidate_user(user_id: int):
+    principal_cache.pop(user_id)
+
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     
     if expires_delta:
-        expire = datetime.utcCURRENT_TIMESTAMP + expires_delta
+        expire = datetime.utcnow() + expires_delta
     else:
-        expire = datetime.utcCURRENT_TIMESTAMP + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+        expire = datetime.utcnow() + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     
     to_encode.update({"exp": expire})
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
@@ -35,10 +50,11 @@ def verify_access_token(token: str, credentials_exception):
     except JWTError:
         raise credentials_exception
     
-    return TokenData(id=user_id)
-def get_current_user(
+    return TokenData(user_id=user_id)
+
+async def get_current_user(
     token: str = Depends(oauth2_scheme),
-    db: Session = Depends(database.get_db)
+    db: AsyncSession = Depends(database.get_async_db)
 ):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -46,14 +62,29 @@ def get_current_user(
         headers={"WWW-Authenticate": "Bearer"},
     )
     
-    token_data = verify_access_token(token, credentials_exception)
-    
-    user = db.query(models.User).filter(models.User.id == token_data.id).first()
+    token_key = hashlib.sha256(token.encode()).digest()
+    user_id = token_cache.get(token_key)
+    if user_id is None:
+        user_id = verify_access_token(token, credentials_exception).user_id
+        # Never keep a token cached past its own expiry
+        exp = jwt.get_unverified_claims(token).get("exp", 0)
+        token_cache.set(token_key, user_id, ttl=min(token_cache.ttl, exp - time.time()))
     
+    user = principal_cache.get(user_id)
     if user is None:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="User not found"
-        )
+        user = await db.get(models.User, user_id)
+        
+        if user is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="User not found"
+            )
+        
+        # Detached so the cached object is never tied to this request's session
+        db.expunge(user)
+        principal_cache.set(user_id, user)
+    
+    if user.is_active is False:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Inactive user")
     
     return user
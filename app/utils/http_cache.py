@@ -0,0 +1,82 @@
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any, Hashable, Optional
+
+from fastapi import Request, Response, status
+
+from app.config import settings
+from app.utils.cache import TTLCache
+
+# Conditional GET and a response cache for the post/comment reads that mobile
+# clients poll. Entries carry the post version they were built from, so a
+# worker never serves a body older than the version it just read; the write
+# paths also drop them right away to free the memory.
+
+response_cache = TTLCache(max_entries=settings.RESPONSE_CACHE_MAX_ENTRIES, ttl=settings.RESPONSE_CACHE_TTL_SECONDS)
+
+
+def make_etag(*parts) -> str:
+    return '"' + "-".join(str(part) for part in parts) + '"'
+
+
+def as_utc(value: Optional[datetime]) -> Optional[datetime]:
+    # SQLite hands back naive timestamps; CURRENT_TIMESTAMP is UTC
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def is_not_modified(request: Request, etag: str, last_modified: Optional[datetime]) -> bool:
+    # If-None-Match wins over If-Modified-Since (RFC 9110 13.2.2)
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in tags or etag in tags
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            return False
+        return as_utc(last_modified).replace(microsecond=0) <= since
+    return False
+
+
+def validator_headers(etag: str, last_modified: Optional[datetime]) -> dict:
+    # no-cache: clients may store the body but must revalidate every time
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if last_modified:
+        headers["Last-Modified"] = format_datetime(as_utc(last_modified), usegmt=True)
+    return headers
+
+
+def not_modified_response(etag: str, last_modified: Optional[datetime]) -> Response:
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=validator_headers(etag, last_modified))
+
+
+def json_response(body: bytes, etag: str, last_modified: Optional[datetime], next_cursor: Optional[str] = None) -> Response:
+    headers = validator_headers(etag, last_modified)
+    if next_cursor:
+        headers["X-Next-Cursor"] = next_cursor
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+def get_cached(key: Hashable, version: Hashable) -> Optional[Any]:
+    entry = response_cache.get(key)
+    if entry is None or entry[0] != version:
+        return None
+    return entry[1]
+
+
+def set_cached(key: Hashable, version: Hashable, value: Any):
+    response_cache.set(key, (version, value))
+
+
+def invalidate_post(post_id: int):
+    for key in (("post", post_id, False), ("post", post_id, True), ("comments", post_id)):
+        response_cache.pop(key)
@@ -0,0 +1,249 @@
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import event
+
+# Prometheus-style metrics without the client library: counters, gauges and
+# histograms kept in plain dicts and rendered in the text exposition format
+# (version 0.0.4) on GET /metrics. Recording is a dict lookup and an add; no
+# locks, everything runs on the event loop. Per worker process, like TTLCache:
+# the scraper sums the workers.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+Labels = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Metric:
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Labels = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Labels, float] = {}
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        for labels, value in self._values.items():
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, *labels, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def total(self) -> float:
+        return sum(self._values.values())
+
+    def set(self, *labels, value: float):
+        # Only for collectors mirroring a total that is counted elsewhere
+        self._values[labels] = value
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def set(self, *labels, value: float):
+        self._values[labels] = value
+
+    def inc(self, *labels, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Labels = (), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [count per bucket (not cumulative) ..., +Inf count, sum]
+        self._series: Dict[Labels, list] = {}
+
+    def observe(self, value: float, *labels):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        for labels, series in self._series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                cumulative += count
+                le = 'le="' + _format_value(bound) + '"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {_format_value(series[-1])}")
+            lines.append(f"{self.name}_count{label_text} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[Metric] = []
+        # Called on every scrape to copy stats kept elsewhere (caches, the
+        # bcrypt pool, ...) into gauges and counters
+        self._collectors: List[Callable[[], None]] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Labels = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Labels = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Labels = (), buckets=LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def add_collector(self, collector: Callable[[], None]):
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        for collector in self._collectors:
+            collector()
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_requests = registry.counter(
+    "http_requests_total", "HTTP requests by route template, method and status code.", ("method", "route", "status"))
+http_request_duration = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template.", ("method", "route"))
+http_in_flight = registry.gauge("http_requests_in_flight", "HTTP requests being served.")
+db_queries = registry.counter("db_queries_total", "SQL statements executed.", ("route",))
+db_query_duration = registry.counter("db_query_seconds_total", "Time spent executing SQL statements.", ("route",))
+db_queries_per_request = registry.histogram(
+    "http_request_db_queries", "SQL statements per HTTP request.", ("method", "route"), QUERY_COUNT_BUCKETS)
+db_seconds_per_request = registry.histogram(
+    "http_request_db_seconds", "Database time per HTTP request.", ("method", "route"))
+startup_seconds = registry.gauge("app_startup_seconds", "Time from lifespan start to ready, warm-up included.")
+first_request_seconds = registry.gauge("http_first_request_seconds", "Latency of the first request this worker served.")
+
+
+class RequestStats:
+    __slots__ = ("queries", "db_seconds")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+
+
+# Set by the middleware; the engine hooks add to it. Statements run outside a
+# request (CLI, background flushes) are counted under route="background"
+_request_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._metrics_started_at = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - context._metrics_started_at
+    stats = _request_stats.get()
+    if stats is None:
+        db_queries.inc("background")
+        db_query_duration.inc("background", amount=elapsed)
+    else:
+        stats.queries += 1
+        stats.db_seconds += elapsed
+
+
+def instrument_engine(engine):
+    # Takes a sync Engine; pass AsyncEngine.sync_engine for the async ones
+    if event.contains(engine, "after_cursor_execute", _after_cursor_execute):
+        return
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class MetricsMiddleware:
+    # Plain ASGI middleware rather than @app.middleware("http"): no extra task
+    # per request, and streamed responses are timed until their last chunk.
+    # Requests are labelled by route template (/posts/{id}), never by raw path,
+    # so the number of series stays bounded. Requests no route handled are
+    # either the router's trailing-slash redirects (route="redirect") or
+    # 404s (route="unmatched").
+
+    def __init__(self, app):
+        self.app = app
+        self.first_request = True
+
+    async def __call__(self, scope, receive, send):
+        # Startup warm-up requests (app/warmup.py) are not traffic
+        if scope["type"] != "http" or scope.get("warmup"):
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        http_in_flight.inc()
+        started_at = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started_at
+            http_in_flight.dec()
+            _request_stats.reset(token)
+
+            route = scope.get("route")
+            if route is not None:
+                route = route.path
+            else:
+                route = "redirect" if status_code in (307, 308) else "unmatched"
+            method = scope["method"]
+            http_requests.inc(method, route, str(status_code))
+            http_request_duration.observe(elapsed, method, route)
+            if self.first_request:
+                self.first_request = False
+                first_request_seconds.set(value=elapsed)
+            db_queries_per_request.observe(stats.queries, method, route)
+            db_seconds_per_request.observe(stats.db_seconds, method, route)
+            if stats.queries:
+                db_queries.inc(route, amount=stats.queries)
+                db_query_duration.inc(route, amount=stats.db_seconds)
@@ -0,0 +1,44 @@
+import base64
+import json
+from typing import Any, Callable, Optional, Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+def encode_cursor(sort_value: Any, row_id: int) -> str:
+    # Cursor opaco: (valor de ordenação, id) serializado em base64 url-safe
+    if hasattr(sort_value, "isoformat"):
+        sort_value = sort_value.isoformat(sep=" ")
+    raw = json.dumps([sort_value, row_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Tuple[Any, int]]:
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        sort_value, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        # O valor vai direto para o SQL: só escalares (nada de listas, objetos ou null)
+        if isinstance(sort_value, bool) or not isinstance(sort_value, (str, int, float)):
+            raise ValueError(sort_value)
+        return sort_value, int(row_id)
+    except (ValueError, TypeError):
+        raise invalid_cursor()
+
+
+def invalid_cursor() -> HTTPException:
+    return HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+
+async def fetch_page(db: AsyncSession, query, limit: int, cursor_key: Optional[Callable] = None):
+    # Até `limit` linhas e o cursor da página seguinte, montado a partir da
+    # última linha (por padrão as colunas sort_key e id). Só uma página cheia
+    # pode ter mais linhas depois dela
+    rows = (await db.execute(query.limit(limit))).all()
+    next_cursor = None
+    if rows and len(rows) == limit:
+        last = rows[-1]
+        next_cursor = encode_cursor(*(cursor_key(last) if cursor_key else (last.sort_key, last.id)))
+    return rows, next_cursor
@@ -0,0 +1,46 @@
+from bisect import bisect_left, insort
+from typing import Any, Dict, List, Tuple
+
+
+class PrefixIndex:
+    # In-process prefix index: a sorted list of (key, id) searched with bisect.
+    # Lookups are O(log n + k); an insert shifts the list, which is a memmove
+    # and still far cheaper than a database round trip. Per worker, like TTLCache.
+
+    def __init__(self):
+        self._keys: List[Tuple[str, int]] = []
+        self._items: Dict[int, Tuple[str, Any]] = {}
+        self.max_id = 0
+
+    def add(self, item_id: int, key: str, value: Any):
+        # Adding an id that is already indexed replaces it (renames)
+        self.remove(item_id)
+        insort(self._keys, (key, item_id))
+        self._items[item_id] = (key, value)
+        self.max_id = max(self.max_id, item_id)
+
+    def remove(self, item_id: int):
+        item = self._items.pop(item_id, None)
+        if item is None:
+            return
+        position = bisect_left(self._keys, (item[0], item_id))
+        del self._keys[position]
+
+    def search(self, prefix: str, limit: int) -> List[Any]:
+        results = []
+        position = bisect_left(self._keys, (prefix,))
+        while position < len(self._keys) and len(results) < limit:
+            key, item_id = self._keys[position]
+            if not key.startswith(prefix):
+                break
+            results.append(self._items[item_id][1])
+            position += 1
+        return results
+
+    def clear(self):
+        self._keys.clear()
+        self._items.clear()
+        self.max_id = 0
+
+    def __len__(self):
+        return len(self._keys)
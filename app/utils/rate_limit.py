@@ -0,0 +1,132 @@
+import math
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Callable, Hashable, Optional, Tuple
+
+from fastapi import Depends, HTTPException, Request, status
+
+from .. import models
+from ..config import settings
+from .auth import get_current_user
+
+# Token buckets for the expensive routes: bcrypt logins and sign-ups, like
+# toggles and writes that queue on the SQLite writer, search scans. A rule
+# (settings.RATE_LIMITS) gives each key a bucket of N tokens that refills at
+# N per period; a request takes one token or gets 429 with Retry-After. Keys
+# are the authenticated user, or the client IP on routes without one (behind
+# a proxy, run uvicorn with --proxy-headers so that is the real client).
+#
+# Buckets live in a backend. InMemoryBackend keeps them in this worker, so
+# with several workers a client gets up to N per worker; a shared store
+# (Redis, the database) only has to implement acquire() to make them global.
+
+PERIODS = {"second": 1, "minute": 60, "hour": 3600}
+
+
+def parse_limit(spec: str) -> Tuple[float, float]:
+    # "10/minute" -> (capacity 10, refill rate 10/60 tokens per second)
+    count, _, period = spec.partition("/")
+    capacity = float(count)
+    return capacity, capacity / PERIODS[period.strip()]
+
+
+LIMITS = {rule: parse_limit(spec) for rule, spec in settings.RATE_LIMITS.items()}
+
+
+class RateLimitBackend(ABC):
+    @abstractmethod
+    async def acquire(self, key: Hashable, capacity: float, refill_rate: float) -> float:
+        # Takes a token from the key's bucket: 0 when granted, otherwise the
+        # seconds until one is available
+        ...
+
+    def metrics(self) -> dict:
+        return {}
+
+
+class InMemoryBackend(RateLimitBackend):
+    def __init__(self, max_keys: int):
+        self.max_keys = max_keys
+        # key -> (tokens, updated_at, full_at), least recently used first.
+        # A bucket is dropped once it has refilled: a new one starts full
+        # anyway, so memory only holds keys that are actually limited
+        self._buckets: "OrderedDict[Hashable, Tuple[float, float, float]]" = OrderedDict()
+        self.evictions = 0
+
+    def _evict(self, now: float):
+        # From the least recently used end, up to the first bucket still
+        # refilling: amortized O(1) per call. Rules with slow refills can
+        # hold faster ones behind them for a while; max_keys bounds the total
+        while self._buckets:
+            key, (_, _, full_at) = next(iter(self._buckets.items()))
+            if full_at > now and len(self._buckets) <= self.max_keys:
+                break
+            del self._buckets[key]
+            self.evictions += 1
+
+    async def acquire(self, key: Hashable, capacity: float, refill_rate: float) -> float:
+        now = time.monotonic()
+        entry = self._buckets.pop(key, None)
+        if entry is None:
+            tokens = capacity
+        else:
+            tokens, updated_at, _ = entry
+            tokens = min(capacity, tokens + (now - updated_at) * refill_rate)
+
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / refill_rate
+        self._buckets[key] = (tokens, now, now + (capacity - tokens) / refill_rate)
+        self._evict(now)
+        return wait
+
+    def metrics(self):
+        return {"keys": len(self._buckets), "evictions": self.evictions}
+
+
+backend: RateLimitBackend = InMemoryBackend(settings.RATE_LIMIT_MAX_KEYS)
+# (rule, "allowed" | "limited") -> requests
+stats = {}
+
+
+def use_backend(new_backend: RateLimitBackend):
+    global backend
+    backend = new_backend
+
+
+def client_ip(request: Request) -> str:
+    return request.client.host if request.client else "unknown"
+
+
+class RateLimit:
+    # Route dependency: dependencies=[Depends(UserRateLimit("like"))].
+    # `when` limits only some requests to the route (e.g. searches)
+
+    def __init__(self, rule: str, when: Optional[Callable[[Request], bool]] = None):
+        self.rule = rule
+        self.when = when
+
+    async def check(self, request: Request, key: Hashable):
+        limit = LIMITS.get(self.rule)
+        if not settings.RATE_LIMIT_ENABLED or limit is None or (self.when and not self.when(request)):
+            return
+        wait = await backend.acquire((self.rule, key), *limit)
+        result = "limited" if wait else "allowed"
+        stats[self.rule, result] = stats.get((self.rule, result), 0) + 1
+        if wait:
+            raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                                detail="Too many requests, try again later",
+                                headers={"Retry-After": str(max(1, math.ceil(wait)))})
+
+
+class UserRateLimit(RateLimit):
+    async def __call__(self, request: Request, current_user: models.User = Depends(get_current_user)):
+        await self.check(request, current_user.id)
+
+
+class IPRateLimit(RateLimit):
+    async def __call__(self, request: Request):
+        await self.check(request, client_ip(request))
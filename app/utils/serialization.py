@@ -0,0 +1,22 @@
+from typing import Any
+
+import orjson
+from fastapi import Response
+
+# JSON for the read paths that build their own dicts (feed, timeline, batch,
+# post detail, comments). They are assembled from typed columns in schema
+# field order, so validating them again against the response_model would only
+# repeat work: they are dumped with orjson and returned as a Response, which
+# FastAPI passes through as is. The response_model stays on the route for the
+# OpenAPI schema. OPT_UTC_Z writes UTC like pydantic does ("...Z").
+
+
+def dumps(content: Any) -> bytes:
+    return orjson.dumps(content, option=orjson.OPT_UTC_Z)
+
+
+class ORJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
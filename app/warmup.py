@@ -0,0 +1,125 @@
+import logging
+import time
+from contextlib import AsyncExitStack
+
+from sqlalchemy import text
+
+from app.config import settings
+from app.core.security import create_access_token
+from app.database import AsyncSessionLocal, async_engine, async_write_engine
+from app.models import Post, User
+from app.routers.comments import COMMENTS_PAGE_SIZE
+from app.services import post as post_service
+from app.services.timeline import get_home_timeline
+from app.utils.http_cache import set_cached
+from app.utils.serialization import dumps
+
+logger = logging.getLogger(__name__)
+
+# Startup warm-up (WARMUP_ON_STARTUP), run by the lifespan before the worker
+# takes traffic, so the first requests after a (rolling) restart don't pay
+# for it:
+#   - routes: in-process requests to the hot routes, through the app's ASGI
+#     interface, build the middleware stack and do each route's first-call
+#     work (source lookups for error messages, the first token decode)
+#   - connections: the reader pool is filled and the writer connection opened,
+#     which also applies the SQLite pragmas
+#   - SQL compilation: the hot read statements are executed once, which
+#     leaves their compiled form in the engine's compiled cache; later
+#     executions with other parameters reuse it
+#   - caches: the newest posts and their first comment page go into the
+#     response cache, as the anonymous (liked_by_user=False) representation
+
+VIEWER = 0  # no such user: every "liked" lookup comes back empty
+
+# Read-only routes; as VIEWER they stop at authentication (or find nothing),
+# after the route's handler has started. The last path matches no route and
+# walks every router
+WARMUP_PATHS = ["/posts/", "/posts/0", "/posts/trending", "/posts/batch?ids=0", "/posts/0/likes",
+                "/comments/post/0", "/timeline/", "/users/", "/users/0", "/users/autocomplete?q=a",
+                "/media/0", "/__warm-up__"]
+
+
+async def warm_routes(app):
+    headers = [(b"authorization", ("Bearer " + create_access_token({"user_id": VIEWER})).encode())]
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    for target in WARMUP_PATHS:
+        path, _, query = target.partition("?")
+        # "warmup" keeps the request out of the HTTP metrics
+        scope = {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+                 "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "",
+                 "query_string": query.encode(), "headers": headers, "client": None, "server": None,
+                 "warmup": True}
+        try:
+            await app(scope, receive, send)
+        except Exception:
+            logger.debug("warm-up request to %s failed", target, exc_info=True)
+
+
+async def warm_connections():
+    async with AsyncExitStack() as stack:
+        # Held open together so the pool really creates pool_size connections
+        for _ in range(async_engine.pool.size()):
+            conn = await stack.enter_async_context(async_engine.connect())
+            await conn.execute(text("SELECT 1"))
+        if async_write_engine is not async_engine:
+            conn = await stack.enter_async_context(async_write_engine.connect())
+            await conn.execute(text("SELECT 1"))
+
+
+async def newest_post_ids(db, limit: int):
+    # Visible posts only: deletions still pending are skipped, as in the feed
+    query = post_service.post_feed_query().with_only_columns(Post.id)
+    return (await db.scalars(query.order_by(Post.created_at.desc(), Post.id.desc()).limit(limit))).all()
+
+
+async def compile_hot_statements(db):
+    await db.get(User, VIEWER)
+    _, cursor = await post_service.get_feed_page(db, VIEWER)
+    if cursor:
+        await post_service.get_feed_page(db, VIEWER, cursor=cursor)
+    await get_home_timeline(db, VIEWER)
+    post_id = next(iter(await newest_post_ids(db, 1)), None)
+    await post_service.get_post_validators(db, post_id or 0)
+    await post_service.get_post_response(db, post_id or 0, VIEWER)
+    await post_service.get_posts_by_ids(db, [post_id or 0], VIEWER)
+    await post_service.get_comments_validators(db, post_id or 0, limit=COMMENTS_PAGE_SIZE)
+    await post_service.get_comments_page(db, post_id or 0, limit=COMMENTS_PAGE_SIZE)
+
+
+async def prime_response_cache(db, limit: int):
+    # Same keys and bodies as GET /posts/{id} and GET /comments/post/{id}
+    primed = 0
+    for post_id in await newest_post_ids(db, limit):
+        validators = await post_service.get_post_validators(db, post_id)
+        post = await post_service.get_post_response(db, post_id, VIEWER)
+        if validators is None or post is None:
+            # deleted since the ids were read
+            continue
+        version, _ = validators
+        set_cached(("post", post_id, False), (version, 0), dumps(post))
+        comments_version, _ = await post_service.get_comments_validators(db, post_id, limit=COMMENTS_PAGE_SIZE)
+        comments, next_cursor = await post_service.get_comments_page(db, post_id, limit=COMMENTS_PAGE_SIZE)
+        set_cached(("comments", post_id), comments_version, (dumps(comments), next_cursor))
+        primed += 1
+    return primed
+
+
+async def warm_up(app):
+    t0 = time.perf_counter()
+    await warm_routes(app)
+    await warm_connections()
+    t1 = time.perf_counter()
+    async with AsyncSessionLocal() as db:
+        await compile_hot_statements(db)
+        t2 = time.perf_counter()
+        primed = await prime_response_cache(db, settings.WARMUP_HOT_POSTS)
+    t3 = time.perf_counter()
+    logger.info("warm-up: routes and connections %.1f ms, statements %.1f ms, %d posts cached in %.1f ms",
+                (t1 - t0) * 1000, (t2 - t1) * 1000, primed, (t3 - t2) * 1000)
@@ -0,0 +1,110 @@
+"""Startup time and first-request latency, with and without the warm-up.
+
+Seeds one SQLite database, then starts the app in a fresh subprocess per mode
+(WARMUP_ON_STARTUP=false / true), so every run begins with empty pools,
+an empty compiled-statement cache and empty in-process caches. Each child
+reports the import time, the lifespan startup time and, for every hot route,
+the latency of its first request against the median of the next --repeat.
+
+    python -m benchmarks.cold_start --posts 200000
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROUTES = [
+    ("feed", "/posts/?limit=10"),
+    ("feed page 2", None),  # the cursor comes from the first page
+    ("post detail", "/posts/{post_id}"),
+    ("comments", "/comments/post/{post_id}"),
+    ("timeline", "/timeline/"),
+]
+
+
+async def child(args):
+    t0 = time.perf_counter()
+    import httpx
+    from app.core.security import create_access_token
+    from app.main import create_app
+    imported = time.perf_counter() - t0
+
+    app = create_app()
+    headers = {"Authorization": "Bearer " + create_access_token({"user_id": 1})}
+    results = {"import_ms": imported * 1000}
+    transport = httpx.ASGITransport(app=app)
+    t0 = time.perf_counter()
+    async with app.router.lifespan_context(app):
+        results["startup_ms"] = (time.perf_counter() - t0) * 1000
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            cursor = None
+            for name, path in ROUTES:
+                if path is None:
+                    path = f"/posts/?limit=10&cursor={cursor}"
+                path = path.format(post_id=args.post_id)
+                latencies = []
+                for _ in range(args.repeat + 1):
+                    started = time.perf_counter()
+                    response = await client.get(path, headers=headers)
+                    latencies.append((time.perf_counter() - started) * 1000)
+                    response.raise_for_status()
+                    cursor = cursor or response.headers.get("X-Next-Cursor")
+                results[name] = {"first_ms": latencies[0], "steady_ms": statistics.median(latencies[1:])}
+    print(json.dumps(results))
+
+
+def run_mode(warmup, database_url, args):
+    env = {**os.environ, "DATABASE_URL": database_url, "WARMUP_ON_STARTUP": "true" if warmup else "false"}
+    command = [sys.executable, "-m", "benchmarks.cold_start", "--child",
+               "--repeat", str(args.repeat), "--post-id", str(args.post_id)]
+    output = subprocess.run(command, env=env, capture_output=True, text=True)
+    if output.returncode != 0:
+        raise SystemExit(output.stderr)
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--posts", type=int, default=200_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--post-id", type=int, default=None, help="defaults to the newest post")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        asyncio.run(child(args))
+        return
+
+    database_url = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'cold_start.db')}"
+    os.environ["DATABASE_URL"] = database_url
+    from sqlalchemy import func, select
+    from app.database import engine
+    from app.migrations import migrate
+    from app.models import Post
+    from app.seed import Seeder
+    migrate(engine)
+    Seeder(engine, users=args.users, posts=args.posts, likes=args.posts * 2, comments=args.posts,
+           log=lambda line: None).run()
+    if args.post_id is None:
+        with engine.connect() as conn:
+            args.post_id = conn.scalar(select(func.max(Post.id)))
+    engine.dispose()
+
+    runs = {label: run_mode(warmup, database_url, args) for label, warmup in (("cold", False), ("warm-up", True))}
+    print(f"{'':<14}" + "".join(f"{label:>22}" for label in runs))
+    print(f"{'import ms':<14}" + "".join(f"{run['import_ms']:22.1f}" for run in runs.values()))
+    print(f"{'startup ms':<14}" + "".join(f"{run['startup_ms']:22.1f}" for run in runs.values()))
+    print(f"{'route':<14}" + "".join(f"{'first / steady ms':>22}" for _ in runs))
+    for name, _ in ROUTES:
+        print(f"{name:<14}" + "".join(f"{run[name]['first_ms']:13.2f} / {run[name]['steady_ms']:6.2f}"
+                                      for run in runs.values()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""Mixed read/write load against each database engine profile.
+
+Each profile runs in its own subprocess (the engines are built at import time
+from Settings) against a freshly seeded database. Workers issue GET /posts
+reads and POST /posts + POST /posts/{id}/like writes in the given ratio through
+the in-process ASGI app, and the table reports throughput, p50/p95 latency per
+operation kind and failed requests ("database is locked" shows up there).
+
+    python -m benchmarks.engine_profiles --concurrency 50 --write-ratio 0.2 --duration 10
+    python -m benchmarks.engine_profiles --profiles sqlite-wal postgresql   # needs DATABASE_* set
+
+Profiles:
+    sqlite-default  the previous setup: rollback journal, synchronous=FULL,
+                    default cache, no mmap, every connection may write
+    sqlite-wal      the default profile: WAL, tuned pragmas, reader pool and a
+                    single serialized writer
+    postgresql      DATABASE_PROFILE=postgresql with the DATABASE_* settings;
+                    point them at an empty scratch database
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+PROFILES = {
+    "sqlite-default": {
+        "SQLITE_JOURNAL_MODE": "DELETE",
+        "SQLITE_SYNCHRONOUS": "FULL",
+        "SQLITE_CACHE_SIZE": "-2000",
+        "SQLITE_MMAP_SIZE": "0",
+        "SQLITE_READER_POOL_SIZE": "5",
+        "SQLITE_SERIALIZE_WRITES": "false",
+    },
+    "sqlite-wal": {},
+    "postgresql": {"DATABASE_PROFILE": "postgresql"},
+}
+
+
+def percentile(latencies, fraction):
+    return latencies[max(int(len(latencies) * fraction) - 1, 0)] * 1000
+
+
+async def child(args):
+    import httpx
+    from app.core.security import create_access_token
+    from app.database import engine
+    from app.main import app
+    from app.migrations import migrate
+    from app.models import User, Post
+
+    migrate(engine)
+    with engine.begin() as conn:
+        conn.execute(User.__table__.insert(), [
+            {"email": f"user{i}@example.com", "password": "x", "username": f"user{i}"} for i in range(args.users)
+        ])
+        conn.execute(Post.__table__.insert(), [
+            {"content": f"post {i}", "user_id": i % args.users + 1} for i in range(args.posts)
+        ])
+
+    tokens = [{"Authorization": "Bearer " + create_access_token({"user_id": i + 1})} for i in range(args.users)]
+    latencies = {"read": [], "write": []}
+    errors = {"read": 0, "write": 0}
+    deadline = time.perf_counter() + args.duration
+
+    async def request(client, kind, method, path, **kwargs):
+        t0 = time.perf_counter()
+        try:
+            response = await client.request(method, path, **kwargs)
+            response.raise_for_status()
+        except Exception:
+            errors[kind] += 1
+            return
+        latencies[kind].append(time.perf_counter() - t0)
+
+    async def worker(client, rng):
+        while time.perf_counter() < deadline:
+            headers = rng.choice(tokens)
+            if rng.random() >= args.write_ratio:
+                await request(client, "read", "GET", "/posts/?limit=10", headers=headers)
+            elif rng.random() < 0.5:
+                await request(client, "write", "POST", "/posts/", headers=headers, json={"content": "benchmark"})
+            else:
+                post_id = rng.randint(1, args.posts)
+                await request(client, "write", "POST", f"/posts/{post_id}/like", headers=headers)
+
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+            started = time.perf_counter()
+            await asyncio.gather(*(worker(client, random.Random(seed)) for seed in range(args.concurrency)))
+            elapsed = time.perf_counter() - started
+
+    result = {}
+    for kind, values in latencies.items():
+        values.sort()
+        result[kind] = {
+            "errors": errors[kind],
+            "rps": len(values) / elapsed,
+            "p50": statistics.median(values) * 1000 if values else float("nan"),
+            "p95": percentile(values, 0.95) if values else float("nan"),
+        }
+    print(json.dumps(result))
+
+
+def run_profile(name, args):
+    env = {**os.environ, **PROFILES[name], "BCRYPT_ROUNDS": "4", "RATE_LIMIT_ENABLED": "false"}
+    if name != "postgresql":
+        env["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'profile.db')}"
+    command = [sys.executable, "-m", "benchmarks.engine_profiles", "--child",
+               "--concurrency", str(args.concurrency), "--write-ratio", str(args.write_ratio),
+               "--duration", str(args.duration), "--users", str(args.users), "--posts", str(args.posts)]
+    output = subprocess.run(command, env=env, capture_output=True, text=True)
+    if output.returncode != 0:
+        raise SystemExit(f"{name} failed:\n{output.stderr}")
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--profiles", nargs="+", default=["sqlite-default", "sqlite-wal"], choices=list(PROFILES))
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--write-ratio", type=float, default=0.2)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--posts", type=int, default=20_000)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        asyncio.run(child(args))
+        return
+
+    print(f"concurrency={args.concurrency} write ratio={args.write_ratio:.0%} duration={args.duration}s")
+    print(f"{'profile':<15} {'kind':<6} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'errors':>7}")
+    for name in args.profiles:
+        result = run_profile(name, args)
+        for kind in ("read", "write"):
+            stats = result[kind]
+            print(f"{name:<15} {kind:<6} {stats['rps']:9.1f} {stats['p50']:9.2f} {stats['p95']:9.2f} {stats['errors']:>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""Feed pagination benchmark: skip/offset vs keyset cursor on GET /posts.
+
+Seeds a temporary SQLite database with N posts and times the first page and a
+deep page (page 10,000 by default) through ``routers.posts.get_posts``.
+
+    python -m benchmarks.feed_pagination --posts 1000000 --page 10000
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import orjson
+from sqlalchemy import create_engine, select, type_coerce, String
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+
+from app.database import Base, make_async_url
+from app.models import User, Post
+from app.routers.posts import get_posts
+from app.utils.pagination import encode_cursor
+
+
+def seed(engine, n_posts, batch_size=50_000):
+    Base.metadata.create_all(bind=engine)
+    start = datetime(2024, 1, 1)
+    with engine.begin() as conn:
+        conn.execute(User.__table__.insert(), [{"email": "bench@example.com", "password": "x", "username": "bench"}])
+        for offset in range(0, n_posts, batch_size):
+            rows = [
+                {"content": f"post {i}", "user_id": 1, "created_at": start + timedelta(seconds=i)}
+                for i in range(offset, min(offset + batch_size, n_posts))
+            ]
+            conn.execute(Post.__table__.insert(), rows)
+
+
+async def timed(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        await fn()
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000
+
+
+async def run(args):
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    engine = create_engine(f"sqlite:///{path}")
+    t0 = time.perf_counter()
+    seed(engine, args.posts)
+    print(f"seeded {args.posts} posts in {time.perf_counter() - t0:.1f}s")
+
+    async_engine = create_async_engine(make_async_url(f"sqlite:///{path}"))
+    db = AsyncSession(async_engine)
+    viewer = SimpleNamespace(id=1)
+    skip = (args.page - 1) * args.limit
+
+    # Cursor pointing at the last row of the page before the deep page
+    created_at, post_id = (await db.execute(
+        select(type_coerce(Post.created_at, String()), Post.id)
+        .order_by(Post.created_at.desc(), Post.id.desc())
+        .offset(skip - 1).limit(1)
+    )).one()
+    cursor = encode_cursor(created_at, post_id)
+
+    def page(**kwargs):
+        return lambda: get_posts(db=db, current_user=viewer, limit=args.limit, search="", **kwargs)
+
+    for label, fetch in [
+        ("offset page 1", page(skip=0)),
+        (f"offset page {args.page}", page(skip=skip)),
+        ("cursor page 1", page(cursor=None)),
+        (f"cursor page {args.page}", page(cursor=cursor)),
+    ]:
+        print(f"{label:<20} {await timed(fetch, args.repeat):8.2f} ms")
+
+    offset_ids = [p["id"] for p in orjson.loads((await page(skip=skip)()).body)]
+    cursor_ids = [p["id"] for p in orjson.loads((await page(cursor=cursor)()).body)]
+    assert offset_ids == cursor_ids, "cursor and offset pages differ"
+
+    await db.close()
+    await async_engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--posts", type=int, default=1_000_000)
+    parser.add_argument("--page", type=int, default=10_000)
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=5)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""Concurrent load test: async request path vs the old sync-def + threadpool path.
+
+Runs the app in-process (httpx ASGI transport) against a seeded temporary
+SQLite database. For each concurrency level it drives GET /posts (async route,
+AsyncSession) and an equivalent sync route mounted only for this test (sync
+``def`` + SessionLocal, i.e. what every route used to be) and reports
+requests/second and p50/p95 latency.
+
+    python -m benchmarks.load_test --concurrency 1 10 50 150 --duration 5
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'load.db')}"
+
+from typing import List
+
+import httpx
+from fastapi import Depends
+from sqlalchemy import select
+from sqlalchemy.orm import Session, joinedload
+
+from app.core.security import create_access_token
+from app.database import engine, get_db
+from app.main import app
+from app.migrations import migrate
+from app.models import User, Post, Like
+from app.schemas.post import PostResponse
+from app.utils.auth import oauth2_scheme, verify_access_token
+
+
+def seed(n_users=100, n_posts=5_000):
+    migrate(engine)
+    with engine.begin() as conn:
+        conn.execute(User.__table__.insert(), [
+            {"email": f"user{i}@example.com", "password": "x", "username": f"user{i}"} for i in range(n_users)
+        ])
+        conn.execute(Post.__table__.insert(), [
+            {"content": f"post {i}", "user_id": i % n_users + 1} for i in range(n_posts)
+        ])
+        conn.execute(Like.__table__.insert(), [
+            {"user_id": i % n_users + 1, "post_id": n_posts - i} for i in range(0, n_posts, 3)
+        ])
+
+
+@app.get("/_bench/sync-feed", response_model=List[PostResponse], include_in_schema=False)
+def sync_feed(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    # Same work as GET /posts on the pre-async path: blocking session, run by
+    # FastAPI in its threadpool
+    token_data = verify_access_token(token, Exception("invalid token"))
+    viewer = db.get(User, token_data.user_id)
+    rows = db.execute(select(Post, Post.like_count, Post.comment_count).options(joinedload(Post.author))
+                      .order_by(Post.created_at.desc(), Post.id.desc()).limit(10)).all()
+    liked = set(db.scalars(select(Like.post_id)
+                           .where(Like.user_id == viewer.id, Like.post_id.in_([post.id for post, *_ in rows]))))
+    return [{**post.__dict__, "like_count": likes, "comment_count": comments, "liked_by_user": post.id in liked}
+            for post, likes, comments in rows]
+
+
+async def drive(client, path, headers, concurrency, duration):
+    latencies = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+
+    async def worker():
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            t0 = time.perf_counter()
+            try:
+                response = await client.get(path, headers=headers)
+                response.raise_for_status()
+            except Exception:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - t0)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    if not latencies:
+        return {"rps": 0.0, "p50": float("nan"), "p95": float("nan"), "errors": errors}
+    latencies.sort()
+    return {
+        "rps": len(latencies) / elapsed,
+        "p50": statistics.median(latencies) * 1000,
+        "p95": latencies[max(int(len(latencies) * 0.95) - 1, 0)] * 1000,
+        "errors": errors,
+    }
+
+
+async def run(args):
+    seed()
+    headers = {"Authorization": "Bearer " + create_access_token({"user_id": 1})}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        print(f"{'concurrency':>11} {'route':<18} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'errors':>7}")
+        for concurrency in args.concurrency:
+            for label, path in [("async GET /posts", "/posts/"), ("sync baseline", "/_bench/sync-feed")]:
+                stats = await drive(client, path, headers, concurrency, args.duration)
+                print(f"{concurrency:>11} {label:<18} {stats['rps']:9.1f} {stats['p50']:9.2f} {stats['p95']:9.2f} {stats['errors']:7}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 10, 50, 150])
+    parser.add_argument("--duration", type=float, default=5.0)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Upload memory and throughput: POST /media streaming vs a buffered body.
+
+Sends one --size MB image body in 64 KiB chunks through the ASGI app and
+reports the throughput and the peak Python allocation (tracemalloc) while the
+request runs:
+
+    streamed   POST /media: MEDIA_CHUNK_SIZE writes to a temporary file,
+               hashed on the way, then renamed to its sha256
+    buffered   the same storage fed from `await request.body()`, i.e. the
+               whole file in memory first (a plain handler or a JSON/base64
+               upload)
+
+    python -m benchmarks.media_upload --size 50
+"""
+import argparse
+import asyncio
+import hashlib
+import logging
+import os
+import tempfile
+import time
+import tracemalloc
+
+CHUNK = 64 * 1024
+
+
+async def main(args):
+    root = tempfile.mkdtemp()
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(root, 'media_upload.db')}"
+    os.environ["MEDIA_ROOT"] = os.path.join(root, "media")
+    os.environ["MEDIA_MAX_BYTES"] = str((args.size + 1) * 1024 * 1024)
+    import httpx
+    from fastapi import Request
+    from app.core.security import create_access_token
+    from app.database import engine, async_engine, async_write_engine
+    from app.main import create_app
+    from app.migrations import migrate
+    from app.services import media as media_service
+    migrate(engine)
+    with engine.begin() as conn:
+        conn.exec_driver_sql("INSERT INTO users (email, password, username, username_key) VALUES ('bench@example.com', 'x', 'bench', 'bench')")
+
+    # The random bodies are not decodable images: their thumbnails fail
+    logging.getLogger("app.services.media").setLevel(logging.CRITICAL)
+    app = create_app()
+
+    @app.post("/bench/buffered")
+    async def buffered(request: Request):
+        body = await request.body()
+        media_id = hashlib.sha256(body).hexdigest()
+        with tempfile.NamedTemporaryFile(dir=media_service.upload_dir(), delete=False) as file:
+            file.write(body)
+            file.flush()
+            os.fsync(file.fileno())
+        media_service.store_file(file.name, media_id)
+        return {"id": media_id}
+
+    headers = {"Authorization": "Bearer " + create_access_token({"user_id": 1}), "Content-Type": "image/png"}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        os.makedirs(media_service.upload_dir(), exist_ok=True)
+        print(f"{args.size} MB upload, {args.repeat} rounds")
+        print(f"{'path':<10} {'MB/s':>8} {'peak MB':>9}")
+
+        async def upload(path, tag):
+            # Different bytes every time, so nothing is deduplicated
+            async def body():
+                yield b"\x89PNG\r\n\x1a\n" + tag.encode()
+                block = os.urandom(CHUNK)
+                for _ in range(args.size * 1024 * 1024 // CHUNK):
+                    yield block
+
+            t0 = time.perf_counter()
+            response = await client.post(path, content=body(), headers=headers)
+            response.raise_for_status()
+            return time.perf_counter() - t0
+
+        for label, path in (("streamed", "/media/"), ("buffered", "/bench/buffered")):
+            # A warm-up (first request through the route, thread pool start),
+            # the timed rounds, then one round under tracemalloc, which slows
+            # every allocation down
+            await upload(path, f"{label}-warm-up")
+            elapsed = sum([await upload(path, f"{label}-{round_}") for round_ in range(args.repeat)])
+            tracemalloc.start()
+            await upload(path, f"{label}-traced")
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            print(f"{label:<10} {args.size * args.repeat / elapsed:8.1f} {peak / 1024 / 1024:9.1f}")
+    await media_service.thumbnailer.shutdown()
+    await async_engine.dispose()
+    await async_write_engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=50, help="MB per upload")
+    parser.add_argument("--repeat", type=int, default=3)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,92 @@
+"""Post search benchmark: LIKE '%term%' scan vs the FTS5 index.
+
+Seeds a temporary SQLite database with N posts of random words (Zipf-ish word
+frequencies, so there are common and rare terms) and times one page of results
+for each term through both paths.
+
+    python -m benchmarks.post_search --posts 1000000
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+
+from app.database import Base, make_async_url
+from app.models import User, Post
+from app.services.post import get_feed_page, post_feed_query
+from app.services.search import install_post_search
+
+VOCABULARY = [f"w{i:05d}" for i in range(20_000)]
+
+
+def seed(engine, n_posts, batch_size=50_000, rng_seed=42):
+    rng = random.Random(rng_seed)
+    weights = [1 / (rank + 1) for rank in range(len(VOCABULARY))]
+    Base.metadata.create_all(bind=engine)
+    start = datetime(2024, 1, 1)
+    with engine.begin() as conn:
+        conn.execute(User.__table__.insert(), [{"email": "bench@example.com", "password": "x", "username": "bench"}])
+        for offset in range(0, n_posts, batch_size):
+            count = min(batch_size, n_posts - offset)
+            words = rng.choices(VOCABULARY, weights, k=count * 12)
+            rows = [
+                {"content": " ".join(words[i * 12:(i + 1) * 12]), "user_id": 1,
+                 "created_at": start + timedelta(seconds=offset + i)}
+                for i in range(count)
+            ]
+            conn.execute(Post.__table__.insert(), rows)
+        install_post_search(conn)
+
+
+async def timed(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        await fn()
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000
+
+
+async def run(args):
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    engine = create_engine(f"sqlite:///{path}")
+    t0 = time.perf_counter()
+    seed(engine, args.posts)
+    print(f"seeded and indexed {args.posts} posts in {time.perf_counter() - t0:.1f}s")
+
+    async_engine = create_async_engine(make_async_url(f"sqlite:///{path}"))
+    db = AsyncSession(async_engine)
+
+    def like_scan(term):
+        return lambda: db.execute(post_feed_query().where(Post.content.contains(term))
+                                  .order_by(Post.created_at.desc()).limit(args.limit))
+
+    def fts(term):
+        return lambda: get_feed_page(db, 1, limit=args.limit, search=term)
+
+    print(f"{'term':<12} {'LIKE scan':>12} {'FTS5':>12}")
+    for term in ["w00000", "w00100", "w05000", "w19999", "w0199", "missing"]:
+        like_ms = await timed(like_scan(term), args.repeat)
+        fts_ms = await timed(fts(term), args.repeat)
+        print(f"{term:<12} {like_ms:9.2f} ms {fts_ms:9.2f} ms")
+
+    await db.close()
+    await async_engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--posts", type=int, default=1_000_000)
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=3)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""Feed page serialization: ORM entities + pydantic vs projected rows + orjson.
+
+Seeds a temporary SQLite database and builds the same GET /posts page both
+ways, timing the query + assembly and the JSON encoding separately:
+
+    orm+pydantic   select(Post) with joinedload(author), a copy of each
+                   post's __dict__, then validation against List[PostResponse]
+                   and a JSON dump (what FastAPI did with the response_model)
+    rows+orjson    post_feed_query() column projection into plain dicts,
+                   dumped with orjson and returned without validation
+
+    python -m benchmarks.serialization --limit 100 --repeat 200
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+from typing import List
+
+from pydantic import TypeAdapter
+from sqlalchemy import create_engine, select
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.orm import joinedload
+
+from app.database import Base, make_async_url
+from app.models import User, Post
+from app.schemas.post import PostResponse
+from app.services.post import assemble_posts, get_liked_post_ids, post_feed_query
+from app.utils.serialization import dumps
+
+post_list = TypeAdapter(List[PostResponse])
+
+
+def seed(engine, n_users, n_posts):
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(User.__table__.insert(), [
+            {"email": f"user{i}@example.com", "password": "x", "username": f"user{i}"} for i in range(n_users)
+        ])
+        conn.execute(Post.__table__.insert(), [
+            {"content": f"post {i} " + "lorem ipsum " * 10, "user_id": i % n_users + 1,
+             "like_count": i % 97, "comment_count": i % 13}
+            for i in range(n_posts)
+        ])
+
+
+async def orm_page(db, limit, viewer_id):
+    query = select(Post, Post.like_count, Post.comment_count).options(joinedload(Post.author))
+    rows = (await db.execute(query.order_by(Post.created_at.desc(), Post.id.desc()).limit(limit))).all()
+    liked = await get_liked_post_ids(db, [post.id for post, *_ in rows], viewer_id)
+    return [{**post.__dict__, "like_count": likes, "comment_count": comments, "liked_by_user": post.id in liked}
+            for post, likes, comments in rows]
+
+
+def orm_encode(page):
+    return post_list.dump_json(post_list.validate_python(page))
+
+
+async def rows_page(db, limit, viewer_id):
+    query = post_feed_query().order_by(Post.created_at.desc(), Post.id.desc()).limit(limit)
+    return await assemble_posts(db, (await db.execute(query)).all(), viewer_id)
+
+
+async def measure(db, build, encode, repeat, limit):
+    build_time = encode_time = 0.0
+    body = None
+    for _ in range(repeat):
+        # A fresh session state each round, as per request
+        db.expunge_all()
+        t0 = time.perf_counter()
+        page = await build(db, limit, 1)
+        t1 = time.perf_counter()
+        body = encode(page)
+        t2 = time.perf_counter()
+        build_time += t1 - t0
+        encode_time += t2 - t1
+    per_item = 1e6 / (repeat * limit)
+    return build_time * per_item, encode_time * per_item, body
+
+
+async def run(args):
+    path = os.path.join(tempfile.mkdtemp(), "serialization.db")
+    seed(create_engine(f"sqlite:///{path}"), args.users, args.posts)
+    async_engine = create_async_engine(make_async_url(f"sqlite:///{path}"))
+
+    async with AsyncSession(async_engine) as db:
+        results = {}
+        for label, build, encode in [("orm+pydantic", orm_page, orm_encode), ("rows+orjson", rows_page, dumps)]:
+            await measure(db, build, encode, 5, args.limit)  # warm-up
+            results[label] = await measure(db, build, encode, args.repeat, args.limit)
+
+    await async_engine.dispose()
+
+    print(f"page of {args.limit} posts, {args.repeat} rounds, microseconds per item")
+    print(f"{'path':<14} {'query+build':>12} {'encode':>9} {'total':>9}")
+    for label, (build_us, encode_us, _) in results.items():
+        print(f"{label:<14} {build_us:12.2f} {encode_us:9.2f} {build_us + encode_us:9.2f}")
+
+    old, new = (json.loads(results[label][2]) for label in ("orm+pydantic", "rows+orjson"))
+    assert old == new, "the two paths produced different JSON"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=1_000)
+    parser.add_argument("--posts", type=int, default=10_000)
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=200)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
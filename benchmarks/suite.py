@@ -0,0 +1,277 @@
+"""Reproducible API benchmark suite with JSON results.
+
+Starts the app in-process (httpx ASGI transport, lifespan included) against a
+freshly seeded temporary SQLite database and runs scripted workloads, each a
+fixed number of requests from a seeded RNG so two runs issue the same
+requests. Per workload it reports p50/p95/p99 latency, throughput, errors,
+status codes and SQL statements / database time per request (from the
+/metrics hooks), and writes everything to JSON for comparing commits.
+
+    python -m benchmarks.suite --output before.json
+    python -m benchmarks.suite --workloads post_detail like_storm --requests 5000
+    python -m benchmarks.suite --compare before.json after.json
+
+Workloads:
+    feed_scroll    GET /posts, following X-Next-Cursor for --feed-pages pages
+    post_detail    GET /posts/{id}, ids skewed towards a few popular posts
+    like_storm     POST /posts/{id}/like from many users on --hot-posts posts
+    hot_comments   GET /comments/post/{id} on the commented hot posts
+    login_burst    POST /auth/login with real bcrypt (BCRYPT_ROUNDS applies)
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timezone
+
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'suite.db')}"
+# The workloads replay few clients at full speed: they would only measure the 429s
+os.environ["RATE_LIMIT_ENABLED"] = "false"
+
+import httpx
+
+from app.config import settings
+from app.core.security import create_access_token, hash_password
+from app.database import engine
+from app.main import app
+from app.migrations import migrate
+from app.models import User, Post, Comment
+from app.utils.metrics import db_queries, db_query_duration
+
+PASSWORD = "benchmark-password"
+WORKLOADS = ["feed_scroll", "post_detail", "like_storm", "hot_comments", "login_burst"]
+
+
+def seed(args):
+    migrate(engine)
+    # One bcrypt hash shared by every user: seeding stays fast, logins still pay full cost
+    password = hash_password(PASSWORD)
+    rng = random.Random(args.seed)
+    comments_per_post = args.comments // args.hot_posts
+    with engine.begin() as conn:
+        conn.execute(User.__table__.insert(), [
+            {"email": f"user{i}@example.com", "password": password, "username": f"user{i}"} for i in range(args.users)
+        ])
+        # Posts 1..hot_posts carry the comments
+        conn.execute(Post.__table__.insert(), [
+            {"content": f"post {i}", "user_id": rng.randint(1, args.users),
+             "comment_count": comments_per_post if i < args.hot_posts else 0}
+            for i in range(args.posts)
+        ])
+        conn.execute(Comment.__table__.insert(), [
+            {"content": f"comment {i}", "user_id": rng.randint(1, args.users), "post_id": i % args.hot_posts + 1}
+            for i in range(comments_per_post * args.hot_posts)
+        ])
+
+
+def percentile(latencies, fraction):
+    # Nearest rank on sorted latencies, in milliseconds
+    return latencies[min(int(len(latencies) * fraction), len(latencies) - 1)] * 1000
+
+
+class Workload:
+    def __init__(self, name, client, args, tokens):
+        self.name = name
+        self.client = client
+        self.args = args
+        self.tokens = tokens
+        self.remaining = 0
+        self.latencies = []
+        self.statuses = Counter()
+        self.errors = 0
+
+    async def request(self, method, path, **kwargs):
+        # Every HTTP request draws from the workload's budget
+        if self.remaining <= 0:
+            return None
+        self.remaining -= 1
+        t0 = time.perf_counter()
+        try:
+            response = await self.client.request(method, path, **kwargs)
+        except Exception:
+            self.errors += 1
+            return None
+        self.latencies.append(time.perf_counter() - t0)
+        self.statuses[response.status_code] += 1
+        if response.status_code >= 400:
+            self.errors += 1
+        return response
+
+    def headers(self, rng):
+        return rng.choice(self.tokens)
+
+    def popular_post(self, rng):
+        # Pareto-skewed ids: a handful of posts get most of the traffic
+        return min(int(rng.paretovariate(1.1)), self.args.posts)
+
+    async def feed_scroll(self, rng):
+        headers = self.headers(rng)
+        cursor = None
+        for _ in range(self.args.feed_pages):
+            params = {"limit": 10, **({"cursor": cursor} if cursor else {})}
+            response = await self.request("GET", "/posts/", headers=headers, params=params)
+            cursor = response.headers.get("X-Next-Cursor") if response is not None else None
+            if not cursor:
+                break
+
+    async def post_detail(self, rng):
+        await self.request("GET", f"/posts/{self.popular_post(rng)}", headers=self.headers(rng))
+
+    async def like_storm(self, rng):
+        post_id = rng.randint(1, self.args.hot_posts)
+        await self.request("POST", f"/posts/{post_id}/like", headers=self.headers(rng))
+
+    async def hot_comments(self, rng):
+        post_id = rng.randint(1, self.args.hot_posts)
+        await self.request("GET", f"/comments/post/{post_id}", headers=self.headers(rng), params={"limit": 20})
+
+    async def login_burst(self, rng):
+        user = rng.randrange(self.args.users)
+        await self.request("POST", "/auth/login", json={"email": f"user{user}@example.com", "password": PASSWORD})
+
+    async def run(self, requests, concurrency, seed):
+        operation = getattr(self, self.name)
+        self.remaining = requests
+
+        async def worker(worker_seed):
+            rng = random.Random(worker_seed)
+            while self.remaining > 0:
+                await operation(rng)
+
+        queries_before, db_seconds_before = db_queries.total(), db_query_duration.total()
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(seed * 1000 + i) for i in range(concurrency)))
+        elapsed = time.perf_counter() - started
+        # The metrics middleware folds each request into these counters
+        queries = db_queries.total() - queries_before
+        db_seconds = db_query_duration.total() - db_seconds_before
+        return self.summary(elapsed, queries, db_seconds)
+
+    def summary(self, elapsed, queries, db_seconds):
+        latencies = sorted(self.latencies)
+        count = len(latencies)
+        result = {
+            "requests": count,
+            "errors": self.errors,
+            "status_codes": {str(code): n for code, n in sorted(self.statuses.items())},
+            "duration_s": round(elapsed, 3),
+            "rps": round(count / elapsed, 1) if elapsed else 0.0,
+            "db_queries_per_request": round(queries / count, 2) if count else None,
+            "db_ms_per_request": round(db_seconds * 1000 / count, 3) if count else None,
+        }
+        if count:
+            result.update({
+                "mean_ms": round(sum(latencies) * 1000 / count, 3),
+                "p50_ms": round(percentile(latencies, 0.50), 3),
+                "p95_ms": round(percentile(latencies, 0.95), 3),
+                "p99_ms": round(percentile(latencies, 0.99), 3),
+                "max_ms": round(latencies[-1] * 1000, 3),
+            })
+        return result
+
+
+def git_revision():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True)
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True, text=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return commit.stdout.strip() + ("-dirty" if dirty.stdout.strip() else "")
+
+
+async def run(args):
+    t0 = time.perf_counter()
+    seed(args)
+    print(f"seeded {args.users} users, {args.posts} posts, {args.comments} comments "
+          f"in {time.perf_counter() - t0:.1f}s", file=sys.stderr)
+
+    tokens = [{"Authorization": "Bearer " + create_access_token({"user_id": i + 1})}
+              for i in range(min(args.users, 1000))]
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+            for name in args.workloads:
+                requests = args.login_requests if name == "login_burst" else args.requests
+                workload = Workload(name, client, args, tokens)
+                results[name] = await workload.run(requests, args.concurrency, args.seed)
+                print_row(name, results[name])
+
+    return {
+        "meta": {
+            "revision": git_revision(),
+            "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "database": settings.DATABASE_PROFILE,
+            "bcrypt_rounds": settings.BCRYPT_ROUNDS,
+            "args": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        },
+        "workloads": results,
+    }
+
+
+def print_row(name, stats):
+    print(f"{name:<13} {stats['requests']:>7} {stats['rps']:9.1f} {stats.get('p50_ms', float('nan')):9.2f} "
+          f"{stats.get('p95_ms', float('nan')):9.2f} {stats.get('p99_ms', float('nan')):9.2f} "
+          f"{stats['db_queries_per_request'] or 0:8.2f} {stats['errors']:>7}", file=sys.stderr)
+
+
+def compare(baseline_path, current_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    with open(current_path) as f:
+        current = json.load(f)
+    print(f"{baseline['meta']['revision']} -> {current['meta']['revision']}")
+    print(f"{'workload':<13} {'metric':<24} {'baseline':>10} {'current':>10} {'change':>8}")
+    for name, stats in current["workloads"].items():
+        before = baseline["workloads"].get(name)
+        if before is None:
+            continue
+        for metric in ("rps", "p50_ms", "p95_ms", "p99_ms", "db_queries_per_request", "errors"):
+            old, new = before.get(metric), stats.get(metric)
+            if old is None or new is None:
+                continue
+            change = f"{(new - old) / old:+.1%}" if old else "n/a"
+            print(f"{name:<13} {metric:<24} {old:>10} {new:>10} {change:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workloads", nargs="+", default=WORKLOADS, choices=WORKLOADS)
+    parser.add_argument("--requests", type=int, default=2000, help="requests per workload")
+    parser.add_argument("--login-requests", type=int, default=200, help="requests for login_burst (bcrypt bound)")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--posts", type=int, default=20_000)
+    parser.add_argument("--comments", type=int, default=20_000, help="comments spread over the hot posts")
+    parser.add_argument("--hot-posts", type=int, default=20)
+    parser.add_argument("--feed-pages", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="write the JSON results here instead of stdout")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CURRENT"), help="diff two result files and exit")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    print(f"{'workload':<13} {'reqs':>7} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} "
+          f"{'queries':>8} {'errors':>7}", file=sys.stderr)
+    results = json.dumps(asyncio.run(run(args)), indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(results + "\n")
+    else:
+        print(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,28 @@
+from sqlalchemy import create_engine, text
+
+from app.migrations import migrate
+from app.migrations.query_plans import check_query_plans
+
+
+def migrated_engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'plans.db'}")
+    migrate(engine)
+    return engine
+
+
+def test_hot_queries_use_an_index(tmp_path):
+    engine = migrated_engine(tmp_path)
+    try:
+        assert check_query_plans(engine) == {}
+    finally:
+        engine.dispose()
+
+
+def test_missing_index_is_reported(tmp_path):
+    engine = migrated_engine(tmp_path)
+    try:
+        with engine.begin() as conn:
+            conn.execute(text("DROP INDEX ix_comments_user_id"))
+        assert "author comments" in check_query_plans(engine)
+    finally:
+        engine.dispose()